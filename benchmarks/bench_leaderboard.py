@@ -0,0 +1,93 @@
+"""
+Cost of keeping a top-100 leaderboard over 100k accounts as games finish:
+the in-memory board fed by committed ledger batches, against re-running the
+top query after every game end, with and without the balance index. Also
+ledger throughput with batched commits against one commit per game.
+
+Run from the repository root: python -m benchmarks.bench_leaderboard [--accounts N]
+"""
+import argparse
+import asyncio
+from contextlib import closing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from typing import List
+from models.accounts import Accounts, LedgerEntry
+
+
+def populate(db_path: str, num_accounts: int, rng: random.Random) -> None:
+    with closing(Accounts(db_path).connect()) as connection, connection:
+        connection.executemany("INSERT INTO Accounts VALUES (?, ?, ?, 0)",
+                               [(f"c{i}", f"player{i}", rng.randint(0, 1000)) for i in range(num_accounts)])
+
+
+def game_ends(num_accounts: int, num_games: int, rng: random.Random) -> List[List[LedgerEntry]]:
+    games = []
+    for _ in range(num_games):
+        players = [f"c{rng.randrange(num_accounts)}" for _ in range(4)]
+        entries = [(cookie, f"player{cookie[1:]}", "ante", -4) for cookie in players]
+        entries.append((players[0], f"player{players[0][1:]}", "payout", 16))
+        games.append(entries)
+    return games
+
+
+def query_top(db_path: str, games: List[List[LedgerEntry]], indexed: bool) -> None:
+    with closing(sqlite3.connect(db_path)) as connection:
+        if not indexed:
+            connection.execute("DROP INDEX IF EXISTS AccountsBalance")
+        start = time.perf_counter()
+        for _ in games:
+            connection.execute("SELECT Cookie, Username, Balance FROM Accounts "
+                               "ORDER BY Balance DESC, Cookie LIMIT 100").fetchall()
+        elapsed = time.perf_counter() - start
+    label = "top query, indexed" if indexed else "top query, full sort"
+    print(f"  {label:<24} {elapsed / len(games) * 1e6:9.1f} us per game end")
+
+
+async def ledger(db_path: str, games: List[List[LedgerEntry]], concurrent: bool) -> Accounts:
+    accounts = Accounts(db_path)
+    await accounts.refresh()
+    start = time.perf_counter()
+    if concurrent:
+        await asyncio.gather(*[accounts.record(f"g{i}", entries) for i, entries in enumerate(games)])
+    else:
+        for i, entries in enumerate(games):
+            await accounts.record(f"g{i}", entries)
+    elapsed = time.perf_counter() - start
+    label = "ledger, batched" if concurrent else "ledger, commit per game"
+    print(f"  {label:<24} {len(games) / elapsed:9.0f} game ends/s in {accounts.committed_batches} commits")
+    return accounts
+
+
+def page(accounts: Accounts, rounds: int = 10000) -> None:
+    start = time.perf_counter()
+    for i in range(rounds):
+        accounts.leaderboard.page((i % 5) * 20, 20)
+    elapsed = time.perf_counter() - start
+    print(f"  {'in-memory page of 20':<24} {elapsed / rounds * 1e6:9.1f} us per request")
+
+
+async def main(num_accounts: int, num_games: int) -> None:
+    rng = random.Random(0)
+    games = game_ends(num_accounts, num_games, rng)
+    print(f"{num_accounts} accounts, {num_games} finished games of 4 players")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        populate(db_path, num_accounts, rng)
+        writers = [await ledger(db_path, games, concurrent) for concurrent in (False, True)]
+        page(writers[-1])
+        for accounts in writers:
+            accounts.task.cancel()
+        query_top(db_path, games[:200], indexed=True)
+        query_top(db_path, games[:200], indexed=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=100000)
+    parser.add_argument("--games", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.accounts, args.games))
@@ -0,0 +1,90 @@
+"""
+Quick join placement throughput with 10k players queued at once, through
+sabaac's real create_matched_lobby and seat_matched_player, so every lobby
+and seat is journaled to SQLite like in production. The matchmaker's
+open-lobby index seats a batch and then awaits its journal commits together;
+the baseline scans every active game for a lobby with the right ante and a
+free seat and waits for each player's commit, as a per-player lookup would.
+
+Run from the repository root: python -m benchmarks.bench_matchmaking [--players N]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import List
+
+os.environ.setdefault("SABAAC_DB", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+import sabaac
+from models.game_manager import GameManager
+from models.game_types import CorellianGambit
+from models.journal import ActionJournal
+from models.matchmaking import LobbyKey, Matchmaker
+
+
+SEATS = sabaac.QUICK_JOIN_SEATS
+ANTES = (1, 2, 5, 10)
+
+
+def fresh_game_manager(name: str) -> GameManager:
+    """A journaled GameManager on its own database, installed as sabaac's"""
+    db_path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    sabaac.game_manager = GameManager(journal=ActionJournal(db_path))
+    return sabaac.game_manager
+
+
+async def scan(key: LobbyKey, cookie: str) -> str:
+    for game in sabaac.game_manager.get_active_games():
+        if not game.is_started and game.ante_amount == key.ante and len(game.get_players()) < SEATS:
+            await sabaac.join_lobby(game.code, cookie, started=False)
+            return game.code
+    return (await sabaac.create_lobby(CorellianGambit, cookie, key.ante)).code
+
+
+def make_queue(num_players: int) -> List[LobbyKey]:
+    rng = random.Random(0)
+    return [LobbyKey("CorellianGambit", rng.choice(ANTES)) for _ in range(num_players)]
+
+
+async def indexed(keys: List[LobbyKey]) -> None:
+    game_manager = fresh_game_manager("indexed")
+    matchmaker = Matchmaker(sabaac.create_matched_lobby, sabaac.seat_matched_player, seats=SEATS)
+    futures = [matchmaker.enqueue(f"player{i}", key) for i, key in enumerate(keys)]
+    start = time.perf_counter()
+    placed = await matchmaker.match()
+    elapsed = time.perf_counter() - start
+    assert all(f.done() for f in futures)
+    report("open-lobby index", placed, elapsed, game_manager)
+
+
+async def scanned(keys: List[LobbyKey]) -> None:
+    game_manager = fresh_game_manager("scanned")
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        await scan(key, f"player{i}")
+    elapsed = time.perf_counter() - start
+    report("scan, commit each", len(keys), elapsed, game_manager)
+
+
+def report(label: str, placed: int, elapsed: float, game_manager: GameManager) -> None:
+    print(f"  {label:<18} {placed} placed in {elapsed:7.3f} s   {placed / elapsed:9.0f} players/s"
+          f"   {elapsed / placed * 1e6:8.1f} us/player   {len(game_manager.games_by_code)} lobbies"
+          f"   {game_manager.journal.committed_batches} commits")
+    game_manager.journal.task.cancel()
+
+
+async def main(num_players: int) -> None:
+    keys = make_queue(num_players)
+    print(f"{num_players} players queued across antes {ANTES}, {SEATS} seats per lobby, journaled")
+    await indexed(keys)
+    await scanned(keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=10000)
+    args = parser.parse_args()
+    asyncio.run(main(args.players))
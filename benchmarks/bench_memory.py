@@ -0,0 +1,73 @@
+"""
+Measures the heap held by each live game: the original layout (62 Card objects
+with a __dict__ built per game, list deck) against the shared card table with a
+deque deck and __slots__ cards and players.
+
+Run from the repository root: python -m benchmarks.bench_memory
+"""
+import gc
+import random
+import tracemalloc
+from typing import Callable, List
+from models.game_types import CorellianGambit
+from models.player import Player
+
+
+class LegacyCard:
+    def __init__(self, id: int, suite: str, rank: int):
+        self.id = id
+        self.suite = suite
+        self.rank = rank
+
+
+class LegacyPlayer:
+    def __init__(self, cookie, turnorder, username: str = "Mr. Mysterious"):
+        self.cookie = cookie
+        self.username = username
+        self.turnorder = turnorder
+        self.hand = []
+        self.credits = 100
+
+
+def make_game(num_players: int) -> CorellianGambit:
+    game = CorellianGambit()
+    for i in range(num_players):
+        game.add_player(Player(f"cookie{i}", i + 1, username=f"player{i}"))
+    game.deal()
+    return game
+
+
+def make_legacy_game(num_players: int) -> CorellianGambit:
+    game = CorellianGambit()
+    # what the constructor used to allocate for every game
+    game.deck = [LegacyCard(c.id, c.suite, c.rank) for c in game.deck]
+    for i in range(num_players):
+        player = LegacyPlayer(f"cookie{i}", i + 1, username=f"player{i}")
+        game.players.append(player)
+        game.players_by_cookie[player.cookie] = player
+    for player in game.players:
+        for _ in range(2):
+            player.hand.append(game.deck.pop(0))
+    game.round = 1
+    return game
+
+
+def bytes_per_game(factory: Callable[[int], CorellianGambit], num_games: int, num_players: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games: List[CorellianGambit] = [factory(num_players) for _ in range(num_games)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del games
+    return (after - before) / num_games
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    num_games = 2000
+    for num_players in (2, 8):
+        print(f"{num_players} players, {num_games} live games")
+        for name, factory in (("legacy", make_legacy_game), ("compact", make_game)):
+            print(f"  {name:<8} {bytes_per_game(factory, num_games, num_players):9.0f} bytes/game")
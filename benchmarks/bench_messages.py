@@ -0,0 +1,40 @@
+"""
+Per message cost of parsing inbound websocket frames: the original json.loads
+plus dict indexing, the validated fast path, full pydantic validation and
+rejecting a malformed frame.
+
+Run from the repository root: python -m benchmarks.bench_messages
+"""
+import json
+import timeit
+from models.messages import ActionMessage, InvalidMessage, decode, parse_game_message, validate
+
+ACTION = '{"code": "abc234", "action": 4, "actionValue": 17}'
+LEGACY_CLIENT_ACTION = '{"code": "abc234", "action": "4", "actionValue": 17}'
+INVALID = '{"code": "abc234", "action": 9, "actionValue": null}'
+
+
+def legacy(text: str) -> tuple:
+    message = json.loads(text)
+    return message["code"], message["action"], message["actionValue"]
+
+
+def reject(text: str) -> None:
+    try:
+        parse_game_message(text)
+    except InvalidMessage:
+        pass
+
+
+if __name__ == "__main__":
+    number = 100000
+    cases = [("legacy json.loads", lambda: legacy(ACTION)),
+             ("fast path", lambda: parse_game_message(ACTION)),
+             ("full validation", lambda: validate(ActionMessage, decode(ACTION))),
+             ("coerced string action", lambda: parse_game_message(LEGACY_CLIENT_ACTION)),
+             ("rejected", lambda: reject(INVALID)),
+             ("rejected, not JSON", lambda: reject("hello")),
+             ]
+    for label, fn in cases:
+        elapsed = timeit.timeit(fn, number=number)
+        print(f"  {label:<24} {elapsed / number * 1e6:6.2f} us/message")
@@ -0,0 +1,117 @@
+"""
+Load test for the HTML pages: requests/sec against a real uvicorn server on
+localhost, rendering every request (as before the render cache) and then
+serving cached pages. Also shows the caching headers returning browsers get
+for the favicon and static assets.
+
+Run from the repository root: python -m benchmarks.bench_pages [--requests N] [--clients N]
+"""
+import argparse
+import http.client
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("SABAAC_DB", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+import uvicorn
+import sabaac
+from models.game_types import CorellianGambit
+from models.player import Player
+
+COOKIE = "bench-cookie"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int) -> uvicorn.Server:
+    # lifespan off: no journal recovery or sweeper, only the routes are measured
+    server = uvicorn.Server(uvicorn.Config(sabaac.app, host="127.0.0.1", port=port,
+                                           log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def make_game() -> str:
+    game = CorellianGambit(seed=1)
+    game.add_player(Player(COOKIE, 1, username="bench"))
+    game.add_player(Player("other", 2, username="other"))
+    sabaac.game_manager.add_game(game)
+    game.start()
+    return game.code
+
+
+def client(port: int, path: str, count: int, latencies: List[float]) -> None:
+    # one keep-alive connection per client, like a browser
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    headers = {"Cookie": f"games_anon_cookie={COOKIE}"}
+    for _ in range(count):
+        start = time.perf_counter()
+        connection.request("GET", path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        assert response.status == 200, (path, response.status)
+    connection.close()
+
+
+def load(port: int, path: str, requests: int, clients: int) -> Tuple[float, float]:
+    """Requests/sec and p99 latency in ms"""
+    latencies: List[float] = []
+    threads = [threading.Thread(target=client, args=(port, path, requests // clients, latencies))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def headers(port: int, path: str) -> Dict[str, str]:
+    connection = http.client.HTTPConnection("127.0.0.1", port)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return {k.lower(): v for k, v in response.getheaders()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--clients", type=int, default=8)
+    args = parser.parse_args()
+
+    port = free_port()
+    server = start_server(port)
+    code = make_game()
+    paths = ["/login/", f"/lobby/{code}", f"/sabaac/{code}"]
+    cache_size = sabaac.render_cache.maxsize
+    print(f"{args.requests} requests per page from {args.clients} keep-alive clients")
+    for path in paths:
+        results = []
+        for label, maxsize in (("render per request", 0), ("render cache", cache_size)):
+            sabaac.render_cache.maxsize = maxsize
+            sabaac.render_cache.clear()
+            load(port, path, args.clients * 10, args.clients)  # warm up
+            results.append((label, *load(port, path, args.requests, args.clients)))
+        for label, rps, p99 in results:
+            print(f"  {path:<20} {label:<20} {rps:8.0f} req/s   p99 {p99:6.2f} ms")
+        print(f"  {'':<20} {'speedup':<20} {results[1][1] / results[0][1]:8.2f}x")
+
+    print("caching headers")
+    for path in ["/favicon.ico", sabaac.static_assets.url("js/sabaac.js"), "/static/js/sabaac.js"]:
+        print(f"  {path:<40} {headers(port, path).get('cache-control')}")
+    server.should_exit = True
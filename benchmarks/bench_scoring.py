@@ -0,0 +1,57 @@
+"""
+Scores 1M random Corellian Gambit hands with the original one-hand-at-a-time
+scoring of CorellianGambit.calculate_scores, with the lookup tables of
+Rules.score_hand and with the vectorized engine, both from Python lists
+(Rules.score_batch) and from a rank matrix that is already packed
+(Rules.score_matrix). Every engine must give the baseline's exact scores.
+
+Run from the repository root: python -m benchmarks.bench_scoring
+"""
+import time
+import numpy as np
+from models.scoring import pack_hands
+from models.variants import VARIANTS
+
+
+def baseline_score(hand_vals: list) -> int:
+    """Scoring of CorellianGambit.calculate_scores before the variant engine"""
+    score = 0
+    if sorted(hand_vals) == [-10, 0, 10]:
+        score += 10000
+    if sum(hand_vals) == 0:
+        score += 10000
+    score += abs(sum(hand_vals)) * -100
+    score += len(hand_vals) * 10
+    score += sum([c for c in hand_vals if c > 0])
+    return score
+
+
+def random_hands(deck_ranks: list, num_hands: int, max_hand_size: int) -> list:
+    rng = np.random.default_rng(0)
+    deck = np.array(deck_ranks, dtype=np.int8)
+    counts = rng.integers(2, max_hand_size + 1, size=num_hands)
+    # sampling without replacement per hand: the lowest keys of a random permutation
+    picks = np.argsort(rng.random((num_hands, len(deck))), axis=1)[:, :max_hand_size]
+    ranks = deck[picks]
+    return [row[:n].tolist() for row, n in zip(ranks, counts)]
+
+
+def timed(label: str, num_hands: int, fn) -> list:
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed:7.3f} s  {elapsed / num_hands * 1e9:8.1f} ns/hand")
+    return result
+
+
+if __name__ == "__main__":
+    num_hands = 1_000_000
+    rules = VARIANTS["CorellianGambit"]
+    hands = random_hands([c.rank for c in rules.deck], num_hands, 5)
+    print(f"{num_hands} hands of 2-5 cards")
+    reference = timed("baseline per hand", num_hands, lambda: [baseline_score(h) for h in hands])
+    tables = timed("score_hand per hand", num_hands, lambda: [rules.score_hand(h) for h in hands])
+    batch = timed("score_batch", num_hands, lambda: rules.score_batch(hands))
+    ranks, counts = pack_hands(hands)
+    packed = timed("score_matrix (packed)", num_hands, lambda: rules.score_matrix(ranks, counts))
+    assert tables == reference and batch == reference and packed.tolist() == reference
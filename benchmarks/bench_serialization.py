@@ -0,0 +1,85 @@
+"""
+Compares the per-broadcast cost of the original GameState serialization
+(reflective __dict__ walk, indent=4, encoded again by send_json) against
+encoding the shared delta once and splicing in each player's private fields.
+
+Run from the repository root: python -m benchmarks.bench_serialization
+"""
+import json
+import random
+import timeit
+from models.action_log import ActionLog, LogEvent, format_entry
+from models.encoding import JSON, MSGPACK, SharedMessage, msgpack
+from models.game_state import GameState
+from models.game_types import CorellianGambit
+from models.player import Player
+from models.state_stream import StateStream
+
+
+TIMESTAMP = 1635595200000
+
+
+def make_game(num_players: int, num_actions: int) -> CorellianGambit:
+    random.seed(0)
+    game = CorellianGambit()
+    for i in range(num_players):
+        player = game.add_player(Player(f"cookie{i}", i + 1, username=f"player{i}"))
+        player.hand.extend(game.deck.popleft() for _ in range(2))
+    game.discard.append(game.deck.popleft())
+    for i in range(num_actions):
+        game.action_log.append(LogEvent.DREW_DECK, f"player{i % num_players}", created_at=TIMESTAMP)
+    return game
+
+
+def legacy_fields(o):
+    if isinstance(o, ActionLog):
+        # the original log was a list of every message, all of it sent on each broadcast
+        return [format_entry(e) for e in o.spilled + list(o.entries)]
+    # Cards and players use __slots__ now, their to_dict gives what __dict__ used to
+    return o.__dict__ if hasattr(o, "__dict__") else o.to_dict()
+
+
+def legacy_broadcast(game: CorellianGambit) -> int:
+    game_state = GameState(game)
+    game_state.topdiscard = game.discard[-1]
+    total = 0
+    for player in game.get_players():
+        game_state.playerhand = player.hand
+        game_state.playercredits = player.credits
+        encoded = json.dumps(game_state, default=legacy_fields, sort_keys=True, indent=4)
+        # ConnectionManager.send_json encoded the string a second time
+        total += len(json.dumps(encoded))
+    return total
+
+
+def spliced_broadcast(game: CorellianGambit, stream: StateStream, fmt: str) -> int:
+    game.action_log.append(LogEvent.DREW_DECK, "player0", created_at=TIMESTAMP)
+    game_state = GameState(game)
+    delta = SharedMessage(stream.publish(game_state))
+    total = 0
+    for player in game.get_players():
+        game_state.playerhand = player.hand
+        game_state.playercredits = player.credits
+        total += len(delta.encode(fmt, stream.private_changes(player.cookie, game_state)))
+    return total
+
+
+def run(num_players: int = 4, num_actions: int = 60, number: int = 2000) -> None:
+    print(f"{num_players} players, {num_actions} logged actions, per broadcast")
+    game = make_game(num_players, num_actions)
+    legacy_bytes = legacy_broadcast(game)
+    legacy_us = timeit.timeit(lambda: legacy_broadcast(game), number=number) / number * 1e6
+    print(f"  legacy json x2     {legacy_bytes:8d} bytes/op {legacy_us:9.1f} us/op")
+    formats = [JSON] + ([MSGPACK] if msgpack is not None else [])
+    for fmt in formats:
+        game = make_game(num_players, num_actions)
+        stream = StateStream()
+        spliced_broadcast(game, stream, fmt)
+        delta_bytes = spliced_broadcast(game, stream, fmt)
+        delta_us = timeit.timeit(lambda: spliced_broadcast(game, stream, fmt), number=number) / number * 1e6
+        print(f"  spliced delta {fmt:7s}{delta_bytes:8d} bytes/op {delta_us:9.1f} us/op")
+
+
+if __name__ == "__main__":
+    run()
+    run(num_players=8, num_actions=300, number=500)
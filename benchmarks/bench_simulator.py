@@ -0,0 +1,23 @@
+"""
+Plays bot games headlessly across every core and reports engine throughput
+and aggregate game stats.
+
+Run from the repository root: python -m benchmarks.bench_simulator [--games N] [--policies greedy,random,...]
+"""
+import argparse
+import json
+import os
+from models.simulator import POLICIES, simulate_games
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--policies", default="greedy,greedy,random,pass",
+                        help=f"one per seat, from {', '.join(POLICIES)}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stats = simulate_games(args.games, args.policies.split(","), seed=args.seed, workers=args.workers)
+    print(json.dumps(stats.to_dict(), indent=4))
@@ -0,0 +1,94 @@
+"""
+Cost of fanning a public delta out to a game's spectators: encoding it once
+and writing the same frame to every socket, against a json.dumps per
+spectator. Also the frames a spectator receives in fixed-rate mode.
+
+Run from the repository root: python -m benchmarks.bench_spectators
+"""
+import asyncio
+import time
+from models.connection_manager import ConnectionManager
+from models.encoding import SharedMessage, dumps
+from models.timing_wheel import TimingWheel
+
+
+class NullWebSocket:
+    query_params = {}
+
+    def __init__(self):
+        self.frames = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.frames += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def make_delta(seq: int) -> dict:
+    return {"type": "delta", "seq": seq, "prev": seq - 1,
+            "changes": {"currentplayer": f"player{seq % 4}", "round": seq // 4 + 1,
+                        "topdiscard": {"id": seq, "suite": "circle", "rank": seq % 10}},
+            "messages": [{"seq": seq, "timestamp": "2021-10-30T12:00:00", "body": f"player{seq % 4} passed"}]}
+
+
+async def fan_out(num_spectators: int, rounds: int) -> None:
+    manager = ConnectionManager(max_queue_depth=rounds + 1)
+    sockets = [NullWebSocket() for _ in range(num_spectators)]
+    for websocket in sockets:
+        await manager.connect(None, websocket)
+        manager.spectate("code", websocket)
+    deltas = [make_delta(seq) for seq in range(1, rounds + 1)]
+
+    start = time.perf_counter()
+    for delta in deltas:
+        manager.broadcast_spectators("code", SharedMessage(delta))
+    shared = (time.perf_counter() - start) / rounds
+    await asyncio.sleep(0)
+    for writer in manager.writers.values():
+        writer.queue.clear()
+
+    start = time.perf_counter()
+    for delta in deltas:
+        for websocket in sockets:
+            manager.writers[websocket].enqueue(dumps(delta), "code")
+    per_viewer = (time.perf_counter() - start) / rounds
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    print(f"  {num_spectators:>6} spectators   encode once {shared * 1e3:7.3f} ms/delta"
+          f"   encode per spectator {per_viewer * 1e3:7.3f} ms/delta   {per_viewer / shared:5.1f}x")
+
+
+async def paced(num_spectators: int, changes_per_second: int, seconds: int, interval: float) -> None:
+    clock = [0.0]
+    scheduler = TimingWheel(tick=0.05, clock=lambda: clock[0])
+    manager = ConnectionManager(scheduler=scheduler, max_queue_depth=10000)
+    sockets = [NullWebSocket() for _ in range(num_spectators)]
+    for websocket in sockets:
+        await manager.connect(None, websocket)
+        manager.spectate("code", websocket, interval)
+    seq = 0
+    for step in range(seconds * changes_per_second):
+        seq += 1
+        manager.broadcast_spectators("code", SharedMessage(make_delta(seq)))
+        clock[0] = (step + 1) / changes_per_second
+        scheduler.advance()
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+    print(f"  {num_spectators:>6} spectators   {changes_per_second} changes/s for {seconds}s at interval {interval}s:"
+          f" {sockets[0].frames} frames each instead of {seq}")
+
+
+async def main() -> None:
+    print("fan out, live mode")
+    for num_spectators in (100, 1000, 5000):
+        await fan_out(num_spectators, rounds=20)
+    print("fixed-rate mode")
+    await paced(1000, changes_per_second=10, seconds=10, interval=1.0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
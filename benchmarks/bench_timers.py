@@ -0,0 +1,96 @@
+"""
+Cost of arming and cancelling 100k timers: the timing wheel, asyncio's
+loop.call_later (a heap of TimerHandles) and one sleeping task per timer.
+Also the wheel's per tick cost with every timer armed, and memory per timer.
+
+Run from the repository root: python -m benchmarks.bench_timers [--timers N]
+"""
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from typing import Callable, List, Tuple
+from models.timing_wheel import TimingWheel
+
+
+def noop() -> None:
+    pass
+
+
+async def sleeper(delay: float) -> None:
+    await asyncio.sleep(delay)
+
+
+def wheel_case(delays: List[float]) -> Tuple[Callable[[], list], Callable[[list], None]]:
+    wheel = TimingWheel()
+    return (lambda: [wheel.call_later(d, noop) for d in delays],
+            lambda timers: [t.cancel() for t in timers])
+
+
+def call_later_case(delays: List[float]) -> Tuple[Callable[[], list], Callable[[list], None]]:
+    loop = asyncio.get_running_loop()
+    return (lambda: [loop.call_later(d, noop) for d in delays],
+            lambda handles: [h.cancel() for h in handles])
+
+
+def task_case(delays: List[float]) -> Tuple[Callable[[], list], Callable[[list], None]]:
+    return (lambda: [asyncio.ensure_future(sleeper(d)) for d in delays],
+            lambda tasks: [t.cancel() for t in tasks])
+
+
+async def measure(label: str, make_case, delays: List[float]) -> None:
+    arm, cancel = make_case(delays)
+    start = time.perf_counter()
+    timers = arm()
+    # let tasks reach their sleep, which is where they allocate their handles
+    await asyncio.sleep(0)
+    armed = time.perf_counter() - start
+    start = time.perf_counter()
+    cancel(timers)
+    await asyncio.sleep(0)
+    cancelled = time.perf_counter() - start
+    # again under tracemalloc, which slows allocation down too much to time it
+    tracemalloc.start()
+    timers = arm()
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    cancel(timers)
+    await asyncio.sleep(0)
+    n = len(delays)
+    print(f"  {label:<22} arm {armed / n * 1e6:6.2f} us   cancel {cancelled / n * 1e6:6.2f} us"
+          f"   {memory / n:6.0f} B/timer")
+
+
+def wheel_ticks(delays: List[float]) -> None:
+    clock = [0.0]
+    wheel = TimingWheel(clock=lambda: clock[0])
+    for d in delays:
+        wheel.call_later(d, noop)
+    ticks = int(max(delays) / wheel.tick) + 1
+    start = time.perf_counter()
+    for tick in range(1, ticks + 1):
+        clock[0] = tick * wheel.tick
+        wheel.advance()
+    elapsed = time.perf_counter() - start
+    print(f"  wheel advance          {elapsed / ticks * 1e6:6.2f} us/tick over {ticks} ticks, "
+          f"{wheel.fired} fired")
+
+
+async def main(num_timers: int) -> None:
+    rng = random.Random(0)
+    # heartbeats, turn timeouts and lobby expiry, 20s to 15 minutes out
+    delays = [rng.uniform(20, 900) for _ in range(num_timers)]
+    print(f"{num_timers} timers")
+    await measure("timing wheel", wheel_case, delays)
+    await measure("loop.call_later", call_later_case, delays)
+    await measure("task per timer", task_case, delays)
+    wheel_ticks(delays)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--timers", type=int, default=100000)
+    args = parser.parse_args()
+    asyncio.run(main(args.timers))
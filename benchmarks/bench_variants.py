@@ -0,0 +1,75 @@
+"""
+Per variant cost of creating a game and of scoring hands with the compiled
+rules: construction from the shared deck template against building the deck
+from the variant spec for every game, ranking a table of 4 players at the end
+of a game, and scoring many hands through the score lookup tables.
+
+Run from the repository root: python -m benchmarks.bench_variants [--games N] [--hands N]
+"""
+import argparse
+import random
+import time
+from models.card import Card
+from models.game_types import variant_types
+from models.player import Player
+from models.variants import VARIANT_SPECS, VARIANTS, Rules
+
+
+def construct(name: str, num_games: int) -> float:
+    make_game = variant_types()[name]
+    start = time.perf_counter()
+    for seed in range(num_games):
+        make_game(seed=seed)
+    return (time.perf_counter() - start) / num_games
+
+
+def construct_from_spec(name: str, num_games: int) -> float:
+    """What a game type with its own copy of the setup would pay: new cards from the spec every game"""
+    spec = VARIANT_SPECS[name]
+    start = time.perf_counter()
+    for seed in range(num_games):
+        deck = [Card(i, suite, rank) for i, (suite, rank) in
+                enumerate((suite, rank) for suite, rank, copies in spec["deck"] for _ in range(copies))]
+        random.Random(seed).shuffle(deck)
+    return (time.perf_counter() - start) / num_games
+
+
+def rank_tables(rules: Rules, num_tables: int, rng: random.Random) -> float:
+    tables = []
+    for _ in range(num_tables):
+        cards = rng.sample(rules.deck, 4 * (rules.hand_size + 1))
+        tables.append([Player(f"p{i}", i + 1, hand=cards[i::4]) for i in range(4)])
+    start = time.perf_counter()
+    for players in tables:
+        rules.rank_players(players)
+    return (time.perf_counter() - start) / num_tables
+
+
+def score_hands(rules: Rules, num_hands: int, rng: random.Random) -> float:
+    ranks = [c.rank for c in rules.deck]
+    hands = [rng.sample(ranks, rng.randint(2, 5)) for _ in range(num_hands)]
+    start = time.perf_counter()
+    rules.score_batch(hands)
+    return (time.perf_counter() - start) / num_hands
+
+
+def main(num_games: int, num_hands: int) -> None:
+    rng = random.Random(0)
+    start = time.perf_counter()
+    compiled = [Rules(name, spec) for name, spec in VARIANT_SPECS.items()]
+    print(f"compiling {len(compiled)} variants took {(time.perf_counter() - start) * 1e3:.2f} ms")
+    print(f"{'variant':<22}{'cards':>6}{'new game':>12}{'deck per game':>15}{'rank 4 players':>16}{'score hand':>12}")
+    for name, rules in VARIANTS.items():
+        print(f"{name:<22}{len(rules.deck):>6}"
+              f"{construct(name, num_games) * 1e6:>9.1f} us"
+              f"{construct_from_spec(name, num_games) * 1e6:>12.1f} us"
+              f"{rank_tables(rules, num_games, rng) * 1e6:>13.1f} us"
+              f"{score_hands(rules, num_hands, rng) * 1e9:>9.0f} ns")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--hands", type=int, default=200000)
+    args = parser.parse_args()
+    main(args.games, args.hands)
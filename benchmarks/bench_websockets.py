@@ -0,0 +1,343 @@
+"""
+End-to-end load test: a local uvicorn server and simulated players that go
+through the real flow. Each game is created with /createGame/, joined with
+/joinGame/, named and started over /lobbyws, loaded with /sabaac/{code} and
+played to the end over /sabaacws.
+
+Reports p50/p99 action-to-update latency (a player's action until its own
+socket receives the resulting delta), frames/sec, and server CPU and RSS
+per concurrent game. Results are written as JSON. Given --baseline, the run
+fails when p99 latency, frames/sec, CPU or RSS per game is more than
+--tolerance worse than the baseline.
+
+Run from the repository root:
+    python -m benchmarks.bench_websockets [--games 250] [--players 4] [--workers 1]
+        [--output results.json] [--baseline benchmarks/results/websockets-<commit>.json]
+Results go to benchmarks/results/websockets-<commit>.json unless --output is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import requests
+try:
+    import websockets
+except ImportError:
+    # Only needed to run this benchmark
+    websockets = None
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASS, DRAW_DECK, DISCARD = 3, 1, 4
+# result key to whether a bigger value is better, checked against a baseline
+REGRESSION_CHECKS = {"latency_p99_ms": False, "frames_per_second": True,
+                     "cpu_seconds_per_game": False, "rss_kb_per_game": False}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, workers: int, backend: str, db_path: str) -> subprocess.Popen:
+    env = dict(os.environ, SABAAC_BACKEND=backend, SABAAC_DB=db_path, SABAAC_LOG_LEVEL="WARNING")
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "sabaac:app", "--workers", str(workers),
+                                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                               cwd=repo_root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while True:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/login/", timeout=1)
+            return process
+        except requests.ConnectionError:
+            if time.time() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.1)
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and its descendants, uvicorn workers are children of the supervisor"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            for child in f.read().split():
+                pids.extend(process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+
+def server_usage(pid: int) -> Optional[Dict[str, float]]:
+    """CPU seconds and RSS of the server processes, None where /proc is unavailable"""
+    cpu, rss = 0.0, 0
+    try:
+        for p in process_tree(pid):
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+            with open(f"/proc/{p}/status") as f:
+                rss += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    except (OSError, StopIteration):
+        return None
+    return {"cpu_seconds": cpu, "rss_kb": rss}
+
+
+def connect(address: str, path: str, cookie: str):
+    headers = {"Cookie": f"games_anon_cookie={cookie}"}
+    if int(websockets.__version__.split(".")[0]) >= 14:
+        return websockets.connect(f"ws://{address}{path}", additional_headers=headers, max_queue=None)
+    return websockets.connect(f"ws://{address}{path}", extra_headers=headers, max_queue=None)
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.frames_received: int = 0
+        self.frames_sent: int = 0
+        self.games_finished: int = 0
+        self.errors: Dict[str, int] = {}
+
+    def error(self, e: BaseException) -> None:
+        self.errors[type(e).__name__] = self.errors.get(type(e).__name__, 0) + 1
+
+
+class Player:
+    """One simulated client, holding the state its socket has been sent"""
+    def __init__(self, address: str, cookie: str, username: str, stats: LoadStats, rng: random.Random):
+        self.address: str = address
+        self.cookie: str = cookie
+        self.username: str = username
+        self.stats: LoadStats = stats
+        self.rng: random.Random = rng
+        self.state: Dict[str, Any] = {}
+        # seq of the newest frame received on the current socket
+        self.seq: int = 0
+        self.socket = None
+
+    async def send(self, message: dict) -> None:
+        await self.socket.send(json.dumps(message))
+        self.stats.frames_sent += 1
+
+    async def receive(self) -> dict:
+        frame = json.loads(await asyncio.wait_for(self.socket.recv(), 30))
+        self.stats.frames_received += 1
+        self.seq = max(self.seq, frame.get("seq", 0))
+        if frame.get("type") == "ping":
+            await self.send({"pong": True})
+        elif frame.get("type") == "error":
+            raise RuntimeError(frame["error"])
+        elif frame.get("type") == "snapshot":
+            self.state = dict(frame["state"], **frame.get("private", {}))
+        elif frame.get("type") == "delta":
+            self.state.update(frame["changes"])
+            self.state.update(frame.get("private") or {})
+        return frame
+
+    async def receive_until(self, done) -> None:
+        while not done(self.state):
+            await self.receive()
+
+    def choose(self) -> dict:
+        hand = self.state.get("playerhand") or []
+        roll = self.rng.random()
+        if roll < 0.2 and len(hand) < 5:
+            return {"code": self.state["code"], "action": DRAW_DECK, "actionValue": None}
+        if roll < 0.4 and len(hand) > 1:
+            return {"code": self.state["code"], "action": DISCARD, "actionValue": self.rng.choice(hand)["id"]}
+        return {"code": self.state["code"], "action": PASS, "actionValue": None}
+
+    async def play(self) -> None:
+        while self.state.get("winner") is None:
+            if self.state.get("currentplayer") == self.username:
+                seq = self.seq
+                start = time.perf_counter()
+                await self.send(self.choose())
+                # the update for this action is the first delta after the current seq
+                while self.seq <= seq:
+                    await self.receive()
+                self.stats.latencies.append(time.perf_counter() - start)
+            else:
+                await self.receive()
+
+
+async def http(executor: ThreadPoolExecutor, method: str, url: str, cookie: str, **kwargs) -> requests.Response:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, lambda: requests.request(
+        method, url, cookies={"games_anon_cookie": cookie}, allow_redirects=False, timeout=30, **kwargs))
+
+
+async def play_game(address: str, index: int, num_players: int, stats: LoadStats,
+                    executor: ThreadPoolExecutor, seed: int) -> None:
+    players = [Player(address, f"bench-{index}-{p}", f"g{index}p{p}", stats, random.Random(seed * 1000 + index + p))
+               for p in range(num_players)]
+    host = players[0]
+    response = await http(executor, "GET", f"http://{address}/createGame/", host.cookie)
+    code = response.headers["location"].split("/")[-1]
+    for player in players[1:]:
+        await http(executor, "POST", f"http://{address}/joinGame/", player.cookie, data={"gameCode": code})
+
+    usernames = {p.username for p in players}
+    async with connect_all(players, "/lobbyws"):
+        for player in players:
+            await player.send({"code": code, "resync": 0})
+            await player.receive()
+            await player.send({"code": code, "username": player.username, "startgame": False})
+        for player in players:
+            await player.receive_until(lambda s: {p["username"] for p in s.get("players") or []} >= usernames)
+        await host.send({"code": code, "username": host.username, "startgame": True})
+        for player in players:
+            await player.receive_until(lambda s: s.get("startgame") is True)
+
+    for player in players:
+        await http(executor, "GET", f"http://{address}/sabaac/{code}", player.cookie)
+    async with connect_all(players, "/sabaacws"):
+        for player in players:
+            await player.send({"code": code, "resync": 0})
+            await player.receive_until(lambda s: "playerhand" in s)
+        await asyncio.gather(*(player.play() for player in players))
+    stats.games_finished += 1
+
+
+class connect_all:
+    """Open a socket per player for the duration of a phase"""
+    def __init__(self, players: List[Player], path: str):
+        self.players: List[Player] = players
+        self.path: str = path
+
+    async def __aenter__(self) -> None:
+        for player in self.players:
+            player.state, player.seq = {}, 0
+            player.socket = await connect(player.address, self.path, player.cookie)
+
+    async def __aexit__(self, *exc_info) -> None:
+        for player in self.players:
+            await player.socket.close()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run_load(address: str, pid: int, games: int, concurrent: int, num_players: int,
+                   seed: int) -> Dict[str, Any]:
+    stats = LoadStats()
+    semaphore = asyncio.Semaphore(concurrent)
+    executor = ThreadPoolExecutor(max_workers=32)
+    peak = {"rss_kb": 0}
+    baseline = server_usage(pid)
+
+    async def sample() -> None:
+        while True:
+            usage = server_usage(pid)
+            if usage is not None:
+                peak["rss_kb"] = max(peak["rss_kb"], usage["rss_kb"])
+            await asyncio.sleep(0.25)
+
+    async def one(index: int) -> None:
+        async with semaphore:
+            try:
+                await play_game(address, index, num_players, stats, executor, seed)
+            except Exception as e:
+                stats.error(e)
+
+    sampler = asyncio.ensure_future(sample())
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(games)))
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+    executor.shutdown()
+    usage = server_usage(pid)
+    live_games = min(games, concurrent)
+    return {"games": games,
+            "players_per_game": num_players,
+            "concurrent_games": live_games,
+            "clients": games * num_players,
+            "games_finished": stats.games_finished,
+            "errors": stats.errors,
+            "elapsed_seconds": elapsed,
+            "actions": len(stats.latencies),
+            "latency_p50_ms": percentile(stats.latencies, 0.5) * 1000,
+            "latency_p99_ms": percentile(stats.latencies, 0.99) * 1000,
+            "frames_received": stats.frames_received,
+            "frames_sent": stats.frames_sent,
+            "frames_per_second": (stats.frames_received + stats.frames_sent) / elapsed,
+            "cpu_seconds_per_game": (usage["cpu_seconds"] - baseline["cpu_seconds"]) / games
+            if usage and baseline else None,
+            "rss_kb_per_game": (peak["rss_kb"] - baseline["rss_kb"]) / live_games
+            if usage and baseline else None}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_root, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Metrics more than tolerance worse than the baseline"""
+    failures = []
+    for key, higher_is_better in REGRESSION_CHECKS.items():
+        current, previous = results.get(key), baseline.get(key)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if (-change if higher_is_better else change) > tolerance:
+            failures.append(f"{key}: {previous:.2f} -> {current:.2f} ({change:+.0%})")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--games", type=int, default=250)
+    parser.add_argument("--concurrent", type=int, default=None, help="games in flight at once, all by default")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None, help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if websockets is None:
+        sys.exit("websockets is required: pip install websockets")
+    if args.backend == "memory" and args.workers > 1:
+        sys.exit("several workers need --backend sqlite")
+
+    port = free_port()
+    server = start_server(port, args.workers, args.backend, os.path.join(tempfile.mkdtemp(), "bench.db"))
+    try:
+        results = asyncio.run(run_load(f"127.0.0.1:{port}", server.pid, args.games,
+                                       args.concurrent or args.games, args.players, args.seed))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    results.update(commit=git_commit(), workers=args.workers, backend=args.backend)
+    output = args.output or os.path.join(repo_root, "benchmarks", "results", f"websockets-{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            failures = regressions(results, json.load(f), args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+    if results["errors"] or results["games_finished"] < results["games"]:
+        sys.exit(1)
@@ -0,0 +1,152 @@
+import asyncio
+from bisect import bisect_left, insort
+from contextlib import closing
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from models.batch_writer import BatchWriter
+
+
+# (cookie, username, kind, amount) credit change, kind is "ante" or "payout"
+LedgerEntry = Tuple[str, str, str, int]
+
+
+class Leaderboard:
+    """
+    The top size accounts by balance, kept sorted in memory and updated from
+    each committed ledger batch, so reading a page never touches the database.
+    The board is always an exact prefix of the full ranking: bound is a
+    ranking key no account off the board comes before, a changed balance only
+    goes on the board if it ranks ahead of bound, and an account falling back
+    leaves it. When that leaves the board short, needs_refill asks for the
+    top rows to be read back through the Accounts balance index.
+    """
+    def __init__(self, size: int = 100):
+        self.size: int = size
+        # (-balance, cookie) ascending, i.e. richest first, ties by cookie like the index
+        self.ranking: List[Tuple[int, str]] = []
+        # cookie to (username, balance) of every account on the board
+        self.accounts: Dict[str, Tuple[str, int]] = {}
+        # None when every account is on the board, nothing can be placed until the first reset
+        self.bound: Optional[tuple] = (float("-inf"),)
+
+    def __len__(self) -> int:
+        return len(self.ranking)
+
+    @property
+    def needs_refill(self) -> bool:
+        return len(self.ranking) < self.size and self.bound is not None
+
+    def reset(self, rows: Iterable[Tuple[str, str, int]]) -> None:
+        """Replace the board with the top (cookie, username, balance) rows, richest first"""
+        rows = list(rows)[:self.size]
+        self.ranking = [(-balance, cookie) for cookie, _, balance in rows]
+        self.accounts = {cookie: (username, balance) for cookie, username, balance in rows}
+        # a full board may have accounts behind it
+        self.bound = self.ranking[-1] if len(rows) == self.size else None
+
+    def update(self, cookie: str, username: str, balance: int) -> None:
+        if cookie in self.accounts:
+            _, old = self.accounts.pop(cookie)
+            del self.ranking[bisect_left(self.ranking, (-old, cookie))]
+        key = (-balance, cookie)
+        if self.bound is not None and key >= self.bound:
+            return
+        insort(self.ranking, key)
+        self.accounts[cookie] = (username, balance)
+        if len(self.ranking) > self.size:
+            dropped = self.ranking.pop()
+            del self.accounts[dropped[1]]
+            self.bound = dropped if self.bound is None else min(self.bound, dropped)
+
+    def page(self, offset: int, limit: int) -> List[dict]:
+        return [{"rank": offset + i + 1, "username": self.accounts[cookie][0], "balance": -balance}
+                for i, (balance, cookie) in enumerate(self.ranking[offset:offset + limit])]
+
+
+class Accounts(BatchWriter):
+    """
+    Credit balances that outlive games, kept in SQLite next to the journal.
+    Every ante and payout is appended to the Ledger table; entries are
+    group committed by the BatchWriter task, each batch also applying them to the Accounts balances and feeds the
+    new balances to the in-memory leaderboard. An account is keyed by the
+    player's cookie and starts with starting_balance credits.
+    """
+    def __init__(self, db_path: str = "sabaac.db", starting_balance: int = 100, leaderboard_size: int = 100):
+        super().__init__()
+        self.db_path: str = db_path
+        self.starting_balance: int = starting_balance
+        self.leaderboard: Leaderboard = Leaderboard(leaderboard_size)
+        self.has_schema: bool = False
+        # (cookie, username, game guid, kind, amount, created at) rows waiting for the next commit
+        self.pending_entries: List[tuple] = []
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=5.0)
+        if not self.has_schema:
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS Ledger "
+                                   "(Id integer PRIMARY KEY AUTOINCREMENT, Cookie text, GameGuid text, "
+                                   "Kind text, Amount integer, CreatedAt real)")
+                connection.execute("CREATE INDEX IF NOT EXISTS LedgerCookie ON Ledger (Cookie, Id)")
+                connection.execute("CREATE TABLE IF NOT EXISTS Accounts "
+                                   "(Cookie text PRIMARY KEY, Username text, Balance integer, UpdatedAt real)")
+                connection.execute("CREATE INDEX IF NOT EXISTS AccountsBalance ON Accounts (Balance DESC, Cookie)")
+            self.has_schema = True
+        return connection
+
+    def record(self, game_guid: str, entries: Iterable[LedgerEntry]) -> asyncio.Future:
+        """Queue credit changes from a game, the returned future resolves once they are committed"""
+        now = time.time()
+        self.pending_entries.extend((cookie, username, str(game_guid), kind, amount, now)
+                                    for cookie, username, kind, amount in entries)
+        return self.add_waiter()
+
+    def take_batch(self) -> Tuple[List[tuple]]:
+        entries, self.pending_entries = self.pending_entries, []
+        return (entries,)
+
+    def write_batch(self, entries: List[tuple]) -> List[Tuple[str, str, int]]:
+        """Commit entries, returns the new (cookie, username, balance) of each account they touched"""
+        with closing(self.connect()) as connection, connection:
+            connection.executemany("INSERT INTO Ledger (Cookie, GameGuid, Kind, Amount, CreatedAt) "
+                                   "VALUES (?, ?, ?, ?, ?)",
+                                   [(cookie, guid, kind, amount, created_at)
+                                    for cookie, _, guid, kind, amount, created_at in entries])
+            changes: Dict[str, List] = {}
+            for cookie, username, _, _, amount, created_at in entries:
+                change = changes.setdefault(cookie, [username, 0, created_at])
+                change[0], change[2] = username, created_at
+                change[1] += amount
+            connection.executemany("INSERT OR IGNORE INTO Accounts VALUES (?, ?, ?, ?)",
+                                   [(cookie, username, self.starting_balance, updated_at)
+                                    for cookie, (username, _, updated_at) in changes.items()])
+            connection.executemany("UPDATE Accounts SET Username = ?, Balance = Balance + ?, UpdatedAt = ? "
+                                   "WHERE Cookie = ?",
+                                   [(username, amount, updated_at, cookie)
+                                    for cookie, (username, amount, updated_at) in changes.items()])
+            return [connection.execute("SELECT Cookie, Username, Balance FROM Accounts WHERE Cookie = ?",
+                                       (cookie,)).fetchone() for cookie in changes]
+
+    def load_top(self, connection: Optional[sqlite3.Connection] = None) -> List[Tuple[str, str, int]]:
+        """The richest leaderboard-size accounts, read through the balance index"""
+        if connection is None:
+            with closing(self.connect()) as connection:
+                return self.load_top(connection)
+        return connection.execute("SELECT Cookie, Username, Balance FROM Accounts "
+                                  "ORDER BY Balance DESC, Cookie LIMIT ?", (self.leaderboard.size,)).fetchall()
+
+    async def refresh(self) -> None:
+        """Reload the leaderboard, picking up balances other workers changed"""
+        self.leaderboard.reset(await asyncio.get_running_loop().run_in_executor(None, self.load_top))
+
+    async def on_commit(self, batch: Tuple[List[tuple]], balances: List[Tuple[str, str, int]]) -> None:
+        for cookie, username, balance in balances:
+            self.leaderboard.update(cookie, username, balance)
+        if self.leaderboard.needs_refill:
+            await self.refresh()
+
+    def balance(self, cookie: str) -> int:
+        with closing(self.connect()) as connection:
+            row = connection.execute("SELECT Balance FROM Accounts WHERE Cookie = ?", (cookie,)).fetchone()
+        return row[0] if row is not None else self.starting_balance
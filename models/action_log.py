@@ -0,0 +1,99 @@
+import datetime
+import enum
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class LogEvent(enum.Enum):
+    # free text, only used for entries migrated from the old pre-formatted log
+    NOTE = 0
+    DREW_DECK = 1
+    DREW_DISCARD = 2
+    DISCARDED = 3
+    ROLLED = 4
+    DOUBLES = 5
+    WON = 6
+
+
+TEMPLATES = {LogEvent.NOTE.value: "{0}",
+             LogEvent.DREW_DECK.value: "{0} drew from the deck",
+             LogEvent.DREW_DISCARD.value: "{0} drew from the discard pile",
+             LogEvent.DISCARDED.value: "{0} discarded a (ID: {1}) {2} of {3}",
+             LogEvent.ROLLED.value: "Rolled 2 dice: {0} and {1}",
+             LogEvent.DOUBLES.value: "Doubles!",
+             LogEvent.WON.value: "{0} wins the game, earning {1} credits"}
+
+# seq, epoch milliseconds, LogEvent value, template arguments
+LogEntry = Tuple[int, int, int, Tuple[Any, ...]]
+
+
+def format_entry(entry: LogEntry) -> Dict[str, Any]:
+    seq, created_at, event, args = entry
+    return {"seq": seq,
+            "timestamp": datetime.datetime.utcfromtimestamp(created_at / 1000).isoformat(),
+            "body": TEMPLATES[event].format(*args)}
+
+
+class ActionLog:
+    """
+    A game's action log. Only the last capacity entries are kept in memory,
+    as compact tuples that are formatted when sent; older entries wait in
+    spilled until GameManager writes them to the archive database.
+    len() counts every entry ever logged, entry seqs run from 0 to len() - 1.
+    """
+    capacity = 50
+
+    def __init__(self):
+        self.entries: Deque[LogEntry] = deque()
+        self.spilled: List[LogEntry] = []
+        self.length: int = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    def append(self, event: LogEvent, *args: Any, created_at: Optional[int] = None) -> LogEntry:
+        created_at = created_at if created_at is not None else int(time.time() * 1000)
+        entry = (self.length, created_at, event.value, args)
+        self.length += 1
+        self.entries.append(entry)
+        if len(self.entries) > self.capacity:
+            self.spilled.append(self.entries.popleft())
+        return entry
+
+    def recent(self) -> List[Dict[str, Any]]:
+        return [format_entry(e) for e in self.entries]
+
+    def since(self, seq: int) -> List[Dict[str, Any]]:
+        """Formatted entries from seq on, as far as they are still in memory"""
+        skip = max(0, len(self.entries) - (self.length - seq))
+        return [format_entry(self.entries[i]) for i in range(skip, len(self.entries))]
+
+    def page(self, before: int, limit: int) -> List[LogEntry]:
+        """Up to limit of the newest entries older than before, from memory and the spill"""
+        page: List[LogEntry] = []
+        # the spill holds the older entries, so newest first is memory then spill, both reversed
+        for entries in (self.entries, self.spilled):
+            for entry in reversed(entries):
+                if len(page) == limit:
+                    return page[::-1]
+                if entry[0] < before:
+                    page.append(entry)
+        return page[::-1]
+
+    def count(self, event: LogEvent) -> int:
+        return sum(1 for entries in (self.spilled, self.entries) for e in entries if e[2] == event.value)
+
+    def take_spilled(self) -> List[LogEntry]:
+        spilled = self.spilled
+        self.spilled = []
+        return spilled
+
+    @classmethod
+    def from_messages(cls, messages: List[Dict[str, str]]) -> "ActionLog":
+        """Convert the list of pre-formatted messages games used to keep"""
+        log = cls()
+        for message in messages:
+            created_at = datetime.datetime.fromisoformat(message["timestamp"]).replace(tzinfo=datetime.timezone.utc)
+            log.append(LogEvent.NOTE, message["body"], created_at=int(created_at.timestamp() * 1000))
+        return log
@@ -0,0 +1,69 @@
+import abc
+import asyncio
+from typing import Any, List, Optional
+
+
+class BatchWriter(metaclass=abc.ABCMeta):
+    """
+    Group commit for SQLite writers. Subclasses buffer rows and return
+    add_waiter(); a single writer task takes everything buffered so far with
+    take_batch() and commits it with write_batch() in an executor, so whatever
+    arrives while a commit is in flight goes into the next one. The waiters of
+    a batch resolve once it is committed, or get the exception that stopped it.
+    """
+    def __init__(self):
+        self.waiters: List[asyncio.Future] = []
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.committed_batches: int = 0
+        self.committed_entries: int = 0
+
+    @abc.abstractmethod
+    def take_batch(self) -> tuple:
+        """Swap out the buffered rows as write_batch() arguments, the first being the entries"""
+        pass
+
+    @abc.abstractmethod
+    def write_batch(self, *batch: Any) -> Any:
+        """Commit a batch in one transaction, runs off the event loop"""
+        pass
+
+    async def on_commit(self, batch: tuple, result: Any) -> None:
+        """Called on the loop with what write_batch() returned, before the waiters resolve"""
+        pass
+
+    def ensure_writer(self) -> None:
+        # The writer belongs to the running loop, restart it if that loop changed
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.task.get_loop() is not loop:
+            self.wakeup = asyncio.Event()
+            self.task = loop.create_task(self.run())
+
+    def add_waiter(self) -> asyncio.Future:
+        """A future for the batch holding everything buffered so far"""
+        self.ensure_writer()
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.wakeup.set()
+        return waiter
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            batch = self.take_batch()
+            waiters, self.waiters = self.waiters, []
+            try:
+                result = await loop.run_in_executor(None, self.write_batch, *batch)
+                await self.on_commit(batch, result)
+            except Exception as e:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                continue
+            self.committed_batches += 1
+            self.committed_entries += len(batch[0])
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
@@ -1,8 +1,50 @@
+from typing import Dict, List, Sequence, Tuple
+
+
 class Card:
+    # Cards are shared between games and never modified, slots keep each one small
+    __slots__ = ("id", "suite", "rank")
+
     def __init__(self, id: int, suite: str, rank: int):
         self.id: int = id
         self.suite: str = suite
         self.rank: int = rank
 
+    def to_dict(self) -> dict:
+        return {"id": self.id, "suite": self.suite, "rank": self.rank}
+
+    def __reduce__(self):
+        # Pickled games point back at the shared table instead of carrying their own copies
+        if 0 <= self.id < len(CARD_TABLE) and CARD_TABLE[self.id] is self:
+            return (deck_card, (self.id,))
+        return (Card, (self.id, self.suite, self.rank))
+
     def __repr__(self) -> str:
         return f"(ID: {self.id}) {self.rank} of {self.suite}"
+
+
+def deck_card(id: int) -> Card:
+    return CARD_TABLE[id]
+
+
+# Every card of every deck, a card's id is its index; decks, hands and discard piles hold references into this table
+CARD_TABLE: List[Card] = []
+# deck composition to the shared cards built for it
+DECKS: Dict[Tuple[Tuple[str, int], ...], Tuple[Card, ...]] = {}
+
+
+def build_deck(composition: Sequence[Tuple[str, int]]) -> Tuple[Card, ...]:
+    """Shared cards for a list of (suite, rank), built once per distinct composition"""
+    key = tuple(composition)
+    deck = DECKS.get(key)
+    if deck is None:
+        deck = DECKS[key] = tuple(Card(len(CARD_TABLE) + i, suite, rank) for i, (suite, rank) in enumerate(key))
+        CARD_TABLE.extend(deck)
+    return deck
+
+
+# The 62 card definitions
+CORELLIAN_GAMBIT_DECK: Tuple[Card, ...] = build_deck(
+    [(suite, val) for val in range(-10, 11)
+     for suite in ["circle", "triangle", "square"]
+     if val != 0] + [("sylop", 0) for _ in range(2)])
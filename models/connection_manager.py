@@ -1,42 +1,239 @@
-from typing import Dict, List, Optional
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
 from fastapi import Cookie, FastAPI, WebSocket, WebSocketDisconnect, Form
 from starlette.routing import WebSocketRoute, websocket_session
-from models.game_state import GameState
+from models.connection_writer import ConnectionWriter, SendStats
+from models.encoding import SharedMessage, negotiate_format
+from models.state_stream import merge_deltas
+from models.timing_wheel import Timer, TimingWheel
+
+
+logger = logging.getLogger(__name__)
+PING = SharedMessage({"type": "ping"})
+# close code telling a client a newer connection took over, so it must not reconnect
+REPLACED = 4001
 
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    Registry of open websockets, indexed by game code and by player cookie,
+    with reverse indexes so a disconnect only touches the entries it owns.
+    Sends never wait on the socket, frames are handed to each connection's
+    ConnectionWriter so a broadcast fans out to every client concurrently.
+    Given a scheduler, a connection that sent nothing for heartbeat_interval
+    seconds is pinged, and evicted if nothing arrives within heartbeat_timeout.
+    A player has one connection per game: when a cookie subscribes to a game
+    again, e.g. after its client reconnected, the older socket is closed.
+    Spectators are indexed apart from players and only get public frames,
+    written as the same encoded frame to all of them. A spectator may ask for
+    one update per interval, the deltas published meanwhile are merged once
+    for everyone watching the game at that interval.
+    """
+    def __init__(self, max_queue_depth: int = 32, send_timeout: float = 5.0,
+                 scheduler: Optional[TimingWheel] = None, heartbeat_interval: float = 20.0,
+                 heartbeat_timeout: float = 10.0):
+        self.active_connections: Set[WebSocket] = set()
         # game code to websocket mappings
-        self.game_connections: Dict[str, List[WebSocket]] = {}
-        # cookie to websocket mappings
-        self.cookie_connections: Dict[str, List[WebSocket]] = {}
+        self.game_connections: Dict[str, Set[WebSocket]] = {}
+        # cookie to websocket mappings, sockets without a cookie are not indexed
+        self.cookie_connections: Dict[str, Set[WebSocket]] = {}
+        # websocket to game code and cookie mappings
+        self.websocket_games: Dict[WebSocket, str] = {}
+        self.websocket_cookies: Dict[WebSocket, str] = {}
+        # websocket to outbound queue mappings
+        self.writers: Dict[WebSocket, ConnectionWriter] = {}
+        self.max_queue_depth: int = max_queue_depth
+        self.send_timeout: float = send_timeout
+        self.scheduler: Optional[TimingWheel] = scheduler
+        self.heartbeat_interval: float = heartbeat_interval
+        self.heartbeat_timeout: float = heartbeat_timeout
+        # websocket to heartbeat timer and time a frame was last received mappings
+        self.heartbeats: Dict[WebSocket, Timer] = {}
+        self.last_seen: Dict[WebSocket, float] = {}
+        # websockets pinged since they last sent anything
+        self.awaiting_pong: Set[WebSocket] = set()
+        # closes of replaced websockets still in flight
+        self.closing: Set[asyncio.Future] = set()
+        # game code to update interval (None for every change) to spectator websocket mappings
+        self.spectators: Dict[str, Dict[Optional[float], Set[WebSocket]]] = {}
+        self.spectating: Dict[WebSocket, Tuple[str, Optional[float]]] = {}
+        # (game code, interval) to deltas waiting for that interval's next update
+        self.pending_spectator_deltas: Dict[Tuple[str, float], List[dict]] = {}
 
     async def connect(self, cookie: str, websocket: websocket_session):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        if cookie in self.cookie_connections:
-            if websocket not in self.cookie_connections[cookie]:
-                self.cookie_connections[cookie].append(websocket)
-            else:
-                print(f"Websocket {websocket} already in self.cookie_connections")
+        self.active_connections.add(websocket)
+        self.writers[websocket] = ConnectionWriter(websocket,
+                                                   fmt=negotiate_format(websocket.query_params.get("format")),
+                                                   max_depth=self.max_queue_depth,
+                                                   send_timeout=self.send_timeout,
+                                                   on_evict=self.disconnect)
+        self.websocket_cookies[websocket] = cookie
+        # spectators connect without a cookie, only players are indexed
+        if cookie is not None:
+            self.cookie_connections.setdefault(cookie, set()).add(websocket)
+        if self.scheduler is not None:
+            self.last_seen[websocket] = self.scheduler.clock()
+            self.heartbeats[websocket] = self.scheduler.call_later(self.heartbeat_interval, self.heartbeat, websocket)
+
+    def seen(self, websocket: WebSocket) -> None:
+        """Any inbound frame shows the client is still there"""
+        if websocket in self.last_seen:
+            self.last_seen[websocket] = self.scheduler.clock()
+            self.awaiting_pong.discard(websocket)
+
+    def heartbeat(self, websocket: WebSocket) -> Optional[Any]:
+        writer = self.writers.get(websocket)
+        if writer is None:
+            return None
+        idle = self.scheduler.clock() - self.last_seen[websocket]
+        if idle < self.heartbeat_interval:
+            delay = self.heartbeat_interval - idle
+        elif websocket in self.awaiting_pong:
+            logger.info("Evicting websocket that did not answer a ping", extra={"game": writer.game_code})
+            return writer.evict()
         else:
-            self.cookie_connections[cookie] = [websocket]
+            self.awaiting_pong.add(websocket)
+            writer.enqueue(PING.encode(writer.fmt))
+            delay = self.heartbeat_timeout
+        self.heartbeats[websocket] = self.scheduler.call_later(delay, self.heartbeat, websocket)
+        return None
+
+    def subscribe(self, code: str, websocket: WebSocket) -> None:
+        """Route broadcasts for a game to this websocket, a websocket follows one game at a time"""
+        if self.websocket_games.get(websocket) == code:
+            return
+        self.unsubscribe(websocket)
+        cookie = self.websocket_cookies.get(websocket)
+        if cookie is not None:
+            for stale in [c for c in self.cookie_connections.get(cookie, ()) if self.websocket_games.get(c) == code]:
+                self.replace(stale)
+        self.websocket_games[websocket] = code
+        self.game_connections.setdefault(code, set()).add(websocket)
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.game_code = code
+
+    def replace(self, websocket: WebSocket) -> None:
+        """Drop a socket superseded by a newer one, its close finishes in the background"""
+        self.disconnect(websocket)
+        close = asyncio.ensure_future(asyncio.wait_for(websocket.close(code=REPLACED), self.send_timeout))
+        self.closing.add(close)
+        close.add_done_callback(self.closed)
+
+    def closed(self, close: asyncio.Future) -> None:
+        self.closing.discard(close)
+        if not close.cancelled() and close.exception() is not None:
+            logger.debug("Closing a replaced websocket failed: %r", close.exception())
+
+    def spectate(self, code: str, websocket: WebSocket, interval: Optional[float] = None) -> None:
+        """Route a game's public frames to this websocket, merged into one per interval seconds if given"""
+        if self.scheduler is None:
+            interval = None
+        if self.spectating.get(websocket) == (code, interval):
+            return
+        self.unspectate(websocket)
+        self.spectating[websocket] = (code, interval)
+        self.spectators.setdefault(code, {}).setdefault(interval, set()).add(websocket)
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.game_code = code
+
+    def unspectate(self, websocket: WebSocket) -> None:
+        spectating = self.spectating.pop(websocket, None)
+        if spectating is None:
+            return
+        code, interval = spectating
+        groups = self.spectators[code]
+        groups[interval].discard(websocket)
+        if not groups[interval]:
+            del groups[interval]
+            self.pending_spectator_deltas.pop((code, interval), None)
+        if not groups:
+            del self.spectators[code]
+
+    def unsubscribe(self, websocket: WebSocket) -> None:
+        code = self.websocket_games.pop(websocket, None)
+        if code is not None:
+            discard_from_index(self.game_connections, code, websocket)
 
     def disconnect(self, websocket: WebSocketRoute):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        for game_code in self.game_connections:
-            if websocket in self.game_connections[game_code]:
-                self.game_connections[game_code].remove(websocket)
-        for cookie in self.cookie_connections:
-            if websocket in self.cookie_connections[cookie]:
-                self.cookie_connections[cookie].remove(websocket)
-
-    async def send_player_update(self, cookie: str, game_state: GameState):
-        for connection in self.cookie_connections[cookie]:
-            await connection.send_json(game_state.to_json())
-
-    async def broadcast_game_state(self, game_state: GameState):
-        for connection in self.game_connections[game_state.code]:
-            await connection.send_json(game_state.to_json())
+        writer = self.writers.pop(websocket, None)
+        if writer is not None:
+            writer.close()
+        self.active_connections.discard(websocket)
+        heartbeat = self.heartbeats.pop(websocket, None)
+        if heartbeat is not None:
+            heartbeat.cancel()
+        self.last_seen.pop(websocket, None)
+        self.awaiting_pong.discard(websocket)
+        self.unsubscribe(websocket)
+        self.unspectate(websocket)
+        cookie = self.websocket_cookies.pop(websocket, None)
+        if cookie is not None:
+            discard_from_index(self.cookie_connections, cookie, websocket)
+
+    async def send_message(self, websocket: WebSocket, message: SharedMessage, private: Optional[dict] = None,
+                           code: Optional[str] = None):
+        writer = self.writers.get(websocket)
+        if writer is not None:
+            writer.enqueue(message.encode(writer.fmt, private), code)
+
+    async def send_player_update(self, cookie: str, message: SharedMessage, private: Optional[dict] = None,
+                                 code: Optional[str] = None):
+        """Send to the player's sockets following game code, or to all of them when code is None"""
+        for connection in self.cookie_connections.get(cookie, []):
+            if code is None or self.websocket_games.get(connection) == code:
+                await self.send_message(connection, message, private, code)
+
+    async def broadcast_game_state(self, code: str, message: SharedMessage):
+        for connection in self.game_connections.get(code, []):
+            await self.send_message(connection, message, code=code)
+
+    def broadcast_spectators(self, code: str, message: SharedMessage) -> None:
+        """Write a public delta to a game's spectators, or hold it for their next interval"""
+        for interval, connections in self.spectators.get(code, {}).items():
+            if interval is None:
+                self.write_all(connections, message, code)
+                continue
+            pending = self.pending_spectator_deltas.get((code, interval))
+            if pending is None:
+                self.pending_spectator_deltas[(code, interval)] = [message.message]
+                self.scheduler.call_later(interval, self.flush_spectators, code, interval)
+            else:
+                pending.append(message.message)
+
+    def flush_spectators(self, code: str, interval: float) -> None:
+        deltas = self.pending_spectator_deltas.pop((code, interval), None)
+        connections = self.spectators.get(code, {}).get(interval)
+        if deltas and connections:
+            self.write_all(connections, SharedMessage(merge_deltas(deltas[0]["prev"], deltas)), code)
+
+    def write_all(self, connections: Set[WebSocket], message: SharedMessage, code: str) -> None:
+        # SharedMessage keeps each format's frame, so every connection gets the same object
+        for connection in connections:
+            writer = self.writers.get(connection)
+            if writer is not None:
+                writer.enqueue(message.encode(writer.fmt), code)
+
+    def get_metrics(self) -> Dict[str, dict]:
+        """Queue depth and send latency of open connections, per game code"""
+        stats: Dict[str, SendStats] = {}
+        depths: Dict[str, List[int]] = {}
+        for writer in self.writers.values():
+            code = writer.game_code or ""
+            stats.setdefault(code, SendStats()).merge(writer.stats)
+            depths.setdefault(code, []).append(writer.depth())
+        return {code: dict(stats[code].to_dict(),
+                           connections=len(depths[code]),
+                           queue_depth=sum(depths[code]),
+                           max_queue_depth=max(depths[code])) for code in stats}
+
+
+def discard_from_index(index: Dict[str, Set[WebSocket]], key: str, websocket: WebSocket) -> None:
+    connections = index.get(key)
+    if connections is not None:
+        connections.discard(websocket)
+        if not connections:
+            del index[key]
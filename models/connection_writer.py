@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Optional, Union
+from fastapi import WebSocket
+from models.encoding import JSON
+
+
+logger = logging.getLogger(__name__)
+
+
+class SendStats:
+    def __init__(self):
+        self.sent: int = 0
+        self.dropped: int = 0
+        self.evicted: int = 0
+        self.total_latency: float = 0.0
+        self.max_latency: float = 0.0
+
+    def record(self, latency: float) -> None:
+        self.sent += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def merge(self, other: "SendStats") -> None:
+        self.sent += other.sent
+        self.dropped += other.dropped
+        self.evicted += other.evicted
+        self.total_latency += other.total_latency
+        self.max_latency = max(self.max_latency, other.max_latency)
+
+    def to_dict(self) -> dict:
+        return {"sent": self.sent,
+                "dropped": self.dropped,
+                "evicted": self.evicted,
+                "avg_send_ms": self.total_latency / self.sent * 1000 if self.sent else 0.0,
+                "max_send_ms": self.max_latency * 1000}
+
+
+class ConnectionWriter:
+    """
+    Outbound queue for a single websocket, drained by its own writer task so a
+    slow client never blocks the sender or the rest of the table.
+    When the queue is full the oldest pending frame is dropped in favour of the
+    newer one; clients notice the sequence gap and resync. A send that takes
+    longer than send_timeout evicts the connection.
+    """
+    def __init__(self, websocket: WebSocket, fmt: str = JSON, max_depth: int = 32, send_timeout: float = 5.0,
+                 on_evict: Optional[Callable[[WebSocket], None]] = None):
+        self.websocket: WebSocket = websocket
+        self.fmt: str = fmt
+        self.max_depth: int = max_depth
+        self.send_timeout: float = send_timeout
+        self.on_evict: Optional[Callable[[WebSocket], None]] = on_evict
+        # game code of the most recent frame, used to group metrics per game
+        self.game_code: Optional[str] = None
+        self.stats: SendStats = SendStats()
+        self.queue: Deque[Union[str, bytes]] = deque()
+        self.ready: asyncio.Event = asyncio.Event()
+        self.task: asyncio.Task = asyncio.create_task(self.run())
+
+    def depth(self) -> int:
+        return len(self.queue)
+
+    def enqueue(self, data: Union[str, bytes], game_code: Optional[str] = None) -> None:
+        if game_code is not None:
+            self.game_code = game_code
+        if len(self.queue) >= self.max_depth:
+            self.queue.popleft()
+            self.stats.dropped += 1
+        self.queue.append(data)
+        self.ready.set()
+
+    async def send(self, data: Union[str, bytes]) -> None:
+        if isinstance(data, bytes):
+            await self.websocket.send_bytes(data)
+        else:
+            await self.websocket.send_text(data)
+
+    async def run(self) -> None:
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.queue:
+                data = self.queue.popleft()
+                start = time.perf_counter()
+                # asyncio.wait rather than wait_for, which can swallow a cancel that races the send
+                send = asyncio.ensure_future(self.send(data))
+                try:
+                    done, _ = await asyncio.wait({send}, timeout=self.send_timeout)
+                finally:
+                    send.cancel()
+                if not done or send.exception() is not None:
+                    error = send.exception() if done else "timed out"
+                    logger.warning("Evicting websocket after failed send: %r", error, extra={"game": self.game_code})
+                    await self.evict()
+                    return
+                self.stats.record(time.perf_counter() - start)
+
+    async def evict(self) -> None:
+        self.stats.evicted += 1
+        self.queue.clear()
+        if self.on_evict is not None:
+            self.on_evict(self.websocket)
+        try:
+            await asyncio.wait_for(self.websocket.close(), self.send_timeout)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self.queue.clear()
+        if not self.task.done() and self.task is not asyncio.current_task():
+            self.task.cancel()
@@ -0,0 +1,60 @@
+import json
+from typing import Any, Dict, Optional, Union
+try:
+    import msgpack
+except ImportError:
+    # Binary format is optional, connections fall back to JSON
+    msgpack = None
+
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+
+def negotiate_format(requested: Optional[str]) -> str:
+    if requested == MSGPACK and msgpack is not None:
+        return MSGPACK
+    return JSON
+
+
+def dumps(message: Any) -> str:
+    return json.dumps(message, separators=(",", ":"))
+
+
+class SharedMessage:
+    """
+    Server to client message whose shared part is encoded at most once per wire
+    format, no matter how many connections it is written to. Per-player fields
+    are spliced in under the "private" key without re-encoding the rest.
+    """
+    def __init__(self, message: Dict[str, Any]):
+        self.message: Dict[str, Any] = message
+        # wire format to encoded shared fields, without the closing of the map
+        self.encoded: Dict[str, Union[str, bytes]] = {}
+        # wire format to the complete frame without private fields, written as is to every public recipient
+        self.frames: Dict[str, Union[str, bytes]] = {}
+
+    def shared(self, fmt: str) -> Union[str, bytes]:
+        if fmt not in self.encoded:
+            if fmt == MSGPACK:
+                self.encoded[fmt] = b"".join(msgpack.packb(k) + msgpack.packb(v)
+                                             for k, v in self.message.items())
+            else:
+                self.encoded[fmt] = dumps(self.message)[:-1]
+        return self.encoded[fmt]
+
+    def encode(self, fmt: str = JSON, private: Optional[Dict[str, Any]] = None) -> Union[str, bytes]:
+        if not private and fmt in self.frames:
+            return self.frames[fmt]
+        shared = self.shared(fmt)
+        if fmt == MSGPACK:
+            if not private:
+                self.frames[fmt] = msgpack.Packer().pack_map_header(len(self.message)) + shared
+                return self.frames[fmt]
+            return (msgpack.Packer().pack_map_header(len(self.message) + 1) + shared
+                    + msgpack.packb("private") + msgpack.packb(private))
+        if not private:
+            self.frames[fmt] = shared + "}"
+            return self.frames[fmt]
+        separator = "," if self.message else ""
+        return f'{shared}{separator}"private":{dumps(private)}}}'
@@ -0,0 +1,79 @@
+from contextlib import closing
+import json
+import sqlite3
+from typing import Iterable, List, Optional, Tuple
+from models.action_log import LogEntry
+from models.game_types import GameBase
+
+
+class GameArchive:
+    """
+    SQLite backed store for games that have been evicted from memory.
+    A connection is opened per write so archiving can run off the event loop.
+    """
+    def __init__(self, db_path: str = "sabaac.db"):
+        self.db_path: str = db_path
+        self.has_schema: bool = False
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path)
+        if not self.has_schema:
+            self.create_schema(connection)
+            self.has_schema = True
+        return connection
+
+    def create_schema(self, connection: sqlite3.Connection) -> None:
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS GameData "
+                               "(GameCode text, PlayerID text, Username text, TurnOrder integer)")
+            connection.execute("CREATE TABLE IF NOT EXISTS GameArchive "
+                               "(GameGuid text PRIMARY KEY, GameCode text, GameType text, "
+                               "IsActive integer, Winner text, ArchivedAt text, State text)")
+            connection.execute("CREATE INDEX IF NOT EXISTS GameArchiveCode ON GameArchive (GameCode, ArchivedAt)")
+            connection.execute("CREATE TABLE IF NOT EXISTS ActionLog "
+                               "(GameGuid text, Seq integer, CreatedAt integer, Event integer, Args text, "
+                               "PRIMARY KEY (GameGuid, Seq)) WITHOUT ROWID")
+
+    def archive_games(self, games: List[GameBase], spills: Iterable[Tuple[str, List[LogEntry]]] = ()) -> int:
+        """Write evicted games with their whole action log, and entries spilled from live games"""
+        spills = list(spills) + [(str(g.guid), g.action_log.take_spilled() + list(g.action_log.entries))
+                                 for g in games]
+        if not games and not any(entries for _, entries in spills):
+            return 0
+        with closing(self.connect()) as connection, connection:
+            cursor = connection.cursor()
+            for game in games:
+                game.dump_to_sql(cursor)
+            # a spill can be written twice when several workers hold a copy of the game
+            cursor.executemany("INSERT OR IGNORE INTO ActionLog VALUES (?, ?, ?, ?, ?)",
+                               [(guid, seq, created_at, event, json.dumps(args))
+                                for guid, entries in spills for seq, created_at, event, args in entries])
+        return len(games)
+
+    def load_log(self, guid: str, before: int, limit: int) -> List[LogEntry]:
+        """Up to limit of the newest archived entries of a game older than before, oldest first"""
+        with closing(self.connect()) as connection, connection:
+            rows = connection.execute("SELECT Seq, CreatedAt, Event, Args FROM ActionLog "
+                                      "WHERE GameGuid = ? AND Seq < ? ORDER BY Seq DESC LIMIT ?",
+                                      (str(guid), before, limit)).fetchall()
+        return [(seq, created_at, event, tuple(json.loads(args))) for seq, created_at, event, args in reversed(rows)]
+
+    def find_by_code(self, code: str) -> Optional[Tuple[str, int]]:
+        """Guid and log length of the game archived last under code, codes are reused once a game ends"""
+        with closing(self.connect()) as connection, connection:
+            row = connection.execute("SELECT GameGuid FROM GameArchive WHERE GameCode = ? "
+                                     "ORDER BY ArchivedAt DESC LIMIT 1", (code,)).fetchone()
+            if row is None:
+                return None
+            length = connection.execute("SELECT MAX(Seq) FROM ActionLog WHERE GameGuid = ?", row).fetchone()[0]
+        return row[0], length + 1 if length is not None else 0
+
+    def load_state(self, guid: str) -> Optional[dict]:
+        with closing(self.connect()) as connection, connection:
+            row = connection.execute("SELECT State FROM GameArchive WHERE GameGuid = ?",
+                                     (str(guid),)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def count(self) -> int:
+        with closing(self.connect()) as connection, connection:
+            return connection.execute("SELECT COUNT(*) FROM GameArchive").fetchone()[0]
@@ -1,13 +1,276 @@
-from typing import List, Optional
+import asyncio
+import logging
+import pickle
+import time
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from models.action_log import LogEntry
+from models.game_archive import GameArchive
+from models.journal import ActionJournal
+from models.game_store import GameStore, InMemoryGameStore
 from models.game_types import GameBase
+from models.player import Player
+from models.state_stream import StateStream
+
+
+logger = logging.getLogger(__name__)
 
 
 class GameManager:
-    def __init__(self):
-        self.all_games: list[GameBase] = []
+    """
+    Registry of every game known to this process.
+    Lookups by code, guid and player cookie are dict based so that each request
+    only pays for the game it touches rather than every game ever created.
+    Only active games are indexed by code, which means a finished game's code
+    can be handed out again.
+    Finished and idle games are queued for archival and dropped from memory by
+    sweep(), so the working set only holds games that are still being played.
+    Game state itself lives in a GameStore, which may be shared between worker
+    processes; the indexes here cache the copies this process last loaded.
+    """
+    def __init__(self, store: Optional[GameStore] = None, archive: Optional[GameArchive] = None,
+                 journal: Optional[ActionJournal] = None, idle_ttl: float = 30 * 60, max_retries: int = 10):
+        self.store: GameStore = store if store is not None else InMemoryGameStore()
+        self.journal: Optional[ActionJournal] = journal
+        self.max_retries: int = max_retries
+        self.games_by_guid: Dict[str, GameBase] = {}
+        # active game code to game mappings
+        self.games_by_code: Dict[str, GameBase] = {}
+        # games waiting to be written to the archive
+        self.pending_archive: List[GameBase] = []
+        self.archive: Optional[GameArchive] = archive
+        self.idle_ttl: float = idle_ttl
+        self.archived_count: int = 0
+        self.evicted_idle_count: int = 0
+        self.expired_lobby_count: int = 0
 
     def get_games(self) -> List[GameBase]:
-        return self.all_games
-    
-    def get_game_by_code(self, game_code) -> Optional[GameBase]:
-        return next(filter(lambda x: x.code == game_code and x.is_active, self.get_games()), None)
+        return list(self.games_by_guid.values())
+
+    def get_active_games(self) -> Iterator[GameBase]:
+        return iter(self.games_by_code.values())
+
+    def get_game_by_code(self, game_code: str) -> Optional[GameBase]:
+        return self.index_loaded(self.store.load(game_code))
+
+    async def load_game(self, game_code: str) -> Optional[GameBase]:
+        """get_game_by_code without blocking the event loop on the store"""
+        return self.index_loaded(await self.run_store(self.store.load, game_code))
+
+    def index_loaded(self, game: Optional[GameBase]) -> Optional[GameBase]:
+        if game is None or not game.is_active:
+            return None
+        self.games_by_guid[str(game.guid)] = game
+        self.games_by_code[game.code] = game
+        return game
+
+    async def run_store(self, call: Callable[..., Any], *args: Any) -> Any:
+        if not self.store.blocking:
+            return call(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, call, *args)
+
+    def defer_store(self, call: Callable[..., Any], *args: Any) -> None:
+        """A store write nobody waits on, run off the event loop when there is one"""
+        try:
+            loop = asyncio.get_running_loop() if self.store.blocking else None
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            call(*args)
+            return
+        loop.run_in_executor(None, call, *args).add_done_callback(self.log_store_failure)
+
+    @staticmethod
+    def log_store_failure(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Deferred store write failed: %r", future.exception())
+
+    def get_game_by_guid(self, guid: str) -> Optional[GameBase]:
+        return self.games_by_guid.get(str(guid))
+
+    def get_state_stream(self, game: GameBase) -> StateStream:
+        if game.state_stream is None:
+            game.state_stream = StateStream()
+        return game.state_stream
+
+    def add_game(self, game: GameBase) -> GameBase:
+        # The store refuses a code that belongs to another active game
+        while not self.store.add(game):
+            game.code = GameBase.generate_code()
+        self.games_by_guid[str(game.guid)] = game
+        self.games_by_code[game.code] = game
+        return game
+
+    def create_game(self, game_type: Callable[[], GameBase], cookie: str) -> GameBase:
+        new_game = game_type()
+        new_game.add_player(Player(cookie=cookie, turnorder=1))
+        return self.add_game(new_game)
+
+    async def open_game(self, game_type: Callable[[], GameBase], cookie: str) -> GameBase:
+        """create_game without blocking the event loop on the store"""
+        new_game = game_type()
+        new_game.add_player(Player(cookie=cookie, turnorder=1))
+        while not await self.run_store(self.store.add, new_game):
+            new_game.code = GameBase.generate_code()
+        self.games_by_guid[str(new_game.guid)] = new_game
+        self.games_by_code[new_game.code] = new_game
+        return new_game
+
+    async def update_game(self, game_code: str,
+                          mutate: Callable[[GameBase], Any]) -> Tuple[Optional[GameBase], Any]:
+        """
+        Apply mutate to an active game under its lock and save the result.
+        If another worker saved the game first, reload and apply it again, so
+        mutate must only change the game it is given.
+        """
+        for _ in range(self.max_retries):
+            game = await self.load_game(game_code)
+            if game is None:
+                return None, None
+            async with game.lock:
+                if not game.is_active:
+                    return None, None
+                result = mutate(game)
+                if await self.run_store(self.store.save, game):
+                    return game, result
+        raise RuntimeError(f"Game {game_code} kept changing, gave up after {self.max_retries} attempts")
+
+    def record(self, game: GameBase, kind: str, payload: dict) -> asyncio.Future:
+        """
+        Journal a change that was just saved, resolving once it is durable.
+        Must be called straight after update_game returns, without awaiting in
+        between, so journal order matches the order changes were applied.
+        """
+        if self.journal is None:
+            done = asyncio.get_running_loop().create_future()
+            done.set_result(None)
+            return done
+        return self.journal.append(game, kind, payload)
+
+    def recover(self, game_types: Dict[str, Callable[..., GameBase]]) -> List[GameBase]:
+        """Rebuild in-progress games from the latest snapshot plus the journal after it"""
+        if self.journal is None:
+            return []
+        recovered = []
+        for guid, snapshot, entries in self.journal.load_games():
+            game = pickle.loads(snapshot) if snapshot is not None else None
+            for version, kind, payload in entries:
+                if kind == "create":
+                    game = game_types[payload["type"]](seed=payload["seed"])
+                    game.guid = guid
+                    game.code = payload["code"]
+                    game.add_player(Player(cookie=payload["cookie"], turnorder=1))
+                    game.ante_amount = payload.get("ante", game.ante_amount)
+                elif game is not None:
+                    game.replay(kind, payload)
+                if game is not None:
+                    game.store_version = version
+            # Another worker may have recovered it already, or its code was reused
+            if game is not None and game.is_active and self.store.add(game):
+                self.games_by_guid[str(game.guid)] = game
+                self.games_by_code[game.code] = game
+                recovered.append(game)
+        return recovered
+
+    def finish_game(self, game: GameBase) -> None:
+        """Drop a finished game from the active index, freeing its code"""
+        if self.games_by_code.get(game.code) is game:
+            del self.games_by_code[game.code]
+        self.evict_game(game)
+
+    def evict_game(self, game: GameBase) -> None:
+        """Drop a game from memory and the journal, it lives in the archive from now on"""
+        self.defer_store(self.store.delete, game)
+        if self.games_by_guid.pop(str(game.guid), None) is not None:
+            self.pending_archive.append(game)
+        if self.journal is not None:
+            self.journal.forget(game)
+
+    def evict_idle_games(self, now: Optional[float] = None) -> List[GameBase]:
+        now = time.monotonic() if now is None else now
+        candidates = self.idle_candidates(now)
+        return self.evict_if_idle([(game, self.store.load(game.code)) for game in candidates], now)
+
+    async def sweep_idle_games(self, now: Optional[float] = None) -> List[GameBase]:
+        """evict_idle_games without blocking the event loop on the store"""
+        now = time.monotonic() if now is None else now
+        candidates = self.idle_candidates(now)
+        stored = await self.run_store(lambda: [self.store.load(game.code) for game in candidates])
+        return self.evict_if_idle(list(zip(candidates, stored)), now)
+
+    def idle_candidates(self, now: float) -> List[GameBase]:
+        """Games whose copy in this worker looks idle, other workers may have used them since"""
+        return [g for g in self.games_by_code.values() if now - g.last_active > self.idle_ttl]
+
+    def evict_if_idle(self, games: List[Tuple[GameBase, Optional[GameBase]]], now: float) -> List[GameBase]:
+        """Evict each (cached, stored) game the store's copy shows is still idle, refresh the others"""
+        idle_games = []
+        for cached, stored in games:
+            if self.games_by_code.get(cached.code) is not cached:
+                continue
+            if stored is None or str(stored.guid) != str(cached.guid) or not stored.is_active:
+                # finished or replaced by another worker, which evicts it, only our copy goes
+                del self.games_by_code[cached.code]
+                self.games_by_guid.pop(str(cached.guid), None)
+                continue
+            if now - stored.last_active <= self.idle_ttl:
+                self.index_loaded(stored)
+                continue
+            del self.games_by_code[cached.code]
+            self.evict_game(stored)
+            idle_games.append(stored)
+        self.evicted_idle_count += len(idle_games)
+        return idle_games
+
+    async def expire_lobby(self, game_code: str, ttl: float, now: Optional[float] = None) -> Optional[float]:
+        """
+        Drop a game nobody started within ttl seconds of its last lobby activity.
+        Returns the seconds left if it was active more recently, else None.
+        """
+        # loaded from the store, another worker may have started it
+        game = await self.load_game(game_code)
+        if game is None or game.is_started:
+            return None
+        now = time.monotonic() if now is None else now
+        if now - game.last_active < ttl:
+            return ttl - (now - game.last_active)
+        del self.games_by_code[game.code]
+        self.evict_game(game)
+        self.expired_lobby_count += 1
+        return None
+
+    def take_pending_archive(self) -> List[GameBase]:
+        pending = self.pending_archive
+        self.pending_archive = []
+        return pending
+
+    def take_log_spill(self) -> List[Tuple[str, List[LogEntry]]]:
+        """Action log entries the games in memory no longer keep, to be written by archive_games"""
+        spills = [(guid, game.action_log.take_spilled()) for guid, game in self.games_by_guid.items()
+                  if game.action_log.spilled]
+        # without an archive the older entries are simply dropped
+        return spills if self.archive is not None else []
+
+    def archive_games(self, games: List[GameBase], spills: List[Tuple[str, List[LogEntry]]] = ()) -> None:
+        """Blocking SQLite write, run off the event loop by the sweeper"""
+        if self.archive is not None:
+            self.archive.archive_games(games, spills)
+        self.archived_count += len(games)
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        self.evict_idle_games(now)
+        self.archive_games(self.take_pending_archive(), self.take_log_spill())
+
+    def get_metrics(self) -> Dict[str, int]:
+        return {"active_games": len(self.games_by_code),
+                "games_in_memory": len(self.games_by_guid),
+                "pending_archive": len(self.pending_archive),
+                "archived_games": self.archived_count,
+                "evicted_idle_games": self.evicted_idle_count,
+                "expired_lobbies": self.expired_lobby_count,
+                "action_log_entries": sum(len(g.action_log.entries) for g in self.games_by_guid.values()),
+                "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else 0}
@@ -1,21 +1,21 @@
 import datetime
-import json
+from models.encoding import dumps
 from models.game_types import GameBase
 
 
 class GameState:
     """
     server-client message format
-    (server) write_message(dict) -> JSON.parse() (client)
+    (server) SharedMessage.encode() -> JSON.parse() (client)
     {
         "code": string,
         "startgame": None or boolean,
         "round": int,
         "username": None or string,
         "players": None or [string, ...],
-        "winner": None or string,
+        "winner": None or Player,
         "currentplayer": None or string (uuid),
-        "messages": None or [{"Timestamp": datetime, "Body": string}, ...],
+        "messages": None or [{"seq": int, "timestamp": datetime, "body": string}, ...] (last ActionLog.capacity),
         "topdiscard": None or Card,
         "playerhand": None or [Card, ...]
         "playercredits": None or int
@@ -28,14 +28,40 @@ class GameState:
         self.startgame = False
         self.username = None
         self.players = game.conv_players_for_lobby()
-        self.winner = game.winner
+        self.winner = game.winner.to_dict() if game.winner is not None else None
         self.currentplayer = game.get_current_player().username
-        self.messages = game.action_log
-        self.topdiscard = game.discard[-1] if len(game.discard) > 0 else None
+        self.log = game.action_log
+        self.topdiscard = game.discard[-1].to_dict() if len(game.discard) > 0 else None
         self.playerhand = None
         self.playercredits = None
         self.sabaacpot = game.sabaac_pot
         self.handpot = game.hand_pot
 
+    public_keys = ("code", "startgame", "round", "username", "players", "winner",
+                   "currentplayer", "topdiscard", "sabaacpot", "handpot")
+    private_keys = ("playerhand", "playercredits")
+
+    @property
+    def messages(self) -> list:
+        return self.log.recent()
+
+    def public_fields(self) -> dict:
+        return {k: getattr(self, k) for k in self.public_keys}
+
+    def private_fields(self) -> dict:
+        return {"playerhand": [c.to_dict() for c in self.playerhand] if self.playerhand is not None else None,
+                "playercredits": self.playercredits}
+
+    def shared_dict(self) -> dict:
+        shared = self.public_fields()
+        shared["timestamp"] = self.timestamp
+        shared["messages"] = self.messages
+        return shared
+
+    def to_dict(self) -> dict:
+        state = self.shared_dict()
+        state.update(self.private_fields())
+        return state
+
     def to_json(self) -> str:
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
+        return dumps(self.to_dict())
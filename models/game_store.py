@@ -0,0 +1,112 @@
+import abc
+import pickle
+import sqlite3
+import threading
+from typing import Dict, Optional
+from models.game_types import GameBase
+
+
+class GameStore(metaclass=abc.ABCMeta):
+    """
+    Source of truth for active game state.
+    add() fails if the code already belongs to another game. save() is a
+    compare-and-set: it fails if another worker saved the game since it was
+    loaded, in which case the caller reloads and re-applies its change.
+    Both bump the game's store_version. A blocking store does I/O on every
+    call, GameManager then runs load() and save() off the event loop.
+    """
+    blocking = False
+
+    @abc.abstractmethod
+    def load(self, code: str) -> Optional[GameBase]:
+        pass
+
+    @abc.abstractmethod
+    def add(self, game: GameBase) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def save(self, game: GameBase) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def delete(self, game: GameBase) -> None:
+        pass
+
+
+class InMemoryGameStore(GameStore):
+    """Single process store, games are shared by reference and serialized by their own lock"""
+    def __init__(self):
+        self.games: Dict[str, GameBase] = {}
+
+    def load(self, code: str) -> Optional[GameBase]:
+        return self.games.get(code)
+
+    def add(self, game: GameBase) -> bool:
+        if self.games.setdefault(game.code, game) is not game:
+            return False
+        game.store_version += 1
+        return True
+
+    def save(self, game: GameBase) -> bool:
+        if self.games.get(game.code) is not game:
+            return False
+        game.store_version += 1
+        return True
+
+    def delete(self, game: GameBase) -> None:
+        if self.games.get(game.code) is game:
+            del self.games[game.code]
+
+
+class SqliteGameStore(GameStore):
+    """
+    Store shared by every worker process through a SQLite file.
+    Games are pickled with a version number used for optimistic concurrency.
+    """
+    blocking = True
+
+    def __init__(self, db_path: str = "sabaac.db"):
+        self.db_path: str = db_path
+        # a connection per thread, the event loop's and the executor's are used concurrently
+        self.local: threading.local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        # Opened lazily so each forked worker gets its own connection
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS Games "
+                               "(GameCode text PRIMARY KEY, GameGuid text, Version integer, State blob)")
+        return connection
+
+    def load(self, code: str) -> Optional[GameBase]:
+        row = self.connect().execute("SELECT Version, State FROM Games WHERE GameCode = ?",
+                                     (code,)).fetchone()
+        if row is None:
+            return None
+        game = pickle.loads(row[1])
+        game.store_version = row[0]
+        return game
+
+    def add(self, game: GameBase) -> bool:
+        cursor = self.connect().execute("INSERT OR IGNORE INTO Games VALUES (?, ?, ?, ?)",
+                                        (game.code, str(game.guid), game.store_version + 1, pickle.dumps(game)))
+        if cursor.rowcount != 1:
+            return False
+        game.store_version += 1
+        return True
+
+    def save(self, game: GameBase) -> bool:
+        cursor = self.connect().execute("UPDATE Games SET Version = Version + 1, State = ? "
+                                        "WHERE GameCode = ? AND GameGuid = ? AND Version = ?",
+                                        (pickle.dumps(game), game.code, str(game.guid), game.store_version))
+        if cursor.rowcount != 1:
+            return False
+        game.store_version += 1
+        return True
+
+    def delete(self, game: GameBase) -> None:
+        self.connect().execute("DELETE FROM Games WHERE GameCode = ? AND GameGuid = ?",
+                               (game.code, str(game.guid)))
@@ -1,112 +1,241 @@
 import abc
+import asyncio
 import datetime
+import json
+import logging
 import random
-from typing import Any, List, Optional
+import time
+from collections import deque
+from functools import partial
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 import uuid
 from models.player import Player
 from models.card import Card
 from models.actions import Actions
+from models.action_log import ActionLog, LogEvent
+from models.variants import VARIANTS, Rules
+
+
+logger = logging.getLogger(__name__)
 
 
 class GameBase(metaclass=abc.ABCMeta):
-    def __init__(self):
+    code_chars = "abcdefghijkmnpqrstuvwxyz23456789"
+    code_len = 6
+    # compiled rules this game type is played by, see models/variants.py
+    rules: Rules = VARIANTS["CorellianGambit"]
+
+    def __init__(self, seed: Optional[int] = None, rules: Optional[Rules] = None):
+        if rules is not None:
+            self.rules = rules
         self.guid: str = uuid.uuid1()
         self.is_active: bool = True
-        valid_chars = "abcdefghijkmnpqrstuvwxyz23456789"
-        code_len = 6
-        self.code: str = "".join(random.choices(valid_chars, k=code_len))
-        # TODO: Set max rounds/end condition dynamically
+        self.is_started: bool = False
+        # Serializes every mutation of this game; different games never contend
+        self.lock: asyncio.Lock = asyncio.Lock()
+        self.code: str = self.generate_code()
+        # Seed of the shuffle and dice rolls, persisted so a game can be replayed exactly
+        self.seed: int = seed if seed is not None else random.getrandbits(32)
+        self.rng: random.Random = random.Random(self.seed)
         self.round: int = 0
         self.turn: int = 1
         # TODO: Track "hands" as well as rounds? Continue playing for Sabaac pot
-        # TODO: Change deck composition based on game type
-        self.deck: list[Card] = [Card(i, val[0], val[1])
-                                 for i, val in enumerate(
-                                     [(suite, val) for val in range(-10, 11)
-                                     for suite in ["circle", "triangle", "square"]
-                                     if val != 0] + [("sylop", 0) for _ in range(2)])]
-        random.shuffle(self.deck)
+        deck = list(self.deck_template)
+        self.rng.shuffle(deck)
+        # drawn from the left, O(1) per draw
+        self.deck: Deque[Card] = deque(deck)
         self.discard: list[Card] = []
         self.players: list[Player] = []
+        # cookie to player mappings
+        self.players_by_cookie: dict[str, Player] = {}
         self.winner: Player = None
-        self.action_log: list[str] = []
+        self.action_log: ActionLog = ActionLog()
         self.ante_amount: int = 2
         self.sabaac_pot: int = 0
         self.hand_pot: int = 0
+        # monotonic timestamp of the last lobby or game activity, used for idle eviction
+        self.last_active: float = time.monotonic()
+        # versioned client update stream, created by GameManager on first publish
+        self.state_stream = None
+        # version of this copy in the GameStore, 0 until first saved
+        self.store_version: int = 0
+
+    def __getstate__(self) -> dict:
+        # Locks are process local, a loaded copy gets a fresh one
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.lock = asyncio.Lock()
+        if isinstance(self.action_log, list):
+            # saved before the log became an ActionLog
+            self.action_log = ActionLog.from_messages(self.action_log)
+
+    @property
+    def deck_template(self) -> Tuple[Card, ...]:
+        """Shared card definitions this game is played with"""
+        return self.rules.deck
 
-    def dump_to_sql(self):
-        return None
+    @classmethod
+    def generate_code(cls) -> str:
+        return "".join(random.choices(cls.code_chars, k=cls.code_len))
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+    def to_archive(self) -> dict:
+        return {"guid": str(self.guid),
+                "code": self.code,
+                "type": self.rules.name,
+                "round": self.round,
+                "turn": self.turn,
+                "winner": self.winner.username if self.winner is not None else None,
+                "players": [{"cookie": p.cookie,
+                             "username": p.username,
+                             "turnorder": p.turnorder,
+                             "credits": p.credits} for p in self.players],
+                "sabaacpot": self.sabaac_pot,
+                "handpot": self.hand_pot,
+                "messages": self.action_log.recent()}
+
+    def dump_to_sql(self, cursor) -> None:
+        cursor.executemany("INSERT INTO GameData VALUES (?, ?, ?, ?)",
+                           [(self.code, p.cookie, p.username, p.turnorder) for p in self.players])
+        cursor.execute("INSERT OR REPLACE INTO GameArchive VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       (str(self.guid), self.code, self.rules.name, int(self.is_active),
+                        self.winner.username if self.winner is not None else None,
+                        datetime.datetime.utcnow().isoformat(), json.dumps(self.to_archive())))
 
     def conv_players_for_lobby(self) -> List[Any]: #TODO typing
         return [{"username": p.username,
                  "turnorder": p.turnorder} for p in self.players]
 
-    def process_action(self, cookie: str, action: Actions, action_value: int) -> None:
-        timestamp = datetime.datetime.utcnow().isoformat()
-        action = Actions(int(action))
-        player = next(filter(lambda x: x.cookie == cookie,
-                             self.players), None)
-        if player.turnorder != self.turn:
-            print(f"Action from player {player.username} out of order, ignoring")
+    def start(self) -> bool:
+        """Take antes from every player, only the first start request counts"""
+        if self.is_started:
+            return False
+        self.is_started = True
+        for p in self.players:
+            p.credits -= (self.ante_amount * 2)
+            #TODO: Log message stating ante amounts
+            self.sabaac_pot += self.ante_amount
+            self.hand_pot += self.ante_amount
+        return True
+
+    def deal(self) -> None:
+        if self.round == 0:
+            self.round = 1
+            for player in self.players:
+                for _ in range(self.rules.hand_size):
+                    card = self.draw_card()
+                    if card is not None:
+                        player.hand.append(card)
+
+    def draw_card(self) -> Optional[Card]:
+        """Top card of the deck, the discard pile bar its top card is shuffled back in when it runs out"""
+        if not self.deck and len(self.discard) > 1:
+            top = self.discard.pop()
+            self.rng.shuffle(self.discard)
+            self.deck.extend(self.discard)
+            self.discard = [top]
+        return self.deck.popleft() if self.deck else None
+
+    def process_action(self, cookie: str, action: Actions, action_value: Optional[int]) -> None:
+        action = Actions(action)
+        self.touch()
+        player = self.get_player(cookie)
+        if player is None or not self.is_active:
+            logger.warning("Action from unknown player or finished game, ignoring", extra={"game": self.code})
+        elif player.turnorder != self.turn:
+            logger.warning("Action out of order, ignoring", extra={"game": self.code, "player": player.username})
+        elif not self.rules.legal("play", action):
+            logger.warning("Action not allowed in %s, ignoring", self.rules.name,
+                           extra={"game": self.code, "player": player.username, "action": action.name})
         else:
             if Actions.DRAW_DECK == action:
-                player.hand.append(self.deck.pop(0))
-                message = f"{player.username} drew from the deck"
-                self.action_log.append({"timestamp": timestamp,
-                                        "body": message})
+                card = self.draw_card()
+                if card is not None:
+                    player.hand.append(card)
+                    self.action_log.append(LogEvent.DREW_DECK, player.username)
+                else:
+                    logger.warning("No cards left to draw", extra={"game": self.code, "player": player.username})
             elif Actions.DRAW_DISCARD == action:
                 if len(self.discard) > 0:
                     player.hand.append(self.discard.pop())
-                    message = f"{player.username} drew from the discard pile"
-                    self.action_log.append({"timestamp": timestamp,
-                                            "body": message})
+                    self.action_log.append(LogEvent.DREW_DISCARD, player.username)
                 else:
-                    print("WARNING...No cards in discard")
+                    logger.warning("No cards in discard", extra={"game": self.code, "player": player.username})
             elif Actions.DISCARD == action:
-                if action_value:
-                    target_card = next((x for x in player.hand if x.id == int(action_value)), None)
+                target_card = None
+                if action_value is not None:
+                    target_card = next((x for x in player.hand if x.id == action_value), None)
                 if target_card in player.hand:
                     player.hand.remove(target_card)
                     self.discard.append(target_card)
-                    message = f"{player.username} discarded a {target_card}"
-                    self.action_log.append({"timestamp": timestamp,
-                                            "body": message})
+                    self.action_log.append(LogEvent.DISCARDED, player.username, target_card.id, target_card.rank,
+                                           target_card.suite)
                 else:
-                    print("WARNING...card not present in hand")
+                    logger.warning("Card not present in hand", extra={"game": self.code, "player": player.username,
+                                                                    "action": action.name})
             # Increment turn, check for end of round
             self.turn += 1
             if self.turn > max([p.turnorder for p in self.players]):
-                d1 = random.randint(1, 6)
-                d2 = random.randint(1, 6)
-                message = f"Rolled 2 dice: {d1} and {d2}"
-                self.action_log.append({"timestamp": timestamp,
-                                        "body": message})
-                if d1 == d2:
-                    message = "Doubles!"
-                    self.action_log.append({"timestamp": timestamp,
-                                            "body": message})
+                d1 = self.rng.randint(1, 6)
+                d2 = self.rng.randint(1, 6)
+                self.action_log.append(LogEvent.ROLLED, d1, d2)
+                if d1 == d2 and self.rules.shift_on_doubles:
+                    self.action_log.append(LogEvent.DOUBLES)
                     for player in self.players:
                         num_cards = len(player.hand)
                         while len(player.hand) > 0:
                             self.discard.append(player.hand.pop())
                         for _ in range(num_cards):
-                            player.hand.append(self.deck.pop(0))
+                            card = self.draw_card()
+                            if card is not None:
+                                player.hand.append(card)
                 self.round += 1
                 self.turn = 1
-            if self.round > 3:
+            if self.round > self.rules.rounds:
                 # Calculate scores, alert winner
                 self.winner = self.calculate_scores()
                 #TODO: Allocate Sabaac pot
                 self.winner.credits += self.hand_pot
-                message = f"{self.winner.username} wins the game, earning {self.hand_pot} credits"
+                self.action_log.append(LogEvent.WON, self.winner.username, self.hand_pot)
                 self.hand_pot = 0
-                self.action_log.append({"timestamp": timestamp,
-                                        "body": message})
                 self.is_active = False
-        print(f"Round {self.round}, turn {self.turn}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Turn %s", self.turn, extra={"game": self.code, "round": self.round})
+
+    def replay(self, kind: str, payload: dict) -> None:
+        """Re-apply a journaled change, see GameManager.record"""
+        if kind == "join":
+            if self.get_player(payload["cookie"]) is None:
+                self.add_player(Player(cookie=payload["cookie"], turnorder=payload["turnorder"]))
+        elif kind == "rename":
+            player = self.get_player(payload["cookie"])
+            if player is not None:
+                player.username = payload["username"]
+        elif kind == "start":
+            self.start()
+        elif kind == "deal":
+            self.deal()
+        elif kind == "action":
+            # entries written before inbound messages were validated may hold strings
+            value = payload["actionValue"]
+            self.process_action(payload["cookie"], Actions(int(payload["action"])), int(value) if value is not None else None)
 
     def get_players(self) -> List[Player]:
         return self.players
+
+    def get_player(self, cookie: str) -> Optional[Player]:
+        return self.players_by_cookie.get(cookie)
+
+    def add_player(self, player: Player) -> Player:
+        self.players.append(player)
+        self.players_by_cookie[player.cookie] = player
+        return player
     
     def get_current_player(self) -> Optional[Player]:
         return next(filter(lambda x: x.turnorder == self.turn,  self.players), None)
@@ -118,6 +247,10 @@ class GameBase(metaclass=abc.ABCMeta):
     def calculate_scores(self) -> Player:
         pass
 
+    def rank_players(self) -> List[Player]:
+        """Players from best to worst hand, equal scores keep turn order"""
+        return self.rules.rank_players(self.players)
+
 
 class CorellianGambit(GameBase):
     def calculate_scores(self) -> Player:
@@ -137,16 +270,17 @@ class CorellianGambit(GameBase):
         Number of cards: +number of cards * 10 points
         Sum of positive values: +sum of positive values * 1 points
         """
-        all_scores = {}
-        for player in self.players:
-            hand_vals = [card.rank for card in player.hand]
-            score = 0
-            if sorted(hand_vals) == [-10, 0, 10]:
-                score += 10000
-            if sum(hand_vals) == 0:
-                score += 10000
-            score += abs(sum(hand_vals)) * -100
-            score += len(hand_vals) * 10
-            score += sum([c for c in hand_vals if c > 0])
-            all_scores[player] = score
-        return max(all_scores, key=lambda key: all_scores[key])
+        return self.rank_players()[0]
+
+
+class VariantGame(GameBase):
+    """A game of any variant, played by the compiled rules it is created with"""
+    def calculate_scores(self) -> Player:
+        """Best hand by the variant's scoring tiers, see models/variants.py"""
+        return self.rank_players()[0]
+
+
+def variant_types() -> Dict[str, Callable[..., GameBase]]:
+    """Variant name to a constructor taking seed, as GameManager.recover expects"""
+    return {name: CorellianGambit if name == CorellianGambit.rules.name else partial(VariantGame, rules=rules)
+            for name, rules in VARIANTS.items()}
@@ -0,0 +1,93 @@
+import asyncio
+from contextlib import closing
+import json
+import pickle
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+from models.batch_writer import BatchWriter
+from models.game_types import GameBase
+
+
+class ActionJournal(BatchWriter):
+    """
+    Write-ahead log of every accepted change to a game, kept in SQLite.
+    Entries are group committed by the BatchWriter task, so concurrent
+    actions share a commit instead of paying for their own. Every
+    snapshot_interval entries a pickled snapshot of the game is written, so
+    recovery only replays the journal tail.
+    """
+    def __init__(self, db_path: str = "sabaac.db", snapshot_interval: int = 50):
+        super().__init__()
+        self.db_path: str = db_path
+        self.snapshot_interval: int = snapshot_interval
+        self.has_schema: bool = False
+        # (guid, code, version, kind, payload) rows waiting for the next commit
+        self.pending_entries: List[tuple] = []
+        self.pending_snapshots: List[tuple] = []
+        self.pending_deletes: List[str] = []
+        # game guid to number of entries since its last snapshot
+        self.entries_since_snapshot: Dict[str, int] = {}
+
+    def connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=5.0)
+        if not self.has_schema:
+            with connection:
+                connection.execute("CREATE TABLE IF NOT EXISTS ActionJournal "
+                                   "(Id integer PRIMARY KEY AUTOINCREMENT, GameGuid text, GameCode text, "
+                                   "Version integer, Kind text, Payload text, CreatedAt real)")
+                connection.execute("CREATE INDEX IF NOT EXISTS ActionJournalGame "
+                                   "ON ActionJournal (GameGuid, Version)")
+                connection.execute("CREATE TABLE IF NOT EXISTS GameSnapshots "
+                                   "(GameGuid text PRIMARY KEY, Version integer, State blob)")
+            self.has_schema = True
+        return connection
+
+    def append(self, game: GameBase, kind: str, payload: dict) -> asyncio.Future:
+        """Queue an entry, the returned future resolves once it is committed"""
+        guid = str(game.guid)
+        self.pending_entries.append((guid, game.code, game.store_version, kind, json.dumps(payload), time.time()))
+        count = self.entries_since_snapshot.get(guid, 0) + 1
+        if count >= self.snapshot_interval:
+            self.pending_snapshots.append((guid, game.store_version, pickle.dumps(game)))
+            count = 0
+        self.entries_since_snapshot[guid] = count
+        return self.add_waiter()
+
+    def forget(self, game: GameBase) -> asyncio.Future:
+        """Drop a finished game's journal and snapshot, it lives in the archive from now on"""
+        guid = str(game.guid)
+        self.entries_since_snapshot.pop(guid, None)
+        self.pending_deletes.append(guid)
+        return self.add_waiter()
+
+    def take_batch(self) -> Tuple[List[tuple], List[tuple], List[str]]:
+        entries, self.pending_entries = self.pending_entries, []
+        snapshots, self.pending_snapshots = self.pending_snapshots, []
+        deletes, self.pending_deletes = self.pending_deletes, []
+        return entries, snapshots, deletes
+
+    def write_batch(self, entries: List[tuple], snapshots: List[tuple], deletes: List[str]) -> None:
+        with closing(self.connect()) as connection, connection:
+            connection.executemany("INSERT INTO ActionJournal "
+                                   "(GameGuid, GameCode, Version, Kind, Payload, CreatedAt) "
+                                   "VALUES (?, ?, ?, ?, ?, ?)", entries)
+            connection.executemany("INSERT OR REPLACE INTO GameSnapshots VALUES (?, ?, ?)", snapshots)
+            for guid in deletes:
+                connection.execute("DELETE FROM ActionJournal WHERE GameGuid = ?", (guid,))
+                connection.execute("DELETE FROM GameSnapshots WHERE GameGuid = ?", (guid,))
+
+    def load_games(self) -> List[Tuple[str, Optional[bytes], List[Tuple[int, str, dict]]]]:
+        """Every journaled game as (guid, latest snapshot, entries after the snapshot in version order)"""
+        with closing(self.connect()) as connection:
+            snapshots = {guid: (version, state) for guid, version, state
+                         in connection.execute("SELECT GameGuid, Version, State FROM GameSnapshots")}
+            games: Dict[str, List[Tuple[int, str, dict]]] = {guid: [] for guid in snapshots}
+            rows = connection.execute("SELECT GameGuid, Version, Kind, Payload FROM ActionJournal "
+                                      "ORDER BY GameGuid, Version, Id")
+            for guid, version, kind, payload in rows:
+                if guid in snapshots and version <= snapshots[guid][0]:
+                    continue
+                games.setdefault(guid, []).append((version, kind, json.loads(payload)))
+        return [(guid, snapshots[guid][1] if guid in snapshots else None, entries)
+                for guid, entries in games.items()]
@@ -0,0 +1,77 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from typing import Dict, Optional, TextIO
+
+
+# structured fields a record may carry through extra=, written as key=value pairs
+FIELDS = ("game", "player", "action", "round")
+FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+# logger name to the listener writing its records, so configuring twice is harmless
+listeners: Dict[str, logging.handlers.QueueListener] = {}
+
+
+class StructuredFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{k}={getattr(record, k)}" for k in FIELDS if getattr(record, k, None) is not None)
+        return f"{line} {fields}" if fields else line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread as they are, so the message is only
+    formatted off the event loop. Arguments must not be mutated after logging.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Per module levels, e.g. "models.game_types=DEBUG,models.pubsub=WARNING" """
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level: Optional[str] = None, levels: Optional[Dict[str, str]] = None,
+                      stream: Optional[TextIO] = None,
+                      logger: Optional[logging.Logger] = None) -> logging.handlers.QueueListener:
+    """
+    Route records through a queue to a listener thread that does the formatting
+    and the blocking writes. Levels default to SABAAC_LOG_LEVEL (INFO) and
+    SABAAC_LOG_LEVELS for individual modules.
+    """
+    logger = logger if logger is not None else logging.getLogger()
+    if logger.name in listeners:
+        return listeners[logger.name]
+    log_queue = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(StructuredFormatter(FORMAT))
+    logger.addHandler(DeferredQueueHandler(log_queue))
+    logger.setLevel((level or os.environ.get("SABAAC_LOG_LEVEL", "INFO")).upper())
+    module_levels = levels if levels is not None else parse_levels(os.environ.get("SABAAC_LOG_LEVELS", ""))
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    listeners[logger.name] = listener
+    atexit.register(stop_logging, logger)
+    return listener
+
+
+def stop_logging(logger: Optional[logging.Logger] = None) -> None:
+    """Write out queued records and detach the queue, the root logger by default"""
+    logger = logger if logger is not None else logging.getLogger()
+    listener = listeners.pop(logger.name, None)
+    if listener is None:
+        return
+    for handler in list(logger.handlers):
+        if isinstance(handler, DeferredQueueHandler) and handler.queue is listener.queue:
+            logger.removeHandler(handler)
+    listener.stop()
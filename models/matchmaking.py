@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from models.timing_wheel import Timer, TimingWheel
+
+
+logger = logging.getLogger(__name__)
+
+
+class LobbyKey(NamedTuple):
+    """The preferences a quick join is matched on"""
+    game_type: str
+    ante: int
+
+
+class OpenLobbyIndex:
+    """
+    Open lobbies bucketed by LobbyKey and then by free seats, so placing a
+    player looks at seats - 1 buckets rather than every game. The fullest
+    lobby is filled first so that tables start sooner; lobbies within a bucket
+    are taken oldest first.
+    """
+    def __init__(self, seats: int):
+        self.seats: int = seats
+        # key to buckets[free seats] of lobby codes, insertion ordered
+        self.buckets: Dict[LobbyKey, List["OrderedDict[str, None]"]] = {}
+        self.lobbies: Dict[str, Tuple[LobbyKey, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.lobbies)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.lobbies
+
+    def update(self, code: str, key: LobbyKey, free: int) -> None:
+        """Add a lobby or move it to the bucket for its free seats, full lobbies are dropped"""
+        self.remove(code)
+        if free <= 0:
+            return
+        buckets = self.buckets.get(key)
+        if buckets is None:
+            buckets = self.buckets[key] = [OrderedDict() for _ in range(self.seats + 1)]
+        buckets[min(free, self.seats)][code] = None
+        self.lobbies[code] = (key, free)
+
+    def remove(self, code: str) -> None:
+        entry = self.lobbies.pop(code, None)
+        if entry is not None:
+            key, free = entry
+            self.buckets[key][min(free, self.seats)].pop(code, None)
+
+    def best(self, key: LobbyKey) -> Optional[str]:
+        """Code of the open lobby with the fewest free seats for key, None if there is none"""
+        buckets = self.buckets.get(key)
+        if buckets is None:
+            return None
+        for bucket in buckets[1:]:
+            if bucket:
+                return next(iter(bucket))
+        return None
+
+
+class Matchmaker:
+    """
+    Quick join queue. enqueue() parks a player with their preferences and
+    returns a future for the lobby code they end up in; match() drains the
+    queue in one batch, seating players in indexed open lobbies and opening a
+    new lobby whenever a key has none. With a scheduler the batch runs on a
+    tick of the timing wheel, armed only while somebody is waiting.
+
+    create_lobby(key, cookie) opens a lobby hosted by cookie and returns its
+    code. seat_player(code, cookie) seats cookie in the lobby and returns the
+    seats left, or None when the lobby can no longer take players (started,
+    expired or gone), in which case it is dropped from the index and the next
+    one is tried. Both also return an awaitable for the change becoming
+    durable, or None; a batch is seated first and its commits are awaited
+    together before anyone's future resolves. The index only knows the
+    lobbies this matchmaker opened, so lobbies shared by code stay private.
+    """
+    def __init__(self, create_lobby: Callable[[LobbyKey, str], Awaitable[Tuple[str, Optional[Awaitable]]]],
+                 seat_player: Callable[[str, str], Awaitable[Tuple[Optional[int], Optional[Awaitable]]]],
+                 seats: int = 4, scheduler: Optional[TimingWheel] = None, tick: float = 0.25):
+        self.create_lobby: Callable[[LobbyKey, str], Awaitable[Tuple[str, Optional[Awaitable]]]] = create_lobby
+        self.seat_player: Callable[[str, str], Awaitable[Tuple[Optional[int], Optional[Awaitable]]]] = seat_player
+        self.seats: int = seats
+        self.index: OpenLobbyIndex = OpenLobbyIndex(seats)
+        self.scheduler: Optional[TimingWheel] = scheduler
+        self.tick: float = tick
+        self.timer: Optional[Timer] = None
+        # key to cookie to the future the cookie is waiting on, in arrival order
+        self.queue: Dict[LobbyKey, "OrderedDict[str, asyncio.Future]"] = {}
+        # the queue match() is working through, players cancelling mid-batch are dropped from it
+        self.in_flight: Dict[LobbyKey, "OrderedDict[str, asyncio.Future]"] = {}
+        self.placed: int = 0
+        self.lobbies_opened: int = 0
+
+    def __len__(self) -> int:
+        return sum(len(waiting) for waiting in self.queue.values())
+
+    def enqueue(self, cookie: str, key: LobbyKey) -> asyncio.Future:
+        """Queue cookie for a lobby matching key, queueing again returns the same future"""
+        waiting = self.queue.setdefault(key, OrderedDict())
+        future = waiting.get(cookie)
+        if future is None or future.done():
+            future = waiting[cookie] = asyncio.get_running_loop().create_future()
+        if self.scheduler is not None and self.timer is None:
+            self.timer = self.scheduler.call_later(self.tick, self.run_batch)
+        return future
+
+    def cancel(self, cookie: str, key: LobbyKey) -> None:
+        """Stop waiting for a lobby, whether cookie is still queued or in the batch being matched"""
+        for queue in (self.queue, self.in_flight):
+            future = queue.get(key, {}).pop(cookie, None)
+            if future is not None:
+                future.cancel()
+
+    async def run_batch(self) -> int:
+        self.timer = None
+        try:
+            return await self.match()
+        finally:
+            if self.scheduler is not None and self.timer is None and len(self):
+                self.timer = self.scheduler.call_later(self.tick, self.run_batch)
+
+    async def match(self) -> int:
+        """Place everyone queued so far, returns how many were placed"""
+        self.in_flight, self.queue = self.queue, {}
+        # (future, lobby code, commit) of everyone seated in this batch
+        seated: List[Tuple[asyncio.Future, str, Optional[asyncio.Future]]] = []
+        for key, waiting in self.in_flight.items():
+            while waiting:
+                cookie, future = waiting.popitem(last=False)
+                if future.done():
+                    continue
+                try:
+                    code, committed = await self.place(key, cookie)
+                except Exception as e:
+                    logger.exception("Quick join for %s failed", key)
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                seated.append((future, code, asyncio.ensure_future(committed) if committed is not None else None))
+        self.in_flight = {}
+        await asyncio.gather(*(committed for _, _, committed in seated if committed is not None),
+                             return_exceptions=True)
+        placed = 0
+        for future, code, committed in seated:
+            error = committed.exception() if committed is not None else None
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+                continue
+            future.set_result(code)
+            placed += 1
+        self.placed += placed
+        return placed
+
+    async def place(self, key: LobbyKey, cookie: str) -> Tuple[str, Optional[Awaitable]]:
+        while True:
+            code = self.index.best(key)
+            if code is None:
+                code, committed = await self.create_lobby(key, cookie)
+                self.lobbies_opened += 1
+                self.index.update(code, key, self.seats - 1)
+                return code, committed
+            free, committed = await self.seat_player(code, cookie)
+            if free is None:
+                self.index.remove(code)
+                continue
+            self.index.update(code, key, free)
+            return code, committed
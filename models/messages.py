@@ -0,0 +1,108 @@
+import json
+from typing import Optional, Union
+from pydantic import BaseModel, ValidationError, confloat, constr, validator
+from models.actions import Actions
+
+
+# longest inbound frame worth decoding, anything bigger is rejected unread
+MAX_MESSAGE_LENGTH = 4096
+ACTIONS = {a.value: a for a in Actions}
+
+
+class InvalidMessage(ValueError):
+    pass
+
+
+"""
+client-server message format (player ID in cookie)
+(client) JSON.stringify() -> parse_lobby_message()/parse_game_message() (server)
+ResyncMessage: {"code": string, "resync": None or int (last seq seen, 0 requests a snapshot)}
+LobbyMessage:  {"code": string, "username": string, "startgame": boolean}
+ActionMessage: {"code": string, "action": action enum, "actionValue": None or int (card id)}
+SpectateMessage: {"code": string, "spectate": None or int (last seq seen, 0 requests a snapshot),
+                  "interval": None or float (seconds between merged updates, None for every change)}
+PongMessage:   {"pong": true} (answer to a {"type": "ping"} heartbeat, on any socket)
+Other fields, e.g. a client timestamp, are ignored.
+"""
+class ResyncMessage(BaseModel):
+    code: constr(max_length=16)
+    resync: Optional[int]
+
+
+class LobbyMessage(BaseModel):
+    code: constr(max_length=16)
+    username: constr(max_length=64)
+    startgame: bool = False
+
+
+class ActionMessage(BaseModel):
+    code: constr(max_length=16)
+    action: Actions
+    actionValue: Optional[int]
+
+    @validator("action", pre=True)
+    def action_from_number(cls, value):
+        # older clients send the enum value as a string
+        return int(value) if isinstance(value, str) and value.isdigit() else value
+
+
+class SpectateMessage(BaseModel):
+    code: constr(max_length=16)
+    spectate: Optional[int]
+    interval: Optional[confloat(gt=0)]
+
+
+class PongMessage(BaseModel):
+    pong: bool = True
+
+
+def decode(text: Union[str, bytes]) -> dict:
+    if len(text) > MAX_MESSAGE_LENGTH:
+        raise InvalidMessage("message too long")
+    try:
+        data = json.loads(text)
+    except ValueError:
+        raise InvalidMessage("not JSON")
+    if type(data) is not dict:
+        raise InvalidMessage("not a JSON object")
+    return data
+
+
+def validate(model, data: dict):
+    try:
+        return model.parse_obj(data)
+    except ValidationError as e:
+        raise InvalidMessage(f"invalid {model.__name__}: {', '.join(str(err['loc'][0]) for err in e.errors())}")
+
+
+def parse_lobby_message(text: Union[str, bytes]) -> Union[PongMessage, ResyncMessage, LobbyMessage]:
+    data = decode(text)
+    if "pong" in data:
+        return validate(PongMessage, data)
+    return validate(ResyncMessage if "resync" in data else LobbyMessage, data)
+
+
+def parse_game_message(text: Union[str, bytes]) -> Union[PongMessage, ResyncMessage, ActionMessage]:
+    data = decode(text)
+    if "pong" in data:
+        return validate(PongMessage, data)
+    if "resync" in data:
+        return validate(ResyncMessage, data)
+    code, action, value = data.get("code"), data.get("action"), data.get("actionValue")
+    # fast path for the well formed actions current clients send, skips pydantic's validators
+    if (type(code) is str and len(code) <= 16 and type(action) is int and action in ACTIONS
+            and (value is None or type(value) is int)):
+        return ActionMessage.construct(code=code, action=ACTIONS[action], actionValue=value)
+    if type(action) is int and action not in ACTIONS:
+        raise InvalidMessage("unknown action")
+    return validate(ActionMessage, data)
+
+
+def parse_spectator_message(text: Union[str, bytes]) -> Union[PongMessage, SpectateMessage]:
+    data = decode(text)
+    if "pong" in data:
+        return validate(PongMessage, data)
+    if "spectate" not in data:
+        # e.g. an action, spectators cannot act
+        raise InvalidMessage("not a spectator message")
+    return validate(SpectateMessage, data)
@@ -0,0 +1,117 @@
+import abc
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+LabelValues = Tuple[str, ...]
+
+
+class Metric(metaclass=abc.ABCMeta):
+    """
+    A metric in the Prometheus text exposition format. Values are only touched
+    from the event loop, so there is no locking. Per process, each uvicorn
+    worker exposes its own.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name: str = name
+        self.help: str = help
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+
+    def key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def format_labels(self, values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, values)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[str]:
+        pass
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + list(self.samples()))
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for key, value in self.values.items():
+            yield f"{self.name}{self.format_labels(key)} {value}"
+
+
+class Gauge(Metric):
+    """A value read when the metrics are scraped"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, callback: Callable[[], float]):
+        super().__init__(name, help)
+        self.callback: Callable[[], float] = callback
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name} {self.callback()}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    default_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = default_buckets):
+        super().__init__(name, help, labelnames)
+        self.buckets: List[float] = sorted(buckets)
+        # label values to per bucket counts (the last one is +Inf), sum and count
+        self.counts: Dict[LabelValues, List[int]] = {}
+        self.sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+            self.sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        for key, counts in self.counts.items():
+            total = 0
+            for bound, count in zip(self.buckets + ["+Inf"], counts):
+                total += count
+                yield f"{self.name}_bucket{self.format_labels(key, ('le', str(bound)))} {total}"
+            yield f"{self.name}_sum{self.format_labels(key)} {self.sums[key]}"
+            yield f"{self.name}_count{self.format_labels(key)} {total}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self.metrics) + "\n"
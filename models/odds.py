@@ -0,0 +1,192 @@
+import asyncio
+import random
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+try:
+    import numpy as np
+except ImportError:
+    # Odds are only offered when NumPy is installed
+    np = None
+from models.actions import Actions
+from models.card import Card
+from models.game_types import GameBase
+from models.variants import get_rules
+
+
+class OddsQuery(NamedTuple):
+    """
+    What one player can see of a game, in canonical form so that equal
+    situations share a cache entry. Ranks only, card ids don't affect scoring.
+    """
+    hand: Tuple[int, ...]
+    top_discard: Optional[int]
+    # ranks of the deck and the opponents' hands, which the player can't tell apart
+    unseen: Tuple[int, ...]
+    opponent_hand_sizes: Tuple[int, ...]
+    # end of round dice rolls left, each may trigger a doubles reshuffle
+    rolls_left: int
+    variant: str = "CorellianGambit"
+
+    @classmethod
+    def from_game(cls, game: GameBase, cookie: str) -> Optional["OddsQuery"]:
+        player = game.get_player(cookie)
+        if player is None or not game.is_active or game.round < 1:
+            return None
+        hand = [c.rank for c in player.hand]
+        unseen = Counter(c.rank for c in game.deck_template) - Counter(hand) - Counter(c.rank for c in game.discard)
+        return cls(hand=tuple(sorted(hand)),
+                   top_discard=game.discard[-1].rank if game.discard else None,
+                   unseen=tuple(sorted(unseen.elements())),
+                   opponent_hand_sizes=tuple(sorted(len(p.hand) for p in game.get_players() if p is not player)),
+                   rolls_left=max(0, game.rules.rounds + 1 - game.round) if game.rules.shift_on_doubles else 0,
+                   variant=game.rules.name)
+
+    def actions(self) -> List[Tuple[Actions, Optional[int]]]:
+        """Every choice available now, a discard is identified by the rank it gives up"""
+        choices = [(Actions.PASS, None)]
+        if len(self.unseen) > sum(self.opponent_hand_sizes):
+            choices.append((Actions.DRAW_DECK, None))
+        if self.top_discard is not None:
+            choices.append((Actions.DRAW_DISCARD, None))
+        choices.extend((Actions.DISCARD, rank) for rank in sorted(set(self.hand)))
+        rules = get_rules(self.variant)
+        return [(action, rank) for action, rank in choices if rules.legal("play", action)]
+
+
+def simulate(query: OddsQuery, rollouts: int, seed: int) -> List[float]:
+    """
+    Wins (ties split evenly) of each of query.actions() over a number of random
+    rollouts. Every rollout deals the opponents' hands from the unseen cards,
+    applies the action, then everyone stands until the game ends; the remaining
+    dice rolls may replace every hand with fresh cards from the deck, as
+    GameBase.process_action does on doubles. Runs in a worker process.
+    """
+    rng = np.random.default_rng(seed)
+    pool = np.array(query.unseen, dtype=np.int8)
+    # one shuffled deck per rollout, shared by every action to compare them on the same draws
+    drawn = pool[np.argsort(rng.random((rollouts, len(pool))), axis=1)]
+    rolls = (rollouts, query.rolls_left)
+    doubles = (rng.integers(1, 7, size=rolls) == rng.integers(1, 7, size=rolls)).sum(axis=1)
+    wins = []
+    for action, rank in query.actions():
+        hand = list(query.hand)
+        offset = 0
+        if action == Actions.DRAW_DISCARD:
+            hand.append(query.top_discard)
+        elif action == Actions.DISCARD:
+            hand.remove(rank)
+        fixed = np.broadcast_to(np.array(hand, dtype=np.int8), (rollouts, len(hand)))
+        if action == Actions.DRAW_DECK:
+            fixed = np.concatenate([fixed, drawn[:, :1]], axis=1)
+            offset = 1
+        wins.append(rollout_wins(query, fixed, drawn, offset, doubles))
+    return wins
+
+
+def rollout_wins(query: OddsQuery, hand: "np.ndarray", drawn: "np.ndarray", offset: int,
+                 doubles: "np.ndarray") -> float:
+    rollouts, pool_size = drawn.shape
+    rules = get_rules(query.variant)
+    sizes = [hand.shape[1]] + list(query.opponent_hand_sizes)
+    dealt = offset + sum(query.opponent_hand_sizes)
+    hands = np.concatenate([hand, drawn[:, offset:dealt]], axis=1)
+    # a reshuffle deals every hand again from the deck, the last one decides the final hands
+    per_deal = sum(sizes)
+    max_reshuffles = (pool_size - dealt) // per_deal if per_deal else 0
+    if max_reshuffles > 0:
+        reshuffles = np.minimum(doubles, max_reshuffles)
+        start = dealt + (np.maximum(reshuffles, 1) - 1) * per_deal
+        redealt = np.take_along_axis(drawn, start[:, None] + np.arange(per_deal), axis=1)
+        hands = np.where((reshuffles > 0)[:, None], redealt, hands)
+    scores = []
+    for first, size in zip(np.cumsum([0] + sizes[:-1]), sizes):
+        scores.append(rules.score_matrix(hands[:, first:first + size], np.full(rollouts, size)))
+    if len(scores) == 1:
+        return float(rollouts)
+    mine, others = scores[0], np.stack(scores[1:])
+    best = others.max(axis=0)
+    tied = (others == mine).sum(axis=0)
+    return float(np.where(mine > best, 1.0, np.where(mine == best, 1.0 / (1 + tied), 0.0)).sum())
+
+
+class OddsService:
+    """
+    Win probability of each choice a player has, estimated by simulate() in a
+    process pool so the event loop never runs the rollouts. Rollouts are run
+    in waves of one chunk per worker until the time budget or max_rollouts is
+    reached. Results are cached by OddsQuery and concurrent requests for the
+    same query share one simulation.
+    """
+    def __init__(self, workers: int = 2, budget: float = 0.25, chunk_size: int = 5000,
+                 max_rollouts: int = 100000, cache_size: int = 4096, executor: Optional[Executor] = None):
+        self.workers: int = workers
+        self.budget: float = budget
+        self.chunk_size: int = chunk_size
+        self.max_rollouts: int = max_rollouts
+        self.cache_size: int = cache_size
+        self.executor: Optional[Executor] = executor
+        self.cache: "OrderedDict[OddsQuery, dict]" = OrderedDict()
+        self.pending: Dict[OddsQuery, asyncio.Future] = {}
+        self.cache_hits: int = 0
+        self.simulations: int = 0
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def get_executor(self) -> Executor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor
+
+    async def estimate(self, query: OddsQuery) -> dict:
+        if query in self.cache:
+            self.cache.move_to_end(query)
+            self.cache_hits += 1
+            return self.cache[query]
+        task = self.pending.get(query)
+        if task is None:
+            task = asyncio.ensure_future(self.run(query))
+            self.pending[query] = task
+            task.add_done_callback(lambda _: self.pending.pop(query, None))
+        # a cancelled request must not cancel the simulation other requests wait on
+        return await asyncio.shield(task)
+
+    async def run(self, query: OddsQuery) -> dict:
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.budget
+        actions = query.actions()
+        wins = [0.0] * len(actions)
+        rollouts = 0
+        while rollouts < self.max_rollouts:
+            wave = [loop.run_in_executor(self.get_executor(), simulate, query, self.chunk_size,
+                                         random.getrandbits(32)) for _ in range(self.workers)]
+            for chunk in await asyncio.gather(*wave):
+                wins = [w + c for w, c in zip(wins, chunk)]
+            rollouts += self.chunk_size * len(wave)
+            if time.monotonic() >= deadline:
+                break
+        self.simulations += 1
+        result = {"rollouts": rollouts,
+                  "odds": [(action, rank, win / rollouts) for (action, rank), win in zip(actions, wins)]}
+        self.cache[query] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+def odds_for_hand(result: dict, hand: List[Card]) -> List[dict]:
+    """Estimates as the client sends actions, discards once per card in the hand"""
+    odds = []
+    for action, rank, win in result["odds"]:
+        values = [c.id for c in hand if c.rank == rank] if action == Actions.DISCARD else [None]
+        odds.extend({"action": action.value, "name": action.name, "actionValue": value, "win": round(win, 4)}
+                    for value in values)
+    return odds
@@ -3,6 +3,8 @@ from models.card import Card
 
 
 class Player:
+    __slots__ = ("cookie", "username", "turnorder", "hand", "credits")
+
     def __init__(self, cookie, turnorder, username: str = "Mr. Mysterious", hand: List[Card] = None):
         # TODO: Player ID?
         self.cookie: str = cookie
@@ -11,3 +13,10 @@ class Player:
         self.hand: list[Card] = hand if hand is not None else []
         #TODO: Allow/handle debt?
         self.credits: int = 100
+
+    def to_dict(self) -> dict:
+        # Cookie is the player's session identifier, never send it to other players
+        return {"username": self.username,
+                "turnorder": self.turnorder,
+                "hand": [c.to_dict() for c in self.hand],
+                "credits": self.credits}
@@ -0,0 +1,109 @@
+import abc
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+Subscriber = Callable[[dict], Awaitable[Any]]
+
+
+class PubSub(metaclass=abc.ABCMeta):
+    """
+    Channel for state changes, so every worker can forward a change to the
+    websockets it holds no matter which worker applied it.
+    """
+    def __init__(self):
+        self.subscribers: List[Subscriber] = []
+
+    def subscribe(self, callback: Subscriber) -> None:
+        self.subscribers.append(callback)
+
+    async def dispatch(self, message: dict) -> None:
+        for callback in self.subscribers:
+            await callback(message)
+
+    @abc.abstractmethod
+    async def publish(self, message: dict) -> None:
+        pass
+
+    async def start(self) -> None:
+        pass
+
+
+class LocalPubSub(PubSub):
+    """Single process channel, delivers synchronously so publish order is delivery order"""
+    async def publish(self, message: dict) -> None:
+        await self.dispatch(message)
+
+
+class SqlitePubSub(PubSub):
+    """
+    Channel shared by worker processes through a SQLite file.
+    Publishing appends a row, every worker polls for rows past the last one it
+    delivered. Rows older than the retention window are pruned. All SQLite
+    work runs on one thread of its own, off the event loop, so the connection
+    is never shared and this worker's rows are inserted in publish order.
+    """
+    def __init__(self, db_path: str = "sabaac.db", poll_interval: float = 0.02, retention: float = 60.0):
+        super().__init__()
+        self.db_path: str = db_path
+        self.poll_interval: float = poll_interval
+        self.retention: float = retention
+        self.connection: Optional[sqlite3.Connection] = None
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pubsub")
+        self.last_id: int = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS Messages "
+                                    "(Id integer PRIMARY KEY AUTOINCREMENT, CreatedAt real, Payload text)")
+        return self.connection
+
+    async def run(self, call: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call, *args)
+
+    async def publish(self, message: dict) -> None:
+        await self.run(self.insert, json.dumps(message))
+
+    def insert(self, payload: str) -> None:
+        self.connect().execute("INSERT INTO Messages (CreatedAt, Payload) VALUES (?, ?)", (time.time(), payload))
+
+    async def start(self) -> None:
+        # Only deliver messages published after this worker started
+        self.last_id = await self.run(self.latest_id)
+        self.task = asyncio.create_task(self.poll())
+
+    def latest_id(self) -> int:
+        return self.connect().execute("SELECT COALESCE(MAX(Id), 0) FROM Messages").fetchone()[0]
+
+    def fetch(self) -> List[tuple]:
+        return self.connect().execute("SELECT Id, Payload FROM Messages WHERE Id > ? ORDER BY Id",
+                                      (self.last_id,)).fetchall()
+
+    def prune(self) -> None:
+        self.connect().execute("DELETE FROM Messages WHERE CreatedAt < ?", (time.time() - self.retention,))
+
+    async def poll(self) -> None:
+        last_prune = time.monotonic()
+        while True:
+            try:
+                rows = await self.run(self.fetch)
+                for row_id, payload in rows:
+                    self.last_id = row_id
+                    await self.dispatch(json.loads(payload))
+                if time.monotonic() - last_prune > self.retention:
+                    last_prune = time.monotonic()
+                    await self.run(self.prune)
+            except Exception as e:
+                logger.warning("Failed to poll messages: %r", e)
+            await asyncio.sleep(self.poll_interval)
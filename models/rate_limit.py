@@ -0,0 +1,20 @@
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Allows rate events per second on average, in bursts of up to burst events"""
+    def __init__(self, rate: float, burst: int):
+        self.rate: float = rate
+        self.burst: int = burst
+        self.tokens: float = burst
+        self.updated: float = time.monotonic()
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        now = now if now is not None else time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
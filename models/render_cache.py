@@ -0,0 +1,85 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from starlette.responses import Response
+from starlette.types import Scope
+
+
+# a versioned URL always names the same bytes, so browsers may keep it for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+# unversioned URLs may be cached but must be revalidated through the ETag
+REVALIDATE = "no-cache"
+
+
+class StaticAssets(StaticFiles):
+    """
+    StaticFiles with content hashed URLs. url() adds ?v= with the start of
+    the file's sha256, a request carrying the current hash is served with
+    IMMUTABLE, anything else with REVALIDATE. Hashes are read once per process.
+    """
+    def __init__(self, directory: str, prefix: str = "/static", hash_length: int = 12):
+        super().__init__(directory=directory)
+        self.prefix: str = prefix
+        self.hash_length: int = hash_length
+        self.hashes: Dict[str, str] = {}
+
+    def version(self, path: str) -> str:
+        path = path.lstrip("/")
+        if path not in self.hashes:
+            digest = hashlib.sha256()
+            with open(os.path.join(self.directory, path), "rb") as f:
+                for chunk in iter(lambda: f.read(65536), b""):
+                    digest.update(chunk)
+            self.hashes[path] = digest.hexdigest()[:self.hash_length]
+        return self.hashes[path]
+
+    def url(self, path: str) -> str:
+        return f"{self.prefix}/{path.lstrip('/')}?v={self.version(path)}"
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        path = os.path.relpath(full_path, self.directory).replace(os.sep, "/")
+        versioned = scope.get("query_string", b"") == f"v={self.version(path)}".encode()
+        response.headers["Cache-Control"] = IMMUTABLE if versioned else REVALIDATE
+        return response
+
+
+class RenderCache:
+    """
+    Rendered pages as UTF-8 bytes, keyed by template name and whatever else
+    the page depends on, e.g. a game's code and version. Templates are
+    compiled once by warm(). Least recently used pages are dropped past
+    maxsize, a maxsize of 0 renders every time.
+    """
+    def __init__(self, templates: Jinja2Templates, maxsize: int = 1024):
+        self.templates: Jinja2Templates = templates
+        self.maxsize: int = maxsize
+        self.pages: "OrderedDict[Tuple[str, Hashable], bytes]" = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def warm(self) -> None:
+        for name in self.templates.env.list_templates():
+            self.templates.get_template(name)
+
+    def render(self, name: str, key: Hashable = None, **context: Any) -> bytes:
+        """The page for key, context is only used to render it on a miss"""
+        cache_key = (name, key)
+        page = self.pages.get(cache_key)
+        if page is not None:
+            self.pages.move_to_end(cache_key)
+            self.hits += 1
+            return page
+        self.misses += 1
+        page = self.templates.get_template(name).render(**context).encode("utf-8")
+        if self.maxsize > 0:
+            self.pages[cache_key] = page
+            if len(self.pages) > self.maxsize:
+                self.pages.popitem(last=False)
+        return page
+
+    def clear(self) -> None:
+        self.pages.clear()
@@ -0,0 +1,23 @@
+from itertools import chain
+from typing import Sequence, Tuple
+try:
+    import numpy as np
+except ImportError:
+    # Vectorized scoring is optional, hands are scored one at a time without it
+    np = None
+
+
+# Primitives shared by the variant scoring engines, see Rules in models/variants.py
+# below this many hands packing a matrix costs more than scoring one at a time
+MIN_BATCH = 32
+
+
+def pack_hands(hands: Sequence[Sequence[int]]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Ranks as an N x max hand size matrix padded with 0, and the number of cards in each hand"""
+    counts = np.fromiter((len(h) for h in hands), dtype=np.int64, count=len(hands))
+    width = int(counts.max()) if len(hands) else 0
+    ranks = np.zeros((len(hands), width), dtype=np.int8)
+    # row-major fill of the first count cells of every row
+    ranks[np.arange(width) < counts[:, None]] = np.fromiter(chain.from_iterable(hands), dtype=np.int8,
+                                                            count=int(counts.sum()))
+    return ranks, counts
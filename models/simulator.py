@@ -0,0 +1,154 @@
+import abc
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+from models.actions import Actions
+from models.action_log import LogEvent
+from models.game_types import CorellianGambit, GameBase
+from models.player import Player
+
+
+class Bot(metaclass=abc.ABCMeta):
+    """Policy that picks a seat's action, every bot gets its own seeded RNG"""
+    def __init__(self, rng: random.Random):
+        self.rng: random.Random = rng
+
+    @abc.abstractmethod
+    def choose(self, game: GameBase, player: Player) -> Tuple[Actions, Optional[int]]:
+        pass
+
+
+class PassBot(Bot):
+    def choose(self, game: GameBase, player: Player) -> Tuple[Actions, Optional[int]]:
+        return Actions.PASS, None
+
+
+class RandomBot(Bot):
+    def choose(self, game: GameBase, player: Player) -> Tuple[Actions, Optional[int]]:
+        choices = [(Actions.PASS, None)]
+        if game.deck:
+            choices.append((Actions.DRAW_DECK, None))
+        if game.discard:
+            choices.append((Actions.DRAW_DISCARD, None))
+        choices.extend((Actions.DISCARD, c.id) for c in player.hand)
+        return self.rng.choice(choices)
+
+
+class GreedyBot(Bot):
+    """Takes the best hand it can see for certain, draws blind when that is still far from 0"""
+    def choose(self, game: GameBase, player: Player) -> Tuple[Actions, Optional[int]]:
+        score_hand = game.rules.score_hand
+        ranks = [c.rank for c in player.hand]
+        options = [(score_hand(ranks), (Actions.PASS, None))]
+        if game.discard:
+            options.append((score_hand(ranks + [game.discard[-1].rank]), (Actions.DRAW_DISCARD, None)))
+        for i, card in enumerate(player.hand):
+            options.append((score_hand(ranks[:i] + ranks[i + 1:]), (Actions.DISCARD, card.id)))
+        best_score, best = max(options, key=lambda option: option[0])
+        if game.deck and abs(sum(ranks)) > 3 and best_score < score_hand([0]):
+            return Actions.DRAW_DECK, None
+        return best
+
+
+POLICIES: Dict[str, Type[Bot]] = {"pass": PassBot, "random": RandomBot, "greedy": GreedyBot}
+
+
+class SimulationStats:
+    """Aggregate results of simulated games, merged across worker processes"""
+    def __init__(self):
+        self.games: int = 0
+        self.actions: int = 0
+        self.rounds: int = 0
+        self.doubles: int = 0
+        self.total_pot: int = 0
+        self.wins_by_turnorder: Counter = Counter()
+        self.wins_by_policy: Counter = Counter()
+        # exceptions raised by the engine, keyed by type, a non-empty count is a rule bug
+        self.errors: Counter = Counter()
+        self.elapsed: float = 0.0
+
+    def merge(self, other: "SimulationStats") -> None:
+        self.games += other.games
+        self.actions += other.actions
+        self.rounds += other.rounds
+        self.doubles += other.doubles
+        self.total_pot += other.total_pot
+        self.wins_by_turnorder.update(other.wins_by_turnorder)
+        self.wins_by_policy.update(other.wins_by_policy)
+        self.errors.update(other.errors)
+
+    def to_dict(self) -> dict:
+        finished = self.games - sum(self.errors.values())
+        return {"games": self.games,
+                "games_per_second": self.games / self.elapsed if self.elapsed else None,
+                "actions_per_game": self.actions / self.games if self.games else 0,
+                "doubles_per_game": self.doubles / self.games if self.games else 0,
+                "average_pot": self.total_pot / finished if finished else 0,
+                "wins_by_turnorder": {k: v / finished for k, v in sorted(self.wins_by_turnorder.items())},
+                "wins_by_policy": {k: v / finished for k, v in sorted(self.wins_by_policy.items())},
+                "errors": dict(self.errors)}
+
+
+def play_game(seed: int, policies: Sequence[str], stats: SimulationStats, max_actions: int = 10000) -> GameBase:
+    """Play one game to the end with a bot per seat, seat i has turn order i + 1"""
+    game = CorellianGambit(seed=seed)
+    bots = {}
+    for i, policy in enumerate(policies):
+        player = game.add_player(Player(f"bot{i}", i + 1, username=f"{policy}{i}"))
+        bots[player.cookie] = POLICIES[policy](random.Random(seed * len(policies) + i))
+    stats.games += 1
+    try:
+        game.start()
+        game.deal()
+        pot = game.hand_pot
+        while game.is_active:
+            if stats.actions >= max_actions * stats.games:
+                raise RuntimeError("game did not finish")
+            player = game.get_current_player()
+            action, value = bots[player.cookie].choose(game, player)
+            pot = game.hand_pot
+            game.process_action(player.cookie, action, value)
+            stats.actions += 1
+    except Exception as e:
+        stats.errors[type(e).__name__] += 1
+        return game
+    stats.rounds += game.round - 1
+    stats.doubles += game.action_log.count(LogEvent.DOUBLES)
+    stats.total_pot += pot
+    stats.wins_by_turnorder[game.winner.turnorder] += 1
+    stats.wins_by_policy[policies[game.winner.turnorder - 1]] += 1
+    return game
+
+
+def run_batch(first_seed: int, num_games: int, policies: Sequence[str]) -> SimulationStats:
+    stats = SimulationStats()
+    start = time.perf_counter()
+    for seed in range(first_seed, first_seed + num_games):
+        play_game(seed, policies, stats)
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def simulate_games(num_games: int, policies: Sequence[str] = ("greedy",) * 4, seed: int = 0,
+                   workers: Optional[int] = None, batch_size: int = 1000) -> SimulationStats:
+    """
+    Play num_games seeded games, spread over a process pool in batches.
+    The same seed and policies always give the same stats, whatever the number of workers.
+    """
+    workers = workers or os.cpu_count() or 1
+    batches: List[Tuple[int, int]] = [(first, min(batch_size, num_games - (first - seed)))
+                                      for first in range(seed, seed + num_games, batch_size)]
+    total = SimulationStats()
+    start = time.perf_counter()
+    if workers == 1:
+        results = [run_batch(first, size, policies) for first, size in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(run_batch, *zip(*batches), [policies] * len(batches)))
+    for result in results:
+        total.merge(result)
+    total.elapsed = time.perf_counter() - start
+    return total
@@ -0,0 +1,100 @@
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+from models.game_state import GameState
+
+
+MISSING = object()
+
+
+def merge_deltas(prev: int, deltas: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """One delta taking a client from prev to the last of deltas, which must follow each other"""
+    changes: Dict[str, Any] = {}
+    messages: List[Any] = []
+    seq = prev
+    for delta in deltas:
+        changes.update(delta["changes"])
+        messages.extend(delta["messages"])
+        seq = delta["seq"]
+    return {"type": "delta",
+            "seq": seq,
+            "prev": prev,
+            "changes": changes,
+            "messages": messages}
+
+
+class StateStream:
+    """
+    Versioned stream of state changes for a single game.
+    Every published change gets the next sequence number. Clients receive a
+    snapshot once and then deltas holding only the fields that changed plus the
+    action log entries added since the previous sequence number.
+    A bounded history of deltas lets a client that missed updates catch up
+    without a full snapshot.
+
+    server-client message format
+    {
+        "type": "snapshot" or "delta",
+        "seq": int,
+        "prev": int (delta only, seq the delta applies on top of),
+        "state": GameState (snapshot only),
+        "changes": {field: value, ...} (delta only),
+        "messages": [{"seq": int, "timestamp": datetime, "body": string}, ...] (delta only),
+        "private": {"playerhand": [Card, ...], "playercredits": int} (changed fields, per player)
+    }
+    A rejected inbound message is answered with {"type": "error", "error": string}.
+    Reconnecting clients resume by sending a ResyncMessage with the last seq
+    they applied, the socket it replaces is closed with code 4001.
+    """
+    def __init__(self, history_size: int = 64):
+        self.seq: int = 0
+        self.log_length: int = 0
+        self.public: Dict[str, Any] = {}
+        # cookie to last private fields sent to that player
+        self.private: Dict[str, Dict[str, Any]] = {}
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+
+    def publish(self, game_state: GameState) -> Dict[str, Any]:
+        """Record a state change and return its public delta"""
+        public = game_state.public_fields()
+        changes = {k: v for k, v in public.items() if self.public.get(k, MISSING) != v}
+        messages = game_state.log.since(self.log_length)
+        self.seq += 1
+        delta = {"type": "delta",
+                 "seq": self.seq,
+                 "prev": self.seq - 1,
+                 "changes": changes,
+                 "messages": messages}
+        self.public = public
+        self.log_length = len(game_state.log)
+        self.history.append(delta)
+        return delta
+
+    def private_changes(self, cookie: str, game_state: GameState) -> Dict[str, Any]:
+        private = game_state.private_fields()
+        previous = self.private.get(cookie, {})
+        self.private[cookie] = private
+        return {k: v for k, v in private.items() if previous.get(k, MISSING) != v}
+
+    def snapshot(self, game_state: GameState, cookie: Optional[str] = None) -> Dict[str, Any]:
+        snapshot = {"type": "snapshot",
+                    "seq": self.seq,
+                    "state": game_state.shared_dict()}
+        if cookie is not None:
+            self.private[cookie] = snapshot["private"] = game_state.private_fields()
+        return snapshot
+
+    def since(self, seq: int) -> Optional[Dict[str, Any]]:
+        """Merge every delta after seq into one, or None if the history no longer covers it"""
+        if seq > self.seq or (self.history and seq < self.history[0]["prev"]) \
+                or (not self.history and seq != self.seq):
+            return None
+        return merge_deltas(seq, (delta for delta in self.history if delta["seq"] > seq))
+
+    def resync(self, seq: Optional[int], game_state: GameState, cookie: Optional[str] = None) -> Dict[str, Any]:
+        delta = self.since(seq) if seq else None
+        if delta is None:
+            return self.snapshot(game_state, cookie)
+        if cookie is not None:
+            # Private fields are small, so a resync always carries the current values
+            self.private[cookie] = delta["private"] = game_state.private_fields()
+        return delta
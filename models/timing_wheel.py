@@ -0,0 +1,109 @@
+import asyncio
+import inspect
+import logging
+import math
+import time
+from typing import Any, Callable, List, Optional, Set
+
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    __slots__ = ("expires", "callback", "args", "slot")
+
+    def __init__(self, expires: int, callback: Callable[..., Any], args: tuple, slot: Set["Timer"]):
+        # tick the timer is due on
+        self.expires: int = expires
+        self.callback: Callable[..., Any] = callback
+        self.args: tuple = args
+        # the wheel slot holding the timer, None once it fired or was cancelled
+        self.slot: Optional[Set["Timer"]] = slot
+
+    def cancel(self) -> bool:
+        """O(1), False if the timer already fired or was cancelled"""
+        if self.slot is None:
+            return False
+        self.slot.discard(self)
+        self.slot = None
+        return True
+
+
+class TimingWheel:
+    """
+    Hashed timing wheel: a timer due on tick t waits in slot t % len(slots),
+    so scheduling and cancelling are O(1) set operations whatever the number
+    of timers. A single task advances the wheel every tick seconds and only
+    looks at the slots it passes; timers further out than one revolution stay
+    put until their tick comes round. Timers fire up to one tick late, never
+    early. A callback may return an awaitable, which is then run as a task;
+    nothing else creates a task per timer.
+    """
+    def __init__(self, tick: float = 0.1, slots: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.tick: float = tick
+        self.slots: List[Set[Timer]] = [set() for _ in range(slots)]
+        self.clock: Callable[[], float] = clock
+        self.origin: float = clock()
+        # last tick advance() processed
+        self.current: int = 0
+        self.fired: int = 0
+        self.task: Optional[asyncio.Task] = None
+        # tasks started by callbacks, referenced until they finish
+        self.running: Set[asyncio.Future] = set()
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self.slots)
+
+    def call_later(self, delay: float, callback: Callable[..., Any], *args: Any) -> Timer:
+        expires = max(self.current + 1, math.ceil((self.clock() + delay - self.origin) / self.tick))
+        slot = self.slots[expires % len(self.slots)]
+        timer = Timer(expires, callback, args, slot)
+        slot.add(timer)
+        return timer
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Fire every timer due by now, returns how many fired"""
+        target = int(((self.clock() if now is None else now) - self.origin) / self.tick)
+        fired = 0
+        # after a stall longer than a revolution, one pass over every slot catches up
+        for tick in range(self.current + 1, min(target, self.current + len(self.slots)) + 1):
+            slot = self.slots[tick % len(self.slots)]
+            due = [timer for timer in slot if timer.expires <= target] if slot else ()
+            for timer in due:
+                slot.discard(timer)
+                timer.slot = None
+                self.fire(timer)
+            fired += len(due)
+        self.current = max(self.current, target)
+        self.fired += fired
+        return fired
+
+    def fire(self, timer: Timer) -> None:
+        try:
+            result = timer.callback(*timer.args)
+        except Exception:
+            logger.exception("Timer callback %r failed", timer.callback)
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self.running.add(task)
+            task.add_done_callback(self.finished)
+
+    def finished(self, task: asyncio.Future) -> None:
+        self.running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Timer task failed", exc_info=task.exception())
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick)
+            self.advance()
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
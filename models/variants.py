@@ -0,0 +1,164 @@
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+from models import scoring
+from models.actions import Actions
+from models.card import Card, build_deck
+from models.player import Player
+from models.scoring import np
+
+
+CORELLIAN_SUITES = ["circle", "triangle", "square"]
+BESPIN_SUITES = ["flasks", "sabers", "staves", "coins"]
+# two of each face card
+BESPIN_FACES = [("idiot", 0), ("queen of air and darkness", -2), ("endurance", -8), ("balance", -11),
+                ("demise", -13), ("moderation", -14), ("evil one", -15), ("star", -17)]
+ALL_ACTIONS = ["DRAW_DECK", "DRAW_DISCARD", "DISCARD", "PASS"]
+# Corellian Gambit scoring, see CorellianGambit.calculate_scores
+CORELLIAN_TIERS = {"perfect": 10000, "target": 10000, "distance": -100, "card": 10, "positive": 1, "bust": 0}
+BESPIN_TIERS = {"perfect": 10000, "target": 5000, "distance": -100, "card": 10, "positive": 1, "bust": -50000}
+
+# Every variant as data. deck lists (suite, rank, copies); a hand scores the
+# tiers for being one of perfect_hands, summing to one of targets, its
+# distance from the nearest target, its cards and its positive ranks, and
+# bust once its total is further than bust_limit from 0. The dice are rolled
+# after every round, doubles replace every hand if shift_on_doubles.
+VARIANT_SPECS: Dict[str, dict] = {
+    "CorellianGambit": {
+        "description": "Get your hand to sum to 0 in three rounds. -10, 0, +10 beats everything.",
+        "deck": [(suite, rank, 1) for rank in range(-10, 11) for suite in CORELLIAN_SUITES if rank != 0]
+                + [("sylop", 0, 2)],
+        "hand_size": 2, "rounds": 3, "shift_on_doubles": True,
+        "targets": [0], "perfect_hands": [[-10, 0, 10]], "bust_limit": None, "tiers": CORELLIAN_TIERS,
+        "actions": {"play": ALL_ACTIONS},
+    },
+    "CorellianSpike": {
+        "description": "Corellian Gambit where the two sylops together are the best hand.",
+        "deck": [(suite, rank, 1) for rank in range(-10, 11) for suite in CORELLIAN_SUITES if rank != 0]
+                + [("sylop", 0, 2)],
+        "hand_size": 2, "rounds": 3, "shift_on_doubles": True,
+        "targets": [0], "perfect_hands": [[0, 0]], "bust_limit": None, "tiers": CORELLIAN_TIERS,
+        "actions": {"play": ALL_ACTIONS},
+    },
+    "BespinStandard": {
+        "description": "Get as close to +23 or -23 as you can without going past it. 0, 2, 3 beats everything."
+                       " Cards can only be drawn from the deck.",
+        "deck": [(suite, rank, 1) for rank in range(1, 16) for suite in BESPIN_SUITES]
+                + [(suite, rank, 2) for suite, rank in BESPIN_FACES],
+        "hand_size": 2, "rounds": 3, "shift_on_doubles": True,
+        "targets": [23, -23], "perfect_hands": [[0, 2, 3]], "bust_limit": 23, "tiers": BESPIN_TIERS,
+        "actions": {"play": ["DRAW_DECK", "DISCARD", "PASS"]},
+    },
+    "EmpressTetaPreferred": {
+        "description": "Bespin Standard over four rounds, drawing from the discard pile is allowed.",
+        "deck": [(suite, rank, 1) for rank in range(1, 16) for suite in BESPIN_SUITES]
+                + [(suite, rank, 2) for suite, rank in BESPIN_FACES],
+        "hand_size": 2, "rounds": 4, "shift_on_doubles": True,
+        "targets": [23, -23], "perfect_hands": [[0, 2, 3]], "bust_limit": 23, "tiers": BESPIN_TIERS,
+        "actions": {"play": ALL_ACTIONS},
+    },
+    "CloudCityCasino": {
+        "description": "Bespin Standard dealt three cards for two rounds, the dice never shift hands.",
+        "deck": [(suite, rank, 1) for rank in range(1, 16) for suite in BESPIN_SUITES]
+                + [(suite, rank, 2) for suite, rank in BESPIN_FACES],
+        "hand_size": 3, "rounds": 2, "shift_on_doubles": False,
+        "targets": [23, -23], "perfect_hands": [[0, 2, 3]], "bust_limit": 23, "tiers": BESPIN_TIERS,
+        "actions": {"play": ["DRAW_DECK", "DISCARD", "PASS"]},
+    },
+}
+
+
+class Rules:
+    """
+    A variant compiled from its spec: the shared deck cards to copy from, the
+    score of every hand total any hand drawn from the deck can have, perfect
+    hands as sorted rank tuples and the legal actions of each phase. Built
+    once per variant at import and never modified; a pickled game only
+    carries the variant name.
+    """
+    __slots__ = ("name", "description", "deck", "hand_size", "rounds", "shift_on_doubles", "actions",
+                 "perfect_hands", "perfect_sizes", "perfect_counts", "card_score", "positive_score",
+                 "perfect_score", "min_total", "total_scores", "total_array")
+
+    def __init__(self, name: str, spec: dict):
+        self.name: str = name
+        self.description: str = spec["description"]
+        self.deck: Tuple[Card, ...] = build_deck([(suite, rank) for suite, rank, copies in spec["deck"]
+                                                  for _ in range(copies)])
+        self.hand_size: int = spec["hand_size"]
+        self.rounds: int = spec["rounds"]
+        self.shift_on_doubles: bool = spec["shift_on_doubles"]
+        # phase to the actions a player may take in it
+        self.actions: Dict[str, FrozenSet[Actions]] = {phase: frozenset(Actions[a] for a in actions)
+                                                       for phase, actions in spec["actions"].items()}
+        tiers = spec["tiers"]
+        self.perfect_hands: FrozenSet[Tuple[int, ...]] = frozenset(tuple(sorted(h)) for h in spec["perfect_hands"])
+        self.perfect_sizes: FrozenSet[int] = frozenset(len(h) for h in self.perfect_hands)
+        # each perfect hand as (size, ((rank, copies), ...)) for score_matrix
+        self.perfect_counts: List[Tuple[int, Tuple[Tuple[int, int], ...]]] = [
+            (len(h), tuple((r, h.count(r)) for r in sorted(set(h)))) for h in self.perfect_hands]
+        self.card_score: int = tiers["card"]
+        self.positive_score: int = tiers["positive"]
+        self.perfect_score: int = tiers["perfect"]
+        # no hand drawn from the deck can sum past the sums of its negative and positive ranks
+        self.min_total: int = sum(c.rank for c in self.deck if c.rank < 0)
+        max_total = sum(c.rank for c in self.deck if c.rank > 0)
+        self.total_scores: Tuple[int, ...] = tuple(
+            self.total_score(total, spec["targets"], spec["bust_limit"], tiers)
+            for total in range(self.min_total, max_total + 1))
+        self.total_array = np.array(self.total_scores, dtype=np.int64) if np is not None else None
+
+    @staticmethod
+    def total_score(total: int, targets: Sequence[int], bust_limit: int, tiers: dict) -> int:
+        distance = min(abs(total - target) for target in targets)
+        score = (distance == 0) * tiers["target"] + distance * tiers["distance"]
+        if bust_limit is not None and abs(total) > bust_limit:
+            score += tiers["bust"]
+        return score
+
+    def __reduce__(self):
+        return (get_rules, (self.name,))
+
+    def __repr__(self) -> str:
+        return f"Rules({self.name})"
+
+    def legal(self, phase: str, action: Actions) -> bool:
+        return action in self.actions.get(phase, ())
+
+    def score_hand(self, hand_vals: Sequence[int]) -> int:
+        score = self.total_scores[sum(hand_vals) - self.min_total]
+        if len(hand_vals) in self.perfect_sizes and tuple(sorted(hand_vals)) in self.perfect_hands:
+            score += self.perfect_score
+        return score + len(hand_vals) * self.card_score + sum(c for c in hand_vals if c > 0) * self.positive_score
+
+    def score_matrix(self, ranks: "np.ndarray", counts: "np.ndarray") -> "np.ndarray":
+        """Scores of every row of a padded rank matrix, see scoring.pack_hands"""
+        total = ranks.sum(axis=1, dtype=np.int64)
+        positive = np.maximum(ranks, 0).sum(axis=1, dtype=np.int64)
+        scores = self.total_array[total - self.min_total] + counts.astype(np.int64) * self.card_score
+        scores += positive * self.positive_score
+        # padding is 0 too, only count ranks within each hand
+        cards = np.arange(ranks.shape[1]) < counts[:, None]
+        for size, copies in self.perfect_counts:
+            perfect = counts == size
+            for rank, count in copies:
+                perfect &= ((ranks == rank) & cards).sum(axis=1) == count
+            scores += perfect * self.perfect_score
+        return scores
+
+    def score_batch(self, hands: Sequence[Sequence[int]]) -> List[int]:
+        if np is None or len(hands) < scoring.MIN_BATCH:
+            return [self.score_hand(h) for h in hands]
+        return self.score_matrix(*scoring.pack_hands(hands)).tolist()
+
+    def rank_players(self, players: Sequence[Player]) -> List[Player]:
+        """Players from best to worst hand, equal scores keep turn order"""
+        scores = self.score_batch([[card.rank for card in p.hand] for p in players])
+        order = sorted(range(len(players)), key=lambda i: -scores[i])
+        return [players[i] for i in order]
+
+
+def get_rules(name: str) -> Rules:
+    return VARIANTS[name]
+
+
+# compiled once, shared by every game of the variant
+VARIANTS: Dict[str, Rules] = {name: Rules(name, spec) for name, spec in VARIANT_SPECS.items()}
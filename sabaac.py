@@ -1,28 +1,175 @@
 from __future__ import annotations
+import asyncio
+import logging
 import os
-from typing import Optional
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import uvicorn
 import uuid
-from fastapi import Cookie, FastAPI, WebSocket, WebSocketDisconnect, Form
-from fastapi.staticfiles import StaticFiles
+from fastapi import Cookie, FastAPI, WebSocket, WebSocketDisconnect, Form, Query
 from fastapi.templating import Jinja2Templates
-from starlette.responses import HTMLResponse, RedirectResponse, FileResponse
-from starlette.requests import Request
-import json
+from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, FileResponse
 # import sqlite3
 # local modules
 from models.player import Player
-from models.game_types import CorellianGambit
+from models.accounts import Accounts, LedgerEntry
+from models.action_log import format_entry
+from models.actions import Actions
+from models.game_types import CorellianGambit, GameBase, variant_types
 from models.game_state import GameState
+from models.encoding import SharedMessage
 from models.connection_manager import ConnectionManager
 from models.game_manager import GameManager
+from models.game_archive import GameArchive
+from models.game_store import InMemoryGameStore, SqliteGameStore
+from models.pubsub import LocalPubSub, SqlitePubSub
+from models.journal import ActionJournal
+from models.odds import OddsQuery, OddsService, odds_for_hand
+from models.logs import configure_logging
+from models.messages import (InvalidMessage, PongMessage, ResyncMessage, parse_game_message, parse_lobby_message,
+                             parse_spectator_message)
+from models.rate_limit import TokenBucket
+from models.matchmaking import LobbyKey, Matchmaker
+from models.metrics import Counter, Gauge, Histogram, MetricsRegistry
+from models.render_cache import RenderCache, StaticAssets
+from models.timing_wheel import Timer, TimingWheel
+from models.variants import VARIANTS
 
 
+SWEEP_INTERVAL_SECONDS = 60
+# a player who does not act in time passes, a lobby nobody starts is dropped
+TURN_TIMEOUT_SECONDS = 60
+LOBBY_TIMEOUT_SECONDS = 15 * 60
+# inbound websocket messages allowed per connection, on average and in a burst
+MESSAGES_PER_SECOND = 5
+MESSAGE_BURST = 10
+MAX_HISTORY_PAGE = 200
+# spectator update intervals are clamped to this range and rounded to SPECTATOR_INTERVAL_STEP,
+# so spectators of a game share a handful of merged feeds
+MIN_SPECTATOR_INTERVAL = 0.25
+MAX_SPECTATOR_INTERVAL = 10.0
+SPECTATOR_INTERVAL_STEP = 0.25
+# quick join fills lobbies up to QUICK_JOIN_SEATS players, matching queued players every QUICK_JOIN_TICK_SECONDS
+QUICK_JOIN_SEATS = 4
+QUICK_JOIN_TICK_SECONDS = 0.25
+QUICK_JOIN_TIMEOUT_SECONDS = 10
+MAX_QUICK_JOIN_ANTE = 100
+LEADERBOARD_SIZE = 100
+MAX_LEADERBOARD_PAGE = 50
+FAVICON_MAX_AGE_SECONDS = 7 * 24 * 3600
+# "memory" keeps games in this process, "sqlite" shares them between uvicorn workers
+BACKEND = os.environ.get("SABAAC_BACKEND", "memory")
+DB_PATH = os.environ.get("SABAAC_DB", "sabaac.db")
 app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+static_assets = StaticAssets(directory="static")
+app.mount("/static", static_assets, name="static")
 templates = Jinja2Templates(directory="templates")
-connection_manager = ConnectionManager()
-game_manager = GameManager()
+templates.env.globals["static_url"] = static_assets.url
+render_cache = RenderCache(templates)
+# every timer in the process: turn timeouts, heartbeats, lobby expiry and the sweeper
+scheduler = TimingWheel()
+connection_manager = ConnectionManager(scheduler=scheduler)
+if BACKEND == "sqlite":
+    game_store, pubsub = SqliteGameStore(DB_PATH), SqlitePubSub(DB_PATH)
+else:
+    game_store, pubsub = InMemoryGameStore(), LocalPubSub()
+game_manager = GameManager(store=game_store, archive=GameArchive(DB_PATH), journal=ActionJournal(DB_PATH))
+# variant name to game constructor, every variant's rules are compiled once on import
+game_types = variant_types()
+odds_service = OddsService()
+# credit balances that outlive games, with the leaderboard served from memory
+accounts = Accounts(DB_PATH, leaderboard_size=LEADERBOARD_SIZE)
+# game code to the (round, turn) a timer is waiting on and the timer
+turn_timers: Dict[str, Tuple[Tuple[int, int], Timer]] = {}
+logger = logging.getLogger("sabaac")
+metrics = MetricsRegistry()
+action_latency = metrics.add(Histogram("sabaac_action_latency_seconds",
+                                       "Time to apply, journal and publish a lobby update or game action", ["kind"]))
+messages_received = metrics.add(Counter("sabaac_messages_received_total",
+                                        "Websocket messages received, rate() gives messages/sec", ["endpoint"]))
+messages_rejected = metrics.add(Counter("sabaac_messages_rejected_total",
+                                        "Websocket messages dropped as invalid, rate limited or for an unknown game",
+                                        ["endpoint", "reason"]))
+messages_published = metrics.add(Counter("sabaac_messages_published_total",
+                                         "State changes published to every worker", ["kind"]))
+metrics.add(Gauge("sabaac_active_games", "Active games held by this worker",
+                  lambda: len(game_manager.games_by_code)))
+metrics.add(Gauge("sabaac_connected_sockets", "Open websockets held by this worker",
+                  lambda: len(connection_manager.active_connections)))
+metrics.add(Gauge("sabaac_quick_join_queued", "Players waiting for a quick join lobby",
+                  lambda: len(matchmaker)))
+metrics.add(Gauge("sabaac_spectators", "Spectator websockets held by this worker",
+                  lambda: len(connection_manager.spectating)))
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    configure_logging()
+    render_cache.warm()
+    recovered = game_manager.recover(game_types)
+    logger.info("Recovered %d games from the journal", len(recovered))
+    for game in recovered:
+        if game.is_started:
+            schedule_turn_timeout(game)
+        else:
+            scheduler.call_later(LOBBY_TIMEOUT_SECONDS, expire_lobby, game.code)
+    await accounts.refresh()
+    await pubsub.start()
+    scheduler.start()
+    scheduler.call_later(SWEEP_INTERVAL_SECONDS, sweep_games)
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    scheduler.stop()
+    odds_service.shutdown()
+
+
+async def sweep_games():
+    """Evict finished/idle games and archive them off the event loop, every SWEEP_INTERVAL_SECONDS"""
+    scheduler.call_later(SWEEP_INTERVAL_SECONDS, sweep_games)
+    loop = asyncio.get_running_loop()
+    await game_manager.sweep_idle_games()
+    pending = game_manager.take_pending_archive()
+    try:
+        await loop.run_in_executor(None, game_manager.archive_games, pending, game_manager.take_log_spill())
+    except Exception:
+        logger.exception("Failed to archive %d games", len(pending))
+    if BACKEND == "sqlite":
+        # balances changed by other workers only reach this leaderboard on a refresh
+        try:
+            await accounts.refresh()
+        except Exception:
+            logger.exception("Failed to refresh the leaderboard")
+
+
+async def expire_lobby(code: str) -> None:
+    remaining = await game_manager.expire_lobby(code, LOBBY_TIMEOUT_SECONDS)
+    if remaining is not None:
+        scheduler.call_later(remaining, expire_lobby, code)
+
+
+def schedule_turn_timeout(game: GameBase) -> None:
+    """Arm the timer for the player whose turn it is, unless it is already waiting on this turn"""
+    turn = (game.round, game.turn)
+    current = turn_timers.get(game.code)
+    if current is not None:
+        if current[0] == turn and game.is_active:
+            return
+        current[1].cancel()
+        del turn_timers[game.code]
+    if game.is_active and game.round > 0:
+        turn_timers[game.code] = (turn, scheduler.call_later(TURN_TIMEOUT_SECONDS, turn_timed_out, game.code, turn))
+
+
+async def turn_timed_out(code: str, turn: Tuple[int, int]) -> None:
+    turn_timers.pop(code, None)
+    game = await game_manager.load_game(code)
+    if game is None or (game.round, game.turn) != turn:
+        return
+    player = game.get_current_player()
+    logger.info("Turn timed out, passing", extra={"game": code, "player": player.username, "round": game.round})
+    await handle_game_action(code, player.cookie, Actions.PASS, None, turn=turn)
 
 
 @app.get("/")
@@ -38,159 +185,454 @@ async def favicon():
     # Icon courtesy of https://github.com/compycore/sabacc
     file_name = "favicon.ico"
     file_path = os.path.join(app.root_path, f"static/{file_name}")
-    return FileResponse(path=file_path, headers={"Content-Disposition": "attachment; filename=" + file_name})
+    return FileResponse(path=file_path, headers={"Cache-Control": f"public, max-age={FAVICON_MAX_AGE_SECONDS}"})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/games")
+async def game_metrics():
+    return game_manager.get_metrics()
+
+
+@app.get("/metrics/connections")
+async def connection_metrics():
+    return connection_manager.get_metrics()
 
 
 @app.get("/login/", response_class=HTMLResponse)
-async def login(request: Request, games_anon_cookie: Optional[str] = Cookie(None)):
+async def login(games_anon_cookie: Optional[str] = Cookie(None)):
     games_anon_cookie = set_cookie(games_anon_cookie)
-    response = templates.TemplateResponse("login.html", {"request": request})
+    response = HTMLResponse(render_cache.render("login.html", variants=list(VARIANTS.values())))
     response.set_cookie(key="games_anon_cookie", value=games_anon_cookie)
     return response
 
 
 @app.get("/createGame/")
-async def createGame(games_anon_cookie: Optional[str] = Cookie(None)):
+async def createGame(variant: str = CorellianGambit.rules.name, games_anon_cookie: Optional[str] = Cookie(None)):
+    if variant not in game_types:
+        return PlainTextResponse(f"Unknown game type {variant}", status_code=400)
     games_anon_cookie = set_cookie(games_anon_cookie)
-    # TODO: Set game type from user input
-    new_game = CorellianGambit()
-    new_player = Player(cookie=games_anon_cookie, turnorder=1)
-    new_game.players.append(new_player)
-    game_manager.get_games().append(new_game)
+    new_game = await create_lobby(game_types[variant], games_anon_cookie)
     return RedirectResponse(url = f"/lobby/{new_game.code}")
 
 
 @app.post("/joinGame/")
-def join_game(gameCode: str = Form(...), games_anon_cookie: Optional[str] = Cookie(None)):
-    if gameCode not in [g.code for g in game_manager.get_games()]:
+async def join_game(gameCode: str = Form(...), games_anon_cookie: Optional[str] = Cookie(None)):
+    if await join_lobby(gameCode, games_anon_cookie) is None:
         return RedirectResponse(url = "/login/")
-    for game in game_manager.get_games():
-        if gameCode != game.code:
-            continue
-        if games_anon_cookie not in [p.cookie for p in game.get_players()]:
-            max_turnorder = max([p.turnorder for p in game.get_players()])
-            new_player = Player(cookie=games_anon_cookie, turnorder=max_turnorder + 1)
-            game.players.append(new_player)
-        return RedirectResponse(url = f"/lobby/{gameCode}")
-    if gameCode not in [g.code for g in game_manager.get_games()]:
+    return RedirectResponse(url = f"/lobby/{gameCode}")
+
+
+@app.get("/quickJoin/")
+async def quick_join(ante: int = Query(2, ge=1, le=MAX_QUICK_JOIN_ANTE), gameType: str = "CorellianGambit",
+                     games_anon_cookie: Optional[str] = Cookie(None)):
+    if gameType not in game_types:
+        return PlainTextResponse(f"Unknown game type {gameType}", status_code=400)
+    games_anon_cookie = set_cookie(games_anon_cookie)
+    key = LobbyKey(gameType, ante)
+    try:
+        code = await asyncio.wait_for(asyncio.shield(matchmaker.enqueue(games_anon_cookie, key)),
+                                      QUICK_JOIN_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        matchmaker.cancel(games_anon_cookie, key)
         return RedirectResponse(url = "/login/")
+    return RedirectResponse(url = f"/lobby/{code}")
+
+
+async def create_lobby(game_type: Callable[[], GameBase], cookie: str, ante: Optional[int] = None) -> GameBase:
+    new_game, committed = await open_lobby(game_type, cookie, ante)
+    await committed
+    return new_game
+
+
+async def open_lobby(game_type: Callable[[], GameBase], cookie: str,
+                     ante: Optional[int] = None) -> Tuple[GameBase, asyncio.Future]:
+    """create_lobby without waiting for the journal, also returns the future of the create being durable"""
+    def make_game() -> GameBase:
+        # set before the game reaches the store, other workers load it from there
+        game = game_type()
+        if ante is not None:
+            game.ante_amount = ante
+        return game
+
+    new_game = await game_manager.open_game(make_game, cookie)
+    committed = game_manager.record(new_game, "create", {"type": new_game.rules.name,
+                                                         "code": new_game.code,
+                                                         "seed": new_game.seed,
+                                                         "cookie": cookie,
+                                                         "ante": new_game.ante_amount})
+    scheduler.call_later(LOBBY_TIMEOUT_SECONDS, expire_lobby, new_game.code)
+    return new_game, committed
+
+
+async def join_lobby(code: str, cookie: str, started: bool = True) -> Optional[GameBase]:
+    """Add cookie to a game unless it is already in it, None if there is no such game or it started and started is False"""
+    game, committed = await seat_in_lobby(code, cookie, started)
+    if committed is not None:
+        await committed
+    return game
+
+
+async def seat_in_lobby(code: str, cookie: str,
+                        started: bool = True) -> Tuple[Optional[GameBase], Optional[asyncio.Future]]:
+    """join_lobby without waiting for the journal, also returns the future of the join being durable if any"""
+    def add_player(game: GameBase) -> Tuple[bool, Optional[Player]]:
+        game.touch()
+        if game.get_player(cookie) is not None:
+            return True, None
+        if game.is_started and not started:
+            return False, None
+        max_turnorder = max([p.turnorder for p in game.get_players()])
+        return True, game.add_player(Player(cookie=cookie, turnorder=max_turnorder + 1))
+
+    game, result = await game_manager.update_game(code, add_player)
+    if game is None or not result[0]:
+        return None, None
+    new_player = result[1]
+    if new_player is None:
+        return game, None
+    return game, game_manager.record(game, "join", {"cookie": new_player.cookie, "turnorder": new_player.turnorder})
+
+
+async def create_matched_lobby(key: LobbyKey, cookie: str) -> Tuple[str, asyncio.Future]:
+    game, committed = await open_lobby(game_types[key.game_type], cookie, key.ante)
+    return game.code, committed
+
+
+async def seat_matched_player(code: str, cookie: str) -> Tuple[Optional[int], Optional[asyncio.Future]]:
+    game, committed = await seat_in_lobby(code, cookie, started=False)
+    return (QUICK_JOIN_SEATS - len(game.get_players()) if game is not None else None), committed
+
+
+matchmaker = Matchmaker(create_matched_lobby, seat_matched_player, seats=QUICK_JOIN_SEATS,
+                        scheduler=scheduler, tick=QUICK_JOIN_TICK_SECONDS)
 
 
 @app.get("/lobby/{code}", response_class=HTMLResponse)
-async def lobby(request: Request, code, games_anon_cookie: Optional[str] = Cookie(None)):
-    game = game_manager.get_game_by_code(code)
+async def lobby(code, games_anon_cookie: Optional[str] = Cookie(None)):
+    game = await game_manager.load_game(code)
     if game is None:
         return RedirectResponse(url = "/login/", status_code=404)
     else:
-        if games_anon_cookie not in [p.cookie for p in game.get_players()]:
+        if game.get_player(games_anon_cookie) is None:
             return RedirectResponse(url = "/login/", status_code=403)
         else:
-            return templates.TemplateResponse("lobby.html", {"request": request, "game_code": code})
+            # the players are filled in over the websocket, so the page only depends on the code and variant
+            return HTMLResponse(render_cache.render("lobby.html", (code, game.rules.name), game_code=code,
+                                                    rules=game.rules))
 
 
 @app.websocket("/lobbyws")
 async def lobby_ws(websocket: WebSocket, games_anon_cookie: Optional[str] = Cookie(None)):
     await connection_manager.connect(games_anon_cookie, websocket)
+    limiter = TokenBucket(MESSAGES_PER_SECOND, MESSAGE_BURST)
     try:
         while True:
-            message = await websocket.receive_json()
-            print(f"Received message: {json.dumps(message)}")
-            code = message["code"]
-            username = message["username"]
-            startgame = message["startgame"]
-            game = game_manager.get_game_by_code(code)
-            if game is not None:
-                # TODO: Move to connection connection_manager directly
-                if game.code in connection_manager.game_connections:
-                    if websocket not in connection_manager.game_connections[game.code]:
-                        connection_manager.game_connections[game.code].append(websocket)
-                    else:
-                        print(f"Websocket {websocket} already in connection_manager.game_connections")
-                else:
-                    connection_manager.game_connections[game.code] = [websocket]
-            if startgame:
-                for p in game.get_players():
-                    p.credits -= (game.ante_amount * 2)
-                    #TODO: Log message stating ante amounts
-                    game.sabaac_pot += game.ante_amount
-                    game.hand_pot += game.ante_amount
-            else:
-                games_anon_cookie = set_cookie(games_anon_cookie)
-                for player in game.get_players():
-                    if games_anon_cookie == player.cookie:
-                        player.username = username
-            game_state = GameState(game)
-            game_state.startgame = startgame
-            await connection_manager.broadcast_game_state(game_state)
+            text = await websocket.receive_text()
+            messages_received.inc(endpoint="lobby")
+            connection_manager.seen(websocket)
+            logger.debug("Received message %s", text)
+            message = await accept_message(websocket, "lobby", text, parse_lobby_message, limiter)
+            if message is None or isinstance(message, PongMessage):
+                continue
+            game = await game_manager.load_game(message.code)
+            if game is None:
+                await reject_message(websocket, "lobby", "unknown_game", f"game {message.code} not found")
+                continue
+            game.touch()
+            connection_manager.subscribe(game.code, websocket)
+            if isinstance(message, ResyncMessage):
+                await handle_resync(websocket, game, message.resync)
+                continue
+            await handle_lobby_update(message.code, set_cookie(games_anon_cookie), message.username, message.startgame)
     except WebSocketDisconnect:
-        print("WebSocketDisconnect received in lobby")
+        logger.debug("WebSocketDisconnect received in lobby")
         connection_manager.disconnect(websocket)
     finally:
-        print("Finally block disconnect from lobby")
         connection_manager.disconnect(websocket)
 
 
 @app.get("/sabaac/{code}")
-async def sabaac(request: Request, code, games_anon_cookie: Optional[str] = Cookie(None)):
-    game = game_manager.get_game_by_code(code)
-    if game.round == 0:
-        game.round = 1
-        for player in game.get_players():
-            for _ in range(2):
-                player.hand.append(game.deck.pop(0))
-    current_player = game.get_current_player()
+async def sabaac(code, games_anon_cookie: Optional[str] = Cookie(None)):
+    def deal(game: GameBase) -> bool:
+        dealt = game.round == 0
+        game.deal()
+        return dealt
+
+    game = await game_manager.load_game(code)
+    # only the first visit deals, later ones skip saving and journaling the game
+    if game is not None and game.round == 0:
+        game, dealt = await game_manager.update_game(code, deal)
+        if dealt:
+            await game_manager.record(game, "deal", {})
+            schedule_turn_timeout(game)
+    if game is None or not game.is_active:
+        return RedirectResponse(url = "/login/", status_code=404)
+    # the page shows the requesting player, the client compares its name to the current player's
+    viewer = game.get_player(games_anon_cookie) or game.get_current_player()
     first_player = game.get_first_player()
-    return templates.TemplateResponse("sabaac.html",
-        {
-            "request": request,
-            "game_code": code,
-            "username": current_player.username,
-            "hand": current_player.hand,
-            "first_player": first_player.username
-        })
-
-
-"""
-client-server message format (player ID in cookie)
-(client) JSON.stringify() -> json.parse() (server)
-{
-    "timestamp": datetime utc isoformat
-    "code": string,
-    "username": string,
-    "startgame": None or boolean,
-    "action": None or action enum,
-    "actionValue": None or int,
-}
-"""
+    # every change to hands or names is published, so the stream's seq versions the page
+    version = (str(game.guid), game.round, game_manager.get_state_stream(game).seq, viewer.cookie)
+    return HTMLResponse(render_cache.render("sabaac.html", version,
+                                            game_code=code,
+                                            username=viewer.username,
+                                            hand=viewer.hand,
+                                            first_player=first_player.username,
+                                            rules=game.rules,
+                                            draw_discard=game.rules.legal("play", Actions.DRAW_DISCARD)))
+
+
+@app.get("/watch/{code}")
+async def watch(code):
+    game = await game_manager.load_game(code)
+    if game is None:
+        return RedirectResponse(url = "/login/", status_code=404)
+    # spectators never see a hand, so one page serves every spectator of the game, codes are reused
+    return HTMLResponse(render_cache.render("sabaac.html", ("watch", str(game.guid)),
+                                            game_code=code, spectator=True, hand=[], rules=game.rules,
+                                            first_player=game.get_first_player().username))
+
+
+@app.get("/odds/{code}")
+async def odds(code: str, games_anon_cookie: Optional[str] = Cookie(None)):
+    """Estimated win probability of each choice the player has right now"""
+    game = await game_manager.load_game(code)
+    query = OddsQuery.from_game(game, games_anon_cookie) if game is not None else None
+    if query is None or not odds_service.available():
+        return JSONResponse({"code": code, "rollouts": 0, "odds": []}, status_code=404)
+    # the hand may change while the rollouts run, answer for the one that was asked about
+    hand = list(game.get_player(games_anon_cookie).hand)
+    result = await odds_service.estimate(query)
+    return {"code": code, "rollouts": result["rollouts"], "odds": odds_for_hand(result, hand)}
+
+
+@app.get("/history/{code}")
+async def history(code: str, before: Optional[int] = None, limit: int = 50,
+                  games_anon_cookie: Optional[str] = Cookie(None)):
+    """A page of the action log, oldest first, older than the entry seq before"""
+    game = await game_manager.load_game(code)
+    loop = asyncio.get_running_loop()
+    limit = max(1, min(limit, MAX_HISTORY_PAGE))
+    # the log is public, spectators read it too
+    if game is None:
+        # a finished game's log is only in the archive
+        archived = None
+        if game_manager.archive is not None:
+            archived = await loop.run_in_executor(None, game_manager.archive.find_by_code, code)
+        if archived is None:
+            return JSONResponse({"code": code, "messages": [], "next": None}, status_code=404)
+        guid, length = archived
+        entries = await loop.run_in_executor(None, game_manager.archive.load_log, guid,
+                                             length if before is None else before, limit)
+    else:
+        before = len(game.action_log) if before is None else before
+        entries = game.action_log.page(before, limit)
+        oldest = entries[0][0] if entries else min(before, len(game.action_log))
+        if len(entries) < limit and oldest > 0 and game_manager.archive is not None:
+            entries = await loop.run_in_executor(None, game_manager.archive.load_log, str(game.guid), oldest,
+                                                 limit - len(entries)) + entries
+    return {"code": code,
+            "messages": [format_entry(e) for e in entries],
+            "next": entries[0][0] if entries and entries[0][0] > 0 else None}
+
+
+@app.get("/leaderboard")
+async def leaderboard(page: int = Query(0, ge=0), size: int = Query(20, ge=1, le=MAX_LEADERBOARD_PAGE)):
+    """A page of the richest accounts, served from memory"""
+    board = accounts.leaderboard
+    offset = page * size
+    return {"page": page,
+            "size": size,
+            "entries": board.page(offset, size),
+            "next": page + 1 if offset + size < len(board) else None}
+
+
+# Inbound message formats are defined in models/messages.py
 @app.websocket("/sabaacws")
 async def sabaacws(websocket: WebSocket, games_anon_cookie: Optional[str] = Cookie(None)):
     await connection_manager.connect(games_anon_cookie, websocket)
+    limiter = TokenBucket(MESSAGES_PER_SECOND, MESSAGE_BURST)
     try:
         while True:
-            # message is a player's action
-            message = await websocket.receive_text()
-            print("Received message: " + message)
-            message = json.loads(message)
-            code = message["code"]
-            action = message["action"]
-            action_value = message["actionValue"]
-            game = game_manager.get_game_by_code(code)
-            game.process_action(games_anon_cookie, action, action_value)
-            game_state = GameState(game)
-            # enrich base game state with player-specific details
-            for player in game.get_players():
-                game_state.playerhand = player.hand
-                game_state.playercredits = player.credits
-                await connection_manager.send_player_update(player.cookie, game_state)
+            # message is a player's action, or a resync request after (re)connecting
+            text = await websocket.receive_text()
+            messages_received.inc(endpoint="game")
+            connection_manager.seen(websocket)
+            logger.debug("Received message %s", text)
+            message = await accept_message(websocket, "game", text, parse_game_message, limiter)
+            if message is None or isinstance(message, PongMessage):
+                continue
+            game = await game_manager.load_game(message.code)
+            if game is None:
+                await reject_message(websocket, "game", "unknown_game", f"game {message.code} not found")
+                continue
+            connection_manager.subscribe(game.code, websocket)
+            if isinstance(message, ResyncMessage):
+                await handle_resync(websocket, game, message.resync, games_anon_cookie)
+                continue
+            await handle_game_action(message.code, games_anon_cookie, message.action, message.actionValue)
     except WebSocketDisconnect:
-        print("WebSocketDisconnect received in game")
+        logger.debug("WebSocketDisconnect received in game")
         connection_manager.disconnect(websocket)
     finally:
-        print("Finally block disconnect from game")
         connection_manager.disconnect(websocket)
-    
+
+
+@app.websocket("/spectatews")
+async def spectatews(websocket: WebSocket):
+    await connection_manager.connect(None, websocket)
+    limiter = TokenBucket(MESSAGES_PER_SECOND, MESSAGE_BURST)
+    try:
+        while True:
+            # message picks the game and update interval, spectators cannot act
+            text = await websocket.receive_text()
+            messages_received.inc(endpoint="spectate")
+            connection_manager.seen(websocket)
+            message = await accept_message(websocket, "spectate", text, parse_spectator_message, limiter)
+            if message is None or isinstance(message, PongMessage):
+                continue
+            game = await game_manager.load_game(message.code)
+            if game is None:
+                await reject_message(websocket, "spectate", "unknown_game", f"game {message.code} not found")
+                continue
+            interval = None
+            if message.interval is not None:
+                interval = min(max(message.interval, MIN_SPECTATOR_INTERVAL), MAX_SPECTATOR_INTERVAL)
+                interval = round(interval / SPECTATOR_INTERVAL_STEP) * SPECTATOR_INTERVAL_STEP
+            connection_manager.spectate(game.code, websocket, interval)
+            await handle_resync(websocket, game, message.spectate)
+    except WebSocketDisconnect:
+        logger.debug("WebSocketDisconnect received from spectator")
+        connection_manager.disconnect(websocket)
+    finally:
+        connection_manager.disconnect(websocket)
+
 
 # Helper functions
+async def accept_message(websocket: WebSocket, endpoint: str, text: str, parse: Callable[[str], Any],
+                         limiter: TokenBucket) -> Optional[Any]:
+    """The parsed message, or None once the client has been told why it was rejected"""
+    if not limiter.allow():
+        await reject_message(websocket, endpoint, "rate_limited", "too many messages")
+        return None
+    try:
+        return parse(text)
+    except InvalidMessage as e:
+        await reject_message(websocket, endpoint, "invalid", str(e))
+        return None
+
+
+async def reject_message(websocket: WebSocket, endpoint: str, reason: str, detail: str) -> None:
+    # the connection stays open, only this message is dropped
+    messages_rejected.inc(endpoint=endpoint, reason=reason)
+    logger.debug("Rejected message: %s", detail)
+    await connection_manager.send_message(websocket, SharedMessage({"type": "error", "error": detail}))
+
+
+async def handle_resync(websocket: WebSocket, game: GameBase, seq: Optional[int], cookie: Optional[str] = None) -> None:
+    async with game.lock:
+        game_state = GameState(game)
+        player = game.get_player(cookie) if cookie is not None else None
+        if player is not None:
+            game_state.playerhand = player.hand
+            game_state.playercredits = player.credits
+        else:
+            cookie = None
+        resync = game_manager.get_state_stream(game).resync(seq, game_state, cookie)
+        await connection_manager.send_message(websocket, SharedMessage(resync), code=game.code)
+
+
+async def handle_lobby_update(code: str, cookie: str, username: str, startgame: bool) -> None:
+    ledger: List[LedgerEntry] = []
+
+    def apply(game: GameBase) -> dict:
+        ledger.clear()
+        if startgame:
+            if game.start():
+                ledger.extend((p.cookie, p.username, "ante", -2 * game.ante_amount) for p in game.get_players())
+        else:
+            player = game.get_player(cookie)
+            if player is not None:
+                player.username = username
+        game_state = GameState(game)
+        game_state.startgame = startgame
+        delta = game_manager.get_state_stream(game).publish(game_state)
+        return {"code": game.code, "delta": delta, "private": None}
+
+    with action_latency.time(kind="lobby"):
+        game, message = await game_manager.update_game(code, apply)
+        if game is None:
+            return
+        if startgame:
+            matchmaker.index.remove(code)
+            await game_manager.record(game, "start", {})
+        else:
+            await game_manager.record(game, "rename", {"cookie": cookie, "username": username})
+        await pubsub.publish(message)
+    messages_published.inc(kind="lobby")
+    if ledger:
+        await accounts.record(game.guid, ledger)
+
+
+async def handle_game_action(code: str, cookie: str, action: Actions, action_value: Optional[int],
+                             turn: Optional[Tuple[int, int]] = None) -> None:
+    """Apply a player's action, only while the game is still on (round, turn) if turn is given"""
+    ledger: List[LedgerEntry] = []
+
+    def apply(game: GameBase) -> Optional[dict]:
+        ledger.clear()
+        if turn is not None and (game.round, game.turn) != turn:
+            return None
+        was_active, hand_pot = game.is_active, game.hand_pot
+        game.process_action(cookie, action, action_value)
+        if was_active and not game.is_active:
+            ledger.append((game.winner.cookie, game.winner.username, "payout", hand_pot))
+        game_state = GameState(game)
+        stream = game_manager.get_state_stream(game)
+        delta = stream.publish(game_state)
+        private = {}
+        for player in game.get_players():
+            game_state.playerhand = player.hand
+            game_state.playercredits = player.credits
+            private[player.cookie] = stream.private_changes(player.cookie, game_state)
+        return {"code": game.code, "delta": delta, "private": private}
+
+    with action_latency.time(kind="action"):
+        game, message = await game_manager.update_game(code, apply)
+        if game is None or message is None:
+            return
+        await game_manager.record(game, "action", {"cookie": cookie, "action": action.value, "actionValue": action_value})
+        await pubsub.publish(message)
+    messages_published.inc(kind="action")
+    schedule_turn_timeout(game)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Applied action", extra={"game": code, "action": action.name, "round": game.round})
+    if not game.is_active:
+        logger.info("Game finished, %s won", game.winner.username, extra={"game": code, "round": game.round})
+        game_manager.finish_game(game)
+    if ledger:
+        await accounts.record(game.guid, ledger)
+
+
+async def deliver_game_state(message: dict) -> None:
+    """Forward a published state change to the websockets held by this worker"""
+    # shared part is encoded once, then spliced with player-specific details
+    delta = SharedMessage(message["delta"])
+    if message["private"] is None:
+        await connection_manager.broadcast_game_state(message["code"], delta)
+    else:
+        for cookie, private in message["private"].items():
+            await connection_manager.send_player_update(cookie, delta, private, code=message["code"])
+    connection_manager.broadcast_spectators(message["code"], delta)
+
+
+pubsub.subscribe(deliver_game_state)
+
+
 def set_cookie(incoming_cookie) -> str:
     if not incoming_cookie:
         new_cookie = str(uuid.uuid1())
@@ -202,5 +644,6 @@ def set_cookie(incoming_cookie) -> str:
 if __name__ == "__main__":
     port_num = 7777
     address = "0.0.0.0"
-    print(f"Listening on {address}:{port_num}")
+    configure_logging()
+    logger.info("Listening on %s:%d", address, port_num)
     uvicorn.run(app, host=address, port=port_num)
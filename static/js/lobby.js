@@ -5,33 +5,68 @@
     var usernameInput = document.getElementById("username");
     var startgameButton = document.getElementById("startgame");
     var ws;
+    var gameState = {};
+    var lastSeq = 0;
+    // Close code sent when another connection of this player took over
+    var REPLACED = 4001;
+    var MIN_RETRY_DELAY = 500;
+    var MAX_RETRY_DELAY = 10000;
+    var retryDelay = MIN_RETRY_DELAY;
     
     document.onreadystatechange = function () {
         if (document.readyState == "complete") {
-            ws = new WebSocket("ws://" + window.location.host + "/lobbyws")
-            ws.onopen = function() {
-                console.log("WebSocket connection opened");
-                doneTyping();
+            connect();
+        }
+    }
+
+    function connect() {
+        ws = new WebSocket("ws://" + window.location.host + "/lobbyws")
+        ws.onopen = function() {
+            console.log("WebSocket connection opened");
+            retryDelay = MIN_RETRY_DELAY;
+            ws.send(JSON.stringify({"code": gameCode, "resync": lastSeq}));
+            doneTyping();
+        }
+        ws.onmessage = function(evt) {
+            if (evt.data == "") {
+                return;
             }
-            ws.onmessage = function(evt) {
-                if (evt.data == "") {
-                    return;
-                }
-                var incomingGameData = JSON.parse(JSON.parse(evt.data));
-                if (incomingGameData.startgame === true) {
-                    window.location.href = "/sabaac/" + gameCode;
-                } else {
-                    var listOfPlayers = "";
-                    if (incomingGameData.players != null) {
-                        incomingGameData.players.forEach(function(player) {
-                            listOfPlayers += "<div>Player " + player.turnorder + ": " + player.username + "</div>"
-                        });
-                    }
-                    document.getElementById("listOfPlayers").innerHTML = listOfPlayers;
+            var update = JSON.parse(evt.data);
+            if (update.type === "ping") {
+                ws.send(JSON.stringify({"pong": true}));
+                return;
+            } else if (update.type === "error") {
+                console.warn("Message rejected: " + update.error);
+                return;
+            } else if (update.type === "snapshot") {
+                gameState = update.state;
+                Object.assign(gameState, update.private);
+            } else if (update.seq <= lastSeq) {
+                return;
+            } else if (update.prev !== lastSeq) {
+                ws.send(JSON.stringify({"code": gameCode, "resync": lastSeq}));
+                return;
+            } else {
+                Object.assign(gameState, update.changes, update.private);
+            }
+            lastSeq = update.seq;
+            if (gameState.startgame === true) {
+                window.location.href = "/sabaac/" + gameCode;
+            } else {
+                var listOfPlayers = "";
+                if (gameState.players != null) {
+                    gameState.players.forEach(function(player) {
+                        listOfPlayers += "<div>Player " + player.turnorder + ": " + player.username + "</div>"
+                    });
                 }
+                document.getElementById("listOfPlayers").innerHTML = listOfPlayers;
             }
-            ws.onclose = function() {
-                console.log("Connection closed");
+        }
+        ws.onclose = function(evt) {
+            console.log("Connection closed");
+            if (evt.code !== REPLACED) {
+                setTimeout(connect, retryDelay);
+                retryDelay = Math.min(retryDelay * 2, MAX_RETRY_DELAY);
             }
         }
     }
@@ -10,6 +10,119 @@ if (Object.freeze) {
 }
 var gameCode = document.getElementById("gamecodeDiv").innerText;
 var ws;
+var gameState = {};
+var lastSeq = 0;
+// seq of the newest action log entry shown, merged spectator updates may repeat older ones
+var lastMessageSeq = -1;
+var spectator = document.body.dataset.spectator === "true";
+// seconds between merged updates when watching, ?interval= on the page URL, every change by default
+var spectatorInterval = parseFloat(new URLSearchParams(window.location.search).get("interval")) || null;
+// Close code sent when another connection of this player took over
+var REPLACED = 4001;
+var MIN_RETRY_DELAY = 500;
+var MAX_RETRY_DELAY = 10000;
+var retryDelay = MIN_RETRY_DELAY;
+
+var oldestSeq = null;
+
+function messageHtml(elem) {
+    var convertedDate = new Date(elem.timestamp).toLocaleTimeString();
+    return "<span class='message'>" + elem.body + " at: <span title='" + convertedDate + "'>" + convertedDate + "</span></span>";
+}
+
+function appendMessages(messages) {
+    var messageLog = document.getElementById("messageLog");
+    messages.forEach(function(elem) {
+        if (elem.seq > lastMessageSeq) {
+            messageLog.insertAdjacentHTML("afterbegin", messageHtml(elem));
+            lastMessageSeq = elem.seq;
+        }
+    });
+}
+
+function resyncMessage() {
+    // Ask for everything after the last state we applied, a snapshot if none
+    if (spectator) {
+        return JSON.stringify({"code": gameCode, "spectate": lastSeq, "interval": spectatorInterval});
+    }
+    return JSON.stringify({"code": gameCode, "resync": lastSeq});
+}
+
+function setOldestSeq(seq) {
+    // Only the latest messages are pushed, older ones are fetched on demand
+    oldestSeq = seq;
+    document.getElementById("olderMessages").style.display = seq ? "inline" : "none";
+}
+
+function loadOlderMessages() {
+    fetch("/history/" + gameCode + "?before=" + oldestSeq).then(function(response) {
+        return response.ok ? response.json() : {"messages": [], "next": null};
+    }).then(function(result) {
+        var messageLog = document.getElementById("messageLog");
+        result.messages.slice().reverse().forEach(function(elem) {
+            messageLog.insertAdjacentHTML("beforeend", messageHtml(elem));
+        });
+        setOldestSeq(result.next);
+    });
+}
+
+function render(incomingGameData) {
+    if (incomingGameData.topdiscard && incomingGameData.topdiscard !== null) {
+        var discard = incomingGameData.topdiscard;
+        document.getElementById("discardPile").innerHTML = discard.rank + " of " + discard.suite;
+    }
+    document.getElementById("currentPlayer").innerHTML = incomingGameData.currentplayer;
+    document.getElementById("userCredits").innerHTML = incomingGameData.playercredits;
+    document.getElementById("sabaacPot").innerHTML = incomingGameData.sabaacpot;
+    document.getElementById("handPot").innerHTML = incomingGameData.handpot;
+
+    var playerHand = incomingGameData.playerhand || [];
+    var handOutput = "";
+    playerHand.forEach(function(elem) {
+        handOutput += "<button type='button' class='card' onclick='logAction(" + actionEnums.DISCARD + ", " + elem.id + ")'>" + elem.rank + " of " + elem.suite + "</button>"
+    });
+    document.getElementById("playerHand").innerHTML = handOutput;
+
+    if (incomingGameData.winner !== null) {
+        document.getElementById("winner").innerHTML = incomingGameData.winner.username;
+        document.getElementById("end-of-game-modal").style.visibility = "visible";
+    } else {
+        document.getElementById("round").innerHTML = incomingGameData.round;
+    }
+}
+
+var oddsSeq = -1;
+
+function requestOdds(seq) {
+    // Only worth asking on our own turn, once per state
+    var myTurn = !spectator && gameState.currentplayer === document.getElementById("usernameDiv").innerText;
+    if (!myTurn || gameState.winner !== null) {
+        document.getElementById("odds").innerHTML = "";
+        return;
+    }
+    if (oddsSeq === seq) {
+        return;
+    }
+    oddsSeq = seq;
+    fetch("/odds/" + gameCode).then(function(response) {
+        return response.ok ? response.json() : {"odds": []};
+    }).then(function(result) {
+        if (oddsSeq !== seq) {
+            return;
+        }
+        var labels = {"PASS": "Stand", "DRAW_DECK": "Draw", "DRAW_DISCARD": "Take discard"};
+        var hand = gameState.playerhand || [];
+        var output = result.odds.map(function(elem) {
+            var label = labels[elem.name];
+            if (elem.name === "DISCARD") {
+                var card = hand.find(function(c) { return c.id === elem.actionValue; });
+                label = "Discard " + (card ? card.rank + " of " + card.suite : elem.actionValue);
+            }
+            return "<div>" + label + ": " + Math.round(elem.win * 100) + "% to win</div>";
+        });
+        document.getElementById("odds").innerHTML = output.join("");
+    });
+}
 
 document.onreadystatechange = function () {
     if (document.readyState == "complete") {
@@ -22,53 +135,59 @@ document.onreadystatechange = function () {
         document.getElementById("pass").onclick = function() {
             logAction(actionEnums.PASS);
         };
+        document.getElementById("olderMessages").onclick = loadOlderMessages;
 
-        ws = new WebSocket("ws://" + window.location.host + "/sabaacws")
-        ws.onopen = function() {
-            console.log("WebSocket connection opened");
-        }
-        ws.onmessage = function(evt) {
-            console.log("Receiving message");
-            if (evt.data == "") {
-                return;
-            }
-            // TODO: Double encoding?
-            var incomingGameData = JSON.parse(JSON.parse(evt.data));
-            console.log(incomingGameData);
-
-            if (incomingGameData.topdiscard && incomingGameData.topdiscard !== null) {
-                var discard = incomingGameData.topdiscard;
-                document.getElementById("discardPile").innerHTML = discard.rank + " of " + discard.suite;
-            }
-            document.getElementById("currentPlayer").innerHTML = incomingGameData.currentplayer;
-            document.getElementById("userCredits").innerHTML = incomingGameData.playercredits;
-            document.getElementById("sabaacPot").innerHTML = incomingGameData.sabaacpot;
-            document.getElementById("handPot").innerHTML = incomingGameData.handpot;
-            
-            var playerHand =  incomingGameData.playerhand;
-            var handOutput = "";
-            playerHand.forEach(function(elem) {
-                handOutput += "<button type='button' class='card' onclick='logAction(&quot;" + actionEnums.DISCARD + "&quot;, " + elem.id + ")'>" + elem.rank + " of " + elem.suite + "</button>"
-            });
-            document.getElementById("playerHand").innerHTML = handOutput;
-
-            var messages = incomingGameData.messages;
-            var messageOutput = "";
-            messages.forEach(function(elem) {
-                var convertedDate = new Date(elem.timestamp).toLocaleTimeString();
-                messageOutput = "<span class='message'>" + elem.body + " at: <span title='" + convertedDate + "'>" + convertedDate + "</span></span>" + messageOutput;
-            });
+        connect();
+    }
+}
 
-            document.getElementById("messageLog").innerHTML = messageOutput;
-            if (incomingGameData.winner !== null) {
-                document.getElementById("winner").innerHTML = incomingGameData.winner.username;
-                document.getElementById("end-of-game-modal").style.visibility = "visible";
-            } else {
-                document.getElementById("round").innerHTML = incomingGameData.round;
-            }
+function connect() {
+    ws = new WebSocket("ws://" + window.location.host + (spectator ? "/spectatews" : "/sabaacws"))
+    ws.onopen = function() {
+        console.log("WebSocket connection opened");
+        retryDelay = MIN_RETRY_DELAY;
+        ws.send(resyncMessage());
+    }
+    ws.onmessage = function(evt) {
+        console.log("Receiving message");
+        if (evt.data == "") {
+            return;
         }
-        ws.onclose = function() {
-            console.log("Connection closed");
+        var update = JSON.parse(evt.data);
+        if (update.type === "ping") {
+            ws.send(JSON.stringify({"pong": true}));
+            return;
+        } else if (update.type === "error") {
+            console.warn("Message rejected: " + update.error);
+            return;
+        } else if (update.type === "snapshot") {
+            gameState = update.state;
+            Object.assign(gameState, update.private);
+            document.getElementById("messageLog").innerHTML = "";
+            lastMessageSeq = -1;
+            appendMessages(gameState.messages);
+            setOldestSeq(gameState.messages.length ? gameState.messages[0].seq : null);
+        } else if (update.seq <= lastSeq) {
+            return;
+        } else if (update.prev > lastSeq) {
+            // Missed an update, ask for the gap instead of applying out of order.
+            // A delta starting before lastSeq is fine, changes carry whole field values
+            ws.send(resyncMessage());
+            return;
+        } else {
+            Object.assign(gameState, update.changes, update.private);
+            appendMessages(update.messages);
+        }
+        lastSeq = update.seq;
+        render(gameState);
+        requestOdds(lastSeq);
+    }
+    ws.onclose = function(evt) {
+        console.log("Connection closed");
+        // Reconnect and resume from lastSeq, unless a newer connection replaced this one
+        if (evt.code !== REPLACED) {
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, MAX_RETRY_DELAY);
         }
     }
 }
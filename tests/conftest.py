@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+
+# Keep test runs away from the committed sabaac.db
+os.environ.setdefault("SABAAC_DB", os.path.join(tempfile.mkdtemp(), "test.db"))
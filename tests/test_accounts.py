@@ -0,0 +1,43 @@
+import asyncio
+import random
+import sqlite3
+from models.accounts import Accounts, Leaderboard
+
+
+def test_leaderboard_stays_an_exact_prefix_of_the_ranking() -> None:
+    rng = random.Random(0)
+    balances = {}
+    board = Leaderboard(size=5)
+    board.reset([])
+    for _ in range(2000):
+        cookie = f"c{rng.randrange(30)}"
+        balances[cookie] = balances.get(cookie, 100) + rng.randint(-20, 20)
+        board.update(cookie, cookie.upper(), balances[cookie])
+        if board.needs_refill:
+            board.reset(sorted(((c, c.upper(), b) for c, b in balances.items()), key=lambda r: (-r[2], r[0]))[:5])
+        expected = sorted(balances.items(), key=lambda r: (-r[1], r[0]))[:len(board)]
+        assert [(e["username"].lower(), e["balance"]) for e in board.page(0, 5)] == expected
+    assert len(board) == 5
+
+
+def test_ledger_batches_update_balances_and_leaderboard(tmp_path) -> None:
+    db_path = str(tmp_path / "test.db")
+    accounts = Accounts(db_path, leaderboard_size=2)
+
+    async def run():
+        await accounts.refresh()
+        await asyncio.gather(accounts.record("g1", [("c1", "Han", "ante", -4), ("c2", "Lando", "ante", -4),
+                                                    ("c3", "Chewie", "ante", -4)]),
+                             accounts.record("g1", [("c3", "Chewie", "payout", 12)]))
+        await accounts.record("g2", [("c3", "Chewie", "ante", -40)])
+    asyncio.run(run())
+
+    with sqlite3.connect(db_path) as connection:
+        ledger = connection.execute("SELECT COUNT(*), SUM(Amount) FROM Ledger").fetchone()
+    assert ledger == (5, -40)
+    assert accounts.committed_batches < 3
+    assert accounts.balance("c3") == 68
+    assert accounts.balance("nobody") == 100
+    # c3 fell off the board and c1 was read back in from the balance index
+    assert accounts.leaderboard.page(0, 10) == [{"rank": 1, "username": "Han", "balance": 96},
+                                                {"rank": 2, "username": "Lando", "balance": 96}]
@@ -0,0 +1,100 @@
+import os
+import pickle
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+import sabaac
+from models.action_log import ActionLog, LogEvent
+from models.game_archive import GameArchive
+from models.game_manager import GameManager
+from models.game_types import CorellianGambit
+from models.player import Player
+
+
+def make_log(count: int, capacity: int = 5) -> ActionLog:
+    log = ActionLog()
+    log.capacity = capacity
+    for i in range(count):
+        log.append(LogEvent.ROLLED, i, i, created_at=i * 1000)
+    return log
+
+
+def test_ring_buffer_spills_oldest_entries() -> None:
+    log = make_log(8)
+
+    assert len(log) == 8
+    assert [e[0] for e in log.entries] == [3, 4, 5, 6, 7]
+    assert [e[0] for e in log.take_spilled()] == [0, 1, 2]
+    assert log.spilled == []
+    assert [m["seq"] for m in log.since(6)] == [6, 7]
+    assert log.recent()[0] == {"seq": 3, "timestamp": "1970-01-01T00:00:03", "body": "Rolled 2 dice: 3 and 3"}
+
+
+def test_page_reads_memory_and_spill() -> None:
+    log = make_log(8)
+
+    assert [e[0] for e in log.page(8, 3)] == [5, 6, 7]
+    assert [e[0] for e in log.page(5, 4)] == [1, 2, 3, 4]
+    assert [e[0] for e in log.page(2, 10)] == [0, 1]
+
+
+def test_old_pickled_games_convert_their_log() -> None:
+    game = CorellianGambit()
+    state = game.__getstate__()
+    state["action_log"] = [{"timestamp": "2021-10-30T12:00:00", "body": "p1 drew from the deck"}]
+    loaded = CorellianGambit.__new__(CorellianGambit)
+
+    loaded.__setstate__(pickle.loads(pickle.dumps(state)))
+
+    assert loaded.action_log.recent() == [{"seq": 0, "timestamp": "2021-10-30T12:00:00",
+                                           "body": "p1 drew from the deck"}]
+
+
+def test_history_pages_through_archived_entries(mocker: MockerFixture, tmp_path) -> None:
+    game_manager = GameManager(archive=GameArchive(os.path.join(tmp_path, "log.db")))
+    mocker.patch("sabaac.game_manager", game_manager)
+    game = CorellianGambit()
+    game.add_player(Player("p1", 1, username="p1"))
+    game_manager.add_game(game)
+    for i in range(ActionLog.capacity + 30):
+        game.action_log.append(LogEvent.DREW_DECK, f"p{i}")
+    game_manager.sweep()
+    client = TestClient(sabaac.app)
+    client.cookies.set("games_anon_cookie", "p1")
+
+    bodies, before = [], None
+    while True:
+        params = {"limit": 20} if before is None else {"limit": 20, "before": before}
+        page = client.get(f"/history/{game.code}", params=params).json()
+        bodies = [m["body"] for m in page["messages"]] + bodies
+        before = page["next"]
+        if before is None:
+            break
+
+    assert game.action_log.spilled == []
+    assert bodies == [f"p{i} drew from the deck" for i in range(ActionLog.capacity + 30)]
+    # spectators read the same public log
+    spectator = client.get(f"/history/{game.code}", params={"limit": 5}, cookies={"games_anon_cookie": "other"})
+    assert [m["body"] for m in spectator.json()["messages"]] == bodies[-5:]
+    assert client.get("/history/missing").status_code == 404
+
+
+def test_history_of_finished_game_comes_from_archive(mocker: MockerFixture, tmp_path) -> None:
+    game_manager = GameManager(archive=GameArchive(os.path.join(tmp_path, "log.db")))
+    mocker.patch("sabaac.game_manager", game_manager)
+    game = CorellianGambit()
+    game.add_player(Player("p1", 1, username="p1"))
+    game_manager.add_game(game)
+    for i in range(30):
+        game.action_log.append(LogEvent.DREW_DECK, f"p{i}")
+    game.is_active = False
+    game_manager.finish_game(game)
+    game_manager.sweep()
+    client = TestClient(sabaac.app)
+
+    latest = client.get(f"/history/{game.code}", params={"limit": 20}).json()
+    older = client.get(f"/history/{game.code}", params={"limit": 20, "before": latest["next"]}).json()
+
+    assert game_manager.get_game_by_code(game.code) is None
+    assert [m["body"] for m in latest["messages"]] == [f"p{i} drew from the deck" for i in range(10, 30)]
+    assert [m["body"] for m in older["messages"]] == [f"p{i} drew from the deck" for i in range(10)]
+    assert older["next"] is None
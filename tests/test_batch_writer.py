@@ -0,0 +1,53 @@
+import asyncio
+from typing import List, Tuple
+import pytest
+from models.batch_writer import BatchWriter
+
+
+class ListWriter(BatchWriter):
+    def __init__(self, fail: bool = False):
+        super().__init__()
+        self.fail: bool = fail
+        self.pending: List[int] = []
+        self.batches: List[List[int]] = []
+
+    def add(self, value: int) -> asyncio.Future:
+        self.pending.append(value)
+        return self.add_waiter()
+
+    def take_batch(self) -> Tuple[List[int]]:
+        values, self.pending = self.pending, []
+        return (values,)
+
+    def write_batch(self, values: List[int]) -> None:
+        if self.fail:
+            raise ValueError("disk full")
+        self.batches.append(values)
+
+
+def test_concurrent_writes_share_a_commit() -> None:
+    writer = ListWriter()
+
+    async def run():
+        await asyncio.gather(*[writer.add(i) for i in range(10)])
+        writer.task.cancel()
+    asyncio.run(run())
+
+    assert sum(writer.batches, []) == list(range(10))
+    assert writer.committed_batches == len(writer.batches) < 10
+    assert writer.committed_entries == 10
+
+
+def test_failed_commit_reaches_its_waiters() -> None:
+    writer = ListWriter(fail=True)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await writer.add(1)
+        writer.fail = False
+        await writer.add(2)
+        writer.task.cancel()
+    asyncio.run(run())
+
+    assert writer.batches == [[2]]
+    assert writer.committed_batches == 1
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import random
+from pytest_mock import MockerFixture
+import sabaac
+from models.actions import Actions
+from models.connection_manager import ConnectionManager
+from models.game_manager import GameManager
+from models.game_types import CorellianGambit
+from models.player import Player
+from models.pubsub import LocalPubSub
+from tests.test_connection_manager import FakeWebSocket
+
+
+def test_concurrent_actions_keep_game_invariants(mocker: MockerFixture) -> None:
+    random.seed(0)
+    mocker.patch("sabaac.game_manager", GameManager())
+    mocker.patch("sabaac.connection_manager", ConnectionManager(max_queue_depth=100000))
+    pubsub = LocalPubSub()
+    pubsub.subscribe(sabaac.deliver_game_state)
+    mocker.patch("sabaac.pubsub", pubsub)
+    num_games, num_players, actions_per_player = 100, 4, 25
+
+    async def run():
+        games, sockets = [], []
+        for g in range(num_games):
+            game = sabaac.game_manager.create_game(CorellianGambit, f"g{g}p1")
+            for p in range(2, num_players + 1):
+                game.add_player(Player(f"g{g}p{p}", p))
+            game.deal()
+            for player in game.get_players():
+                websocket = FakeWebSocket()
+                await sabaac.connection_manager.connect(player.cookie, websocket)
+                sockets.append(websocket)
+            games.append(game)
+
+        async def player_loop(game, player):
+            for _ in range(actions_per_player):
+                await asyncio.sleep(0)
+                if not game.is_active:
+                    break
+                action = random.choice([Actions.DRAW_DECK, Actions.DRAW_DISCARD, Actions.PASS, Actions.DISCARD])
+                action_value = player.hand[0].id if player.hand else None
+                await sabaac.handle_game_action(game.code, player.cookie, action, action_value)
+
+        async def start_loop(game):
+            # Every player presses start, antes must only be taken once
+            await asyncio.gather(*[sabaac.handle_lobby_update(game.code, p.cookie, p.username, True)
+                                   for p in game.get_players()])
+
+        await asyncio.gather(*[start_loop(g) for g in games])
+        await asyncio.gather(*[player_loop(g, p) for g in games for p in g.get_players()])
+        await asyncio.sleep(0.1)
+        return games, sockets
+
+    games, sockets = asyncio.run(run())
+
+    for game in games:
+        cards = list(game.deck) + game.discard + [c for p in game.get_players() for c in p.hand]
+        assert sorted(c.id for c in cards) == list(range(62))
+        credits = sum(p.credits for p in game.get_players())
+        assert credits + game.sabaac_pot + game.hand_pot == 100 * num_players
+        assert game.sabaac_pot == game.ante_amount * num_players
+    for websocket in sockets:
+        seqs = [json.loads(m) for m in websocket.sent]
+        seqs = [(m["prev"], m["seq"]) for m in seqs]
+        assert all(prev == seq - 1 for prev, seq in seqs)
+        assert [seq for _, seq in seqs] == sorted(seq for _, seq in seqs)
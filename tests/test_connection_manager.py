@@ -0,0 +1,220 @@
+import asyncio
+import json
+from models.connection_manager import REPLACED, ConnectionManager
+from models.encoding import SharedMessage
+from models.timing_wheel import TimingWheel
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.query_params = {}
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        self.close_code = code
+
+
+def test_slow_client_does_not_stall_broadcast() -> None:
+    async def run():
+        manager = ConnectionManager(send_timeout=5.0)
+        slow, fast = FakeWebSocket(delay=0.5), FakeWebSocket()
+        await manager.connect("slow", slow)
+        await manager.connect("fast", fast)
+        manager.subscribe("code", slow)
+        manager.subscribe("code", fast)
+
+        await manager.broadcast_game_state("code", SharedMessage({"seq": 1}))
+        await asyncio.sleep(0.05)
+
+        assert fast.sent == ['{"seq":1}']
+        assert slow.sent == []
+        assert manager.get_metrics()["code"]["connections"] == 2
+    asyncio.run(run())
+
+
+def test_full_queue_drops_oldest_pending_frame() -> None:
+    async def run():
+        manager = ConnectionManager(max_queue_depth=2)
+        websocket = FakeWebSocket(delay=0.01)
+        await manager.connect("cookie", websocket)
+        manager.subscribe("code", websocket)
+
+        for seq in range(5):
+            await manager.send_player_update("cookie", SharedMessage({"seq": seq}), code="code")
+        await asyncio.sleep(0.1)
+
+        assert websocket.sent == ['{"seq":3}', '{"seq":4}']
+        assert manager.get_metrics()["code"]["dropped"] == 3
+    asyncio.run(run())
+
+
+def test_stuck_socket_is_evicted() -> None:
+    async def run():
+        manager = ConnectionManager(send_timeout=0.05)
+        websocket = FakeWebSocket(delay=10)
+        await manager.connect("cookie", websocket)
+
+        await manager.send_player_update("cookie", SharedMessage({"seq": 1}))
+        await asyncio.sleep(0.2)
+
+        assert websocket.closed
+        assert websocket not in manager.writers
+        assert websocket not in manager.active_connections
+    asyncio.run(run())
+
+
+def test_disconnect_removes_empty_index_entries() -> None:
+    async def run():
+        manager = ConnectionManager()
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect("cookie", first)
+        await manager.connect("cookie2", second)
+        manager.subscribe("game1", first)
+        manager.subscribe("game1", second)
+        manager.subscribe("game2", second)
+
+        assert manager.game_connections == {"game1": {first}, "game2": {second}}
+        manager.disconnect(first)
+        manager.disconnect(first)
+        manager.disconnect(second)
+
+        assert manager.game_connections == {}
+        assert manager.cookie_connections == {}
+        assert manager.websocket_games == {}
+        assert manager.active_connections == set()
+    asyncio.run(run())
+
+
+def test_silent_connection_is_pinged_then_evicted() -> None:
+    async def run():
+        clock = [0.0]
+        scheduler = TimingWheel(tick=1.0, slots=8, clock=lambda: clock[0])
+        manager = ConnectionManager(scheduler=scheduler, heartbeat_interval=20, heartbeat_timeout=10)
+        alive, silent = FakeWebSocket(), FakeWebSocket()
+        await manager.connect("alive", alive)
+        await manager.connect("silent", silent)
+
+        clock[0] = 20
+        scheduler.advance()
+        await asyncio.sleep(0.01)
+        assert alive.sent == silent.sent == ['{"type":"ping"}']
+        manager.seen(alive)
+        clock[0] = 30
+        scheduler.advance()
+        await asyncio.sleep(0.01)
+
+        assert silent.closed and silent not in manager.active_connections
+        assert not alive.closed and alive in manager.active_connections
+        assert manager.heartbeats.keys() == {alive}
+    asyncio.run(run())
+
+
+def test_resubscribing_cookie_replaces_stale_socket() -> None:
+    async def run():
+        manager = ConnectionManager()
+        stale, fresh, other_game, other_player = FakeWebSocket(), FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for cookie, websocket in (("cookie", stale), ("cookie", fresh), ("cookie", other_game), ("other", other_player)):
+            await manager.connect(cookie, websocket)
+        manager.subscribe("code", stale)
+        manager.subscribe("game2", other_game)
+        manager.subscribe("code", other_player)
+
+        manager.subscribe("code", fresh)
+        await asyncio.gather(*manager.closing)
+
+        assert stale.closed and stale.close_code == REPLACED
+        assert manager.game_connections == {"code": {fresh, other_player}, "game2": {other_game}}
+        assert manager.cookie_connections["cookie"] == {fresh, other_game}
+        assert not other_game.closed and not other_player.closed
+    asyncio.run(run())
+
+
+def test_spectators_share_one_encoded_frame() -> None:
+    async def run():
+        manager = ConnectionManager()
+        player, spectators = FakeWebSocket(), [FakeWebSocket() for _ in range(1000)]
+        await manager.connect("player", player)
+        manager.subscribe("code", player)
+        for websocket in spectators:
+            await manager.connect(None, websocket)
+            manager.spectate("code", websocket)
+
+        delta = SharedMessage({"seq": 1, "changes": {}})
+        await manager.send_player_update("player", delta, {"playerhand": []}, code="code")
+        manager.broadcast_spectators("code", delta)
+        await asyncio.sleep(0.05)
+
+        frames = {id(websocket.sent[0]) for websocket in spectators}
+        assert len(frames) == 1 and spectators[0].sent == ['{"seq":1,"changes":{}}']
+        assert player.sent == ['{"seq":1,"changes":{},"private":{"playerhand":[]}}']
+    asyncio.run(run())
+
+
+def test_player_update_only_reaches_sockets_on_that_game() -> None:
+    async def run():
+        manager = ConnectionManager()
+        here, elsewhere = FakeWebSocket(), FakeWebSocket()
+        await manager.connect("cookie", here)
+        await manager.connect("cookie", elsewhere)
+        manager.subscribe("game1", here)
+        manager.subscribe("game2", elsewhere)
+
+        await manager.send_player_update("cookie", SharedMessage({"seq": 7}), code="game1")
+        await asyncio.sleep(0.01)
+
+        assert here.sent == ['{"seq":7}']
+        assert elsewhere.sent == []
+    asyncio.run(run())
+
+
+def test_disconnected_spectators_leave_no_index_entries() -> None:
+    async def run():
+        manager = ConnectionManager()
+        for _ in range(100):
+            websocket = FakeWebSocket()
+            await manager.connect(None, websocket)
+            manager.spectate("code", websocket)
+            manager.disconnect(websocket)
+
+        assert manager.cookie_connections == {}
+        assert manager.websocket_cookies == {}
+        assert manager.spectators == {} and manager.spectating == {}
+    asyncio.run(run())
+
+
+def test_paced_spectators_get_one_merged_delta_per_interval() -> None:
+    async def run():
+        clock = [0.0]
+        scheduler = TimingWheel(tick=0.5, slots=8, clock=lambda: clock[0])
+        manager = ConnectionManager(scheduler=scheduler)
+        live, paced = FakeWebSocket(), FakeWebSocket()
+        for websocket, interval in ((live, None), (paced, 1.0)):
+            await manager.connect(None, websocket)
+            manager.spectate("code", websocket, interval)
+
+        for seq in (3, 4, 5):
+            manager.broadcast_spectators("code", SharedMessage({"type": "delta", "seq": seq, "prev": seq - 1,
+                                                                "changes": {"round": seq, f"f{seq}": seq},
+                                                                "messages": [seq]}))
+        await asyncio.sleep(0.01)
+        assert len(live.sent) == 3 and paced.sent == []
+        clock[0] = 1.0
+        scheduler.advance()
+        await asyncio.sleep(0.01)
+
+        assert [json.loads(frame) for frame in paced.sent] == [
+            {"type": "delta", "seq": 5, "prev": 2, "changes": {"round": 5, "f3": 3, "f4": 4, "f5": 5},
+             "messages": [3, 4, 5]}]
+        manager.disconnect(paced)
+        assert manager.spectators == {"code": {None: {live}}}
+    asyncio.run(run())
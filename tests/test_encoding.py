@@ -0,0 +1,28 @@
+import json
+import pytest
+from models.encoding import JSON, MSGPACK, SharedMessage, msgpack, negotiate_format
+
+
+message = {"type": "delta", "seq": 2, "prev": 1, "changes": {"handpot": 4}, "messages": []}
+private = {"playerhand": [{"id": 1, "suite": "circle", "rank": -3}], "playercredits": 96}
+
+
+def test_json_splices_private_fields() -> None:
+    shared = SharedMessage(message)
+
+    assert json.loads(shared.encode(JSON)) == message
+    assert json.loads(shared.encode(JSON, private)) == dict(message, private=private)
+    assert json.loads(SharedMessage({}).encode(JSON, private)) == {"private": private}
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack not installed")
+def test_msgpack_splices_private_fields() -> None:
+    shared = SharedMessage(message)
+
+    assert msgpack.unpackb(shared.encode(MSGPACK)) == message
+    assert msgpack.unpackb(shared.encode(MSGPACK, private)) == dict(message, private=private)
+
+
+def test_negotiate_format_defaults_to_json() -> None:
+    assert negotiate_format(None) == JSON
+    assert negotiate_format("xml") == JSON
@@ -0,0 +1,185 @@
+import asyncio
+import random
+import threading
+import time
+from models.game_archive import GameArchive
+from models.game_manager import GameManager
+from models.game_store import SqliteGameStore
+from models.journal import ActionJournal
+from models.game_types import CorellianGambit
+
+
+def test_create_game_indexes_game_and_player() -> None:
+    game_manager = GameManager()
+
+    game = game_manager.create_game(CorellianGambit, "cookie1")
+
+    assert game_manager.get_game_by_code(game.code) is game
+    assert game_manager.get_game_by_guid(game.guid) is game
+    assert game.get_player("cookie1").turnorder == 1
+    assert game.get_player("missing") is None
+
+
+def test_create_game_allocates_unique_codes() -> None:
+    game_manager = GameManager()
+    random.seed(0)
+    first = game_manager.create_game(CorellianGambit, "cookie1")
+    # Replay the same random sequence so the second game draws a duplicate code
+    random.seed(0)
+
+    second = game_manager.create_game(CorellianGambit, "cookie2")
+
+    assert first.code != second.code
+    assert game_manager.get_game_by_code(first.code) is first
+    assert game_manager.get_game_by_code(second.code) is second
+
+
+def test_finish_game_removes_from_active_index() -> None:
+    game_manager = GameManager()
+    game = game_manager.create_game(CorellianGambit, "cookie1")
+    game.is_active = False
+
+    game_manager.finish_game(game)
+
+    assert game_manager.get_game_by_code(game.code) is None
+    assert list(game_manager.get_active_games()) == []
+    assert game_manager.get_game_by_guid(game.guid) is None
+    assert game_manager.pending_archive == [game]
+
+
+def test_sweep_archives_finished_and_idle_games(tmp_path) -> None:
+    archive = GameArchive(str(tmp_path / "test.db"))
+    game_manager = GameManager(archive=archive, idle_ttl=60)
+    finished = game_manager.create_game(CorellianGambit, "cookie1")
+    idle = game_manager.create_game(CorellianGambit, "cookie2")
+    live = game_manager.create_game(CorellianGambit, "cookie3")
+    finished.is_active = False
+    game_manager.finish_game(finished)
+    idle.last_active -= 120
+
+    game_manager.sweep()
+
+    assert game_manager.get_games() == [live]
+    assert game_manager.get_game_by_code(idle.code) is None
+    assert archive.count() == 2
+    assert archive.load_state(finished.guid)["players"][0]["cookie"] == "cookie1"
+
+
+def test_idle_game_is_not_recovered_after_eviction(tmp_path) -> None:
+    db_path = str(tmp_path / "test.db")
+    game_manager = GameManager(archive=GameArchive(db_path), journal=ActionJournal(db_path), idle_ttl=60)
+
+    async def run():
+        game = game_manager.create_game(CorellianGambit, "cookie1")
+        await game_manager.record(game, "create", {"type": "CorellianGambit", "code": game.code,
+                                                   "seed": game.seed, "cookie": "cookie1"})
+        game.last_active -= 120
+        game_manager.sweep()
+        # the eviction queued a forget, wait for the writer to commit it
+        for _ in range(100):
+            if game_manager.journal.committed_batches >= 2:
+                break
+            await asyncio.sleep(0.01)
+    asyncio.run(run())
+
+    assert game_manager.get_games() == []
+    assert game_manager.archive.count() == 1
+    assert GameManager(journal=ActionJournal(db_path)).recover({"CorellianGambit": CorellianGambit}) == []
+
+
+def test_sweep_keeps_game_another_worker_used(tmp_path) -> None:
+    db_path = str(tmp_path / "test.db")
+    worker_a = GameManager(store=SqliteGameStore(db_path), idle_ttl=60)
+    worker_b = GameManager(store=SqliteGameStore(db_path), idle_ttl=60)
+    stale = worker_a.create_game(CorellianGambit, "cookie1")
+    stale.last_active -= 100
+
+    async def touch():
+        return await worker_b.update_game(stale.code, lambda g: g.touch())
+    asyncio.run(touch())
+
+    assert worker_a.evict_idle_games() == []
+    assert worker_b.get_game_by_code(stale.code) is not None
+    assert worker_a.games_by_code[stale.code] is not stale
+    # once it really is idle everywhere it goes
+    assert [g.code for g in worker_a.evict_idle_games(time.monotonic() + 100)] == [stale.code]
+    assert worker_b.get_game_by_code(stale.code) is None
+
+
+def test_expire_lobby_only_drops_unstarted_quiet_games() -> None:
+    game_manager = GameManager()
+    quiet = game_manager.create_game(CorellianGambit, "cookie1")
+    busy = game_manager.create_game(CorellianGambit, "cookie2")
+    started = game_manager.create_game(CorellianGambit, "cookie3")
+    started.start()
+    now = quiet.last_active + 100
+    busy.last_active = now - 40
+
+    assert asyncio.run(game_manager.expire_lobby(quiet.code, ttl=60, now=now)) is None
+    assert asyncio.run(game_manager.expire_lobby(busy.code, ttl=60, now=now)) == 20
+    assert asyncio.run(game_manager.expire_lobby(started.code, ttl=60, now=now)) is None
+
+    assert game_manager.get_game_by_code(quiet.code) is None
+    assert game_manager.pending_archive == [quiet]
+    assert game_manager.get_metrics()["expired_lobbies"] == 1
+
+
+def test_working_set_stays_flat_across_game_churn(tmp_path) -> None:
+    game_manager = GameManager(archive=GameArchive(str(tmp_path / "test.db")))
+    for _ in range(20):
+        for i in range(50):
+            game = game_manager.create_game(CorellianGambit, f"cookie{i}")
+            game.is_active = False
+            game_manager.finish_game(game)
+        game_manager.sweep()
+
+        metrics = game_manager.get_metrics()
+        assert metrics["games_in_memory"] == 0
+        assert metrics["pending_archive"] == 0
+    assert game_manager.get_metrics()["archived_games"] == 1000
+
+
+def test_sqlite_store_rejects_stale_save(tmp_path) -> None:
+    store = SqliteGameStore(str(tmp_path / "test.db"))
+    game_manager = GameManager(store=store)
+    game = game_manager.create_game(CorellianGambit, "cookie1")
+    first = store.load(game.code)
+    second = store.load(game.code)
+
+    first.hand_pot = 10
+    assert store.save(first)
+    second.hand_pot = 20
+    assert not store.save(second)
+
+    assert store.load(game.code).hand_pot == 10
+
+
+def test_sqlite_store_is_used_off_the_event_loop(tmp_path, mocker) -> None:
+    store = SqliteGameStore(str(tmp_path / "test.db"))
+    game_manager = GameManager(store=store)
+    threads = {}
+    for name in ("add", "load", "save", "delete"):
+        call = getattr(store, name)
+        mocker.patch.object(store, name, side_effect=lambda *a, name=name, call=call:
+                            threads.setdefault(name, []).append(threading.get_ident()) or call(*a))
+
+    async def play():
+        game = await game_manager.open_game(CorellianGambit, "cookie1")
+
+        def mutate(g):
+            g.hand_pot = 10
+        updated, _ = await game_manager.update_game(game.code, mutate)
+        assert (await game_manager.load_game(game.code)).hand_pot == 10
+        updated.is_active = False
+        game_manager.finish_game(updated)
+        # the delete is not awaited, give the executor a moment
+        for _ in range(100):
+            if "delete" in threads:
+                break
+            await asyncio.sleep(0.01)
+        return game.code
+    code = asyncio.run(play())
+
+    assert sorted(threads) == ["add", "delete", "load", "save"]
+    assert threading.get_ident() not in sum(threads.values(), [])
+    assert store.load(code) is None
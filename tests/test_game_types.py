@@ -1,9 +1,11 @@
 import pytest
 from pytest_mock import MockerFixture
+import pickle
 import random
 from models.game_types import GameBase, CorellianGambit
 from models.player import Player
 from models.card import Card
+from models.actions import Actions
 
 
 def test_correlian_gambit_ctor() -> None:
@@ -19,6 +21,20 @@ def test_correlian_gambit_ctor() -> None:
     assert len(card_ids) == len(set(card_ids))
 
 
+def test_cards_shared_between_games() -> None:
+    game1, game2 = CorellianGambit(), CorellianGambit()
+    game1.add_player(Player("p1", 1, username="p1"))
+    game1.deal()
+
+    assert set(map(id, game1.deck)) < set(map(id, game2.deck))
+    hand = game1.get_player("p1").hand
+    assert [c.to_dict() for c in hand] == [{"id": c.id, "suite": c.suite, "rank": c.rank} for c in hand]
+    # a loaded copy points back at the same card table
+    loaded = pickle.loads(pickle.dumps(game1))
+    assert all(a is b for a, b in zip(loaded.get_player("p1").hand, hand))
+    assert list(loaded.deck) == list(game1.deck)
+
+
 pairwise_tests = [
     (Player("p1", 1, username="p1", hand=[Card(1, "test", -1), Card(2, "test", 1)]), Player("p2", 1, username="p2", hand=[Card(1, "test", 3), Card(2, "test", 4)]), "p1"),
     (Player("p1", 1, username="p1", hand=[Card(1, "test", 3), Card(2, "test", 4)]), Player("p2", 1, username="p2", hand=[Card(1, "test", -1), Card(2, "test", 1)]), "p2"),
@@ -37,4 +53,46 @@ def test_correlian_gambit_calculate_scores_pairwise(player1, player2, winner_use
 
 
 def test_correlian_gambit_process_action(mocker: MockerFixture) -> None:
-    pass
+    game = CorellianGambit(seed=1)
+    p1 = game.add_player(Player("p1", 1, username="p1"))
+    p2 = game.add_player(Player("p2", 2, username="p2"))
+    game.start()
+    game.deal()
+    top = game.deck[0]
+
+    game.process_action("p2", Actions.DRAW_DECK.value, None)
+    assert len(p2.hand) == 2 and game.turn == 1
+    game.process_action("p1", Actions.DRAW_DECK.value, None)
+    assert p1.hand[-1] is top and game.turn == 2
+    # card ids start at 0, discarding card 0 must work too
+    p2.hand[0] = game.deck_template[0]
+    game.process_action("p2", Actions.DISCARD.value, 0)
+    assert game.discard[0] is game.deck_template[0]
+    assert game.round == 2 and game.turn == 1
+    for _ in range(2):
+        game.process_action("p1", Actions.PASS.value, None)
+        game.process_action("p2", Actions.PASS.value, None)
+    assert not game.is_active
+    assert game.winner is game.calculate_scores()
+    # paid two antes, won the hand pot holding one ante from each player
+    assert game.winner.credits == 100
+    assert game.hand_pot == 0
+
+
+def test_empty_deck_is_refilled_from_discard_pile() -> None:
+    game = CorellianGambit(seed=1)
+    p1 = game.add_player(Player("dummy1", 1))
+    game.add_player(Player("dummy2", 2))
+    game.discard = list(game.deck)
+    game.deck.clear()
+    top = game.discard[-1]
+
+    game.process_action("dummy1", Actions.DRAW_DECK, None)
+
+    assert len(p1.hand) == 1
+    assert game.discard == [top]
+    assert len(game.deck) == len(game.deck_template) - 2
+
+    game.deck.clear()
+    game.process_action("dummy2", Actions.DRAW_DECK, None)
+    assert game.turn == 1
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from pytest_mock import MockerFixture
+import sabaac
+from models.actions import Actions
+from models.game_manager import GameManager
+from models.game_types import CorellianGambit
+from models.journal import ActionJournal
+from models.pubsub import LocalPubSub
+
+
+def game_fingerprint(game: CorellianGambit) -> tuple:
+    return ([c.id for c in game.deck],
+            [c.id for c in game.discard],
+            [(p.cookie, p.username, p.turnorder, p.credits, [c.id for c in p.hand]) for p in game.get_players()],
+            game.round, game.turn, game.ante_amount, game.sabaac_pot, game.hand_pot, game.is_active)
+
+
+@pytest.mark.parametrize("snapshot_interval", [1000, 3])
+def test_recover_replays_snapshot_and_journal(tmp_path, mocker: MockerFixture, snapshot_interval) -> None:
+    db_path = str(tmp_path / "test.db")
+    mocker.patch("sabaac.game_manager", GameManager(journal=ActionJournal(db_path, snapshot_interval)))
+    mocker.patch("sabaac.pubsub", LocalPubSub())
+
+    async def play():
+        game = sabaac.game_manager.create_game(CorellianGambit, "c1")
+        game.ante_amount = 5
+        await sabaac.game_manager.record(game, "create", {"type": "CorellianGambit", "code": game.code,
+                                                          "seed": game.seed, "cookie": "c1", "ante": 5})
+        game, player = await sabaac.game_manager.update_game(
+            game.code, lambda g: g.add_player(sabaac.Player(cookie="c2", turnorder=2)))
+        await sabaac.game_manager.record(game, "join", {"cookie": "c2", "turnorder": 2})
+        await sabaac.handle_lobby_update(game.code, "c2", "guest", False)
+        await sabaac.handle_lobby_update(game.code, "c1", "host", True)
+        game, _ = await sabaac.game_manager.update_game(game.code, lambda g: g.deal())
+        await sabaac.game_manager.record(game, "deal", {})
+        for i in range(4):
+            cookie = "c1" if i % 2 == 0 else "c2"
+            await sabaac.handle_game_action(game.code, cookie, Actions.DRAW_DECK, None)
+        return game
+
+    game = asyncio.run(play())
+    recovered = GameManager(journal=ActionJournal(db_path, snapshot_interval)).recover({"CorellianGambit": CorellianGambit})
+
+    assert len(recovered) == 1
+    assert recovered[0].code == game.code
+    assert game_fingerprint(recovered[0]) == game_fingerprint(game)
+
+
+def test_concurrent_appends_share_commits(tmp_path) -> None:
+    journal = ActionJournal(str(tmp_path / "test.db"))
+    games = [CorellianGambit() for _ in range(50)]
+
+    async def run():
+        await asyncio.gather(*[journal.append(g, "deal", {}) for g in games])
+
+    asyncio.run(run())
+
+    assert journal.committed_entries == 50
+    assert journal.committed_batches < 50
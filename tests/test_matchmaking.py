@@ -0,0 +1,150 @@
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from models.matchmaking import LobbyKey, Matchmaker, OpenLobbyIndex
+from models.timing_wheel import TimingWheel
+
+
+KEY = LobbyKey("CorellianGambit", 2)
+
+
+class FakeLobbies:
+    def __init__(self):
+        self.players: Dict[str, List[str]] = {}
+        self.closed: set = set()
+
+    async def create(self, key: LobbyKey, cookie: str) -> Tuple[str, None]:
+        code = f"{key.ante}-{len(self.players)}"
+        self.players[code] = [cookie]
+        return code, None
+
+    async def seat(self, code: str, cookie: str) -> Tuple[Optional[int], None]:
+        if code in self.closed:
+            return None, None
+        self.players[code].append(cookie)
+        return 4 - len(self.players[code]), None
+
+
+def test_index_prefers_fullest_lobby_and_drops_full_ones() -> None:
+    index = OpenLobbyIndex(seats=4)
+    index.update("emptier", KEY, 3)
+    index.update("fuller", KEY, 1)
+    index.update("other ante", LobbyKey("CorellianGambit", 5), 1)
+
+    assert index.best(KEY) == "fuller"
+    index.update("fuller", KEY, 0)
+    assert "fuller" not in index
+    assert index.best(KEY) == "emptier"
+    index.remove("emptier")
+    assert index.best(KEY) is None
+    assert index.best(LobbyKey("CorellianGambit", 10)) is None
+
+
+def test_match_fills_lobbies_per_key() -> None:
+    lobbies = FakeLobbies()
+
+    async def run():
+        matchmaker = Matchmaker(lobbies.create, lobbies.seat, seats=4)
+        futures = [matchmaker.enqueue(f"c{i}", KEY) for i in range(6)]
+        futures.append(matchmaker.enqueue("high roller", LobbyKey("CorellianGambit", 5)))
+        # queueing twice keeps the player's place
+        assert matchmaker.enqueue("c0", KEY) is futures[0]
+        assert await matchmaker.match() == 7
+        return [f.result() for f in futures], matchmaker
+    codes, matchmaker = asyncio.run(run())
+
+    assert codes == ["2-0"] * 4 + ["2-1"] * 2 + ["5-2"]
+    assert lobbies.players["2-0"] == ["c0", "c1", "c2", "c3"]
+    assert matchmaker.lobbies_opened == 3
+    assert matchmaker.index.best(KEY) == "2-1"
+
+
+def test_closed_lobby_is_skipped() -> None:
+    lobbies = FakeLobbies()
+
+    async def run():
+        matchmaker = Matchmaker(lobbies.create, lobbies.seat, seats=4)
+        first = matchmaker.enqueue("c0", KEY)
+        await matchmaker.match()
+        # the lobby started before anyone else was matched
+        lobbies.closed.add(first.result())
+        second = matchmaker.enqueue("c1", KEY)
+        await matchmaker.match()
+        return first.result(), second.result()
+    first, second = asyncio.run(run())
+
+    assert first != second
+    assert lobbies.players[second] == ["c1"]
+
+
+def test_batches_run_on_scheduler_ticks() -> None:
+    lobbies = FakeLobbies()
+    clock = [0.0]
+    scheduler = TimingWheel(tick=0.1, slots=8, clock=lambda: clock[0])
+
+    async def run():
+        matchmaker = Matchmaker(lobbies.create, lobbies.seat, seats=4, scheduler=scheduler, tick=0.1)
+        future = matchmaker.enqueue("c0", KEY)
+        assert len(scheduler) == 1
+        matchmaker.enqueue("c1", KEY)
+        assert len(scheduler) == 1
+        clock[0] = 0.2
+        scheduler.advance()
+        await asyncio.gather(*scheduler.running)
+        return future.result(), matchmaker
+    code, matchmaker = asyncio.run(run())
+
+    assert lobbies.players[code] == ["c0", "c1"]
+    assert len(matchmaker) == 0 and matchmaker.timer is None
+    assert len(scheduler) == 0
+
+
+def test_cancel_drops_player_from_batch_being_matched() -> None:
+    lobbies = FakeLobbies()
+
+    async def run():
+        matchmaker = Matchmaker(None, lobbies.seat, seats=4)
+
+        async def create(key: LobbyKey, cookie: str) -> Tuple[str, None]:
+            # c1 gives up while the batch is opening c0's lobby
+            matchmaker.cancel("c1", key)
+            return await lobbies.create(key, cookie)
+        matchmaker.create_lobby = create
+        futures = [matchmaker.enqueue(f"c{i}", KEY) for i in range(3)]
+        assert await matchmaker.match() == 2
+        return futures, matchmaker
+    futures, matchmaker = asyncio.run(run())
+
+    assert futures[1].cancelled()
+    assert futures[0].result() == futures[2].result()
+    assert lobbies.players[futures[0].result()] == ["c0", "c2"]
+    assert matchmaker.in_flight == {}
+
+
+def test_batch_commits_are_awaited_together() -> None:
+    lobbies = FakeLobbies()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        commits = []
+
+        async def seat(code: str, cookie: str) -> Tuple[Optional[int], asyncio.Future]:
+            free, _ = await lobbies.seat(code, cookie)
+            commits.append(loop.create_future())
+            return free, commits[-1]
+        matchmaker = Matchmaker(lobbies.create, seat, seats=4)
+        futures = [matchmaker.enqueue(f"c{i}", KEY) for i in range(4)]
+        batch = asyncio.ensure_future(matchmaker.match())
+        for _ in range(10):
+            await asyncio.sleep(0)
+        # everyone is seated while no commit has finished yet
+        assert len(commits) == 3 and lobbies.players["2-0"] == ["c0", "c1", "c2", "c3"]
+        assert not any(f.done() for f in futures)
+        commits[0].set_result(None)
+        commits[1].set_exception(OSError("disk full"))
+        commits[2].set_result(None)
+        assert await batch == 3
+        return futures
+    futures = asyncio.run(run())
+
+    assert futures[0].result() == futures[1].result() == futures[3].result() == "2-0"
+    assert isinstance(futures[2].exception(), OSError)
@@ -0,0 +1,88 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+import sabaac
+from models.actions import Actions
+from models.game_manager import GameManager
+from models.game_types import CorellianGambit
+from models.messages import (ActionMessage, InvalidMessage, LobbyMessage, ResyncMessage, parse_game_message,
+                             parse_lobby_message)
+from models.player import Player
+from models.rate_limit import TokenBucket
+
+
+def test_parse_game_message() -> None:
+    fast = parse_game_message('{"code": "abc", "action": 4, "actionValue": 0}')
+    coerced = parse_game_message('{"code": "abc", "action": "4", "actionValue": "12"}')
+    resync = parse_game_message('{"code": "abc", "resync": 3}')
+
+    assert isinstance(fast, ActionMessage) and fast.action is Actions.DISCARD and fast.actionValue == 0
+    assert coerced.action is Actions.DISCARD and coerced.actionValue == 12
+    assert isinstance(resync, ResyncMessage) and resync.resync == 3
+
+
+@pytest.mark.parametrize("text", [
+    "not json",
+    "[1, 2]",
+    '{"action": 1}',
+    '{"code": "abc", "action": 9, "actionValue": null}',
+    '{"code": "abc", "action": 4, "actionValue": "one"}',
+    '{"code": "abc", "resync": "soon"}',
+    json.dumps({"code": "abc", "action": 1, "padding": "x" * 5000}),
+])
+def test_parse_game_message_rejects(text: str) -> None:
+    with pytest.raises(InvalidMessage):
+        parse_game_message(text)
+
+
+def test_parse_lobby_message() -> None:
+    update = parse_lobby_message('{"code": "abc", "username": "han", "startgame": false}')
+
+    assert isinstance(update, LobbyMessage) and update.username == "han" and not update.startgame
+    with pytest.raises(InvalidMessage):
+        parse_lobby_message(json.dumps({"code": "abc", "username": "x" * 100, "startgame": False}))
+
+
+def test_token_bucket() -> None:
+    bucket = TokenBucket(rate=2, burst=3)
+    now = bucket.updated
+
+    assert [bucket.allow(now) for _ in range(4)] == [True, True, True, False]
+    assert bucket.allow(now + 0.5)
+    assert not bucket.allow(now + 0.5)
+
+
+def test_invalid_messages_keep_socket_open(mocker: MockerFixture) -> None:
+    game = CorellianGambit()
+    game.add_player(Player("p1", 1, username="p1"))
+    mocker.patch("sabaac.game_manager", GameManager())
+    sabaac.game_manager.add_game(game)
+    client = TestClient(sabaac.app)
+    client.cookies.set("games_anon_cookie", "p1")
+
+    with client.websocket_connect("/sabaacws") as websocket:
+        websocket.send_text("not json")
+        assert json.loads(websocket.receive_text()) == {"type": "error", "error": "not JSON"}
+        websocket.send_text(json.dumps({"code": "missing", "resync": 0}))
+        assert json.loads(websocket.receive_text())["type"] == "error"
+        websocket.send_text(json.dumps({"code": game.code, "resync": 0}))
+        assert json.loads(websocket.receive_text())["type"] == "snapshot"
+
+
+def test_rate_limited_messages_are_dropped(mocker: MockerFixture) -> None:
+    game = CorellianGambit()
+    game.add_player(Player("p1", 1, username="p1"))
+    mocker.patch("sabaac.game_manager", GameManager())
+    mocker.patch("sabaac.MESSAGE_BURST", 2)
+    sabaac.game_manager.add_game(game)
+    client = TestClient(sabaac.app)
+    client.cookies.set("games_anon_cookie", "p1")
+
+    with client.websocket_connect("/sabaacws") as websocket:
+        for _ in range(3):
+            websocket.send_text(json.dumps({"code": game.code, "resync": 0}))
+        replies = [json.loads(websocket.receive_text()) for _ in range(3)]
+
+    assert [r["type"] for r in replies] == ["snapshot", "snapshot", "error"]
+    assert replies[2]["error"] == "too many messages"
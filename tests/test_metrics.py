@@ -0,0 +1,67 @@
+import io
+import logging
+import pytest
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+import sabaac
+from models.game_manager import GameManager
+from models.game_types import CorellianGambit
+from models.logs import configure_logging, parse_levels, stop_logging
+from models.metrics import Counter, Gauge, Histogram, Metric, MetricsRegistry
+
+
+def test_histogram_and_counter_render() -> None:
+    registry = MetricsRegistry()
+    latency = registry.add(Histogram("latency_seconds", "Latency", ["kind"], buckets=(0.1, 1.0)))
+    received = registry.add(Counter("received_total", "Received", ["endpoint"]))
+    registry.add(Gauge("games", "Games", lambda: 3))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        latency.observe(value, kind="action")
+    received.inc(endpoint="game")
+    received.inc(2, endpoint="game")
+
+    text = registry.render()
+
+    assert 'latency_seconds_bucket{kind="action",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{kind="action",le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{kind="action",le="+Inf"} 4' in text
+    assert 'latency_seconds_count{kind="action"} 4' in text
+    assert 'received_total{endpoint="game"} 3' in text
+    assert "# TYPE games gauge\ngames 3" in text
+
+
+def test_metric_without_samples_cannot_be_created() -> None:
+    class Incomplete(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("sabaac_incomplete", "Never rendered")
+
+
+def test_metrics_endpoint(mocker: MockerFixture) -> None:
+    mocker.patch("sabaac.game_manager", GameManager())
+    sabaac.game_manager.add_game(CorellianGambit())
+    client = TestClient(sabaac.app)
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "sabaac_active_games 1" in response.text
+    assert "# TYPE sabaac_action_latency_seconds histogram" in response.text
+
+
+def test_structured_logging_through_queue() -> None:
+    stream = io.StringIO()
+    logger = logging.getLogger("tests.structured")
+    configure_logging(level="INFO", levels=parse_levels("tests.structured.quiet=ERROR"), stream=stream,
+                                 logger=logger)
+
+    logger.info("Player %s acted", "p1", extra={"game": "abc123", "round": 2})
+    logger.debug("not logged")
+    logging.getLogger("tests.structured.quiet").warning("not logged either")
+    stop_logging(logger)
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith("tests.structured: Player p1 acted game=abc123 round=2")
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import pytest
+import requests
+websockets = pytest.importorskip("websockets")
+
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def server(tmp_path):
+    port = free_port()
+    env = dict(os.environ, SABAAC_BACKEND="sqlite", SABAAC_DB=str(tmp_path / "test.db"))
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "sabaac:app", "--workers", "2",
+                                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                               cwd=repo_root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    address = f"127.0.0.1:{port}"
+    deadline = time.time() + 20
+    while True:
+        try:
+            requests.get(f"http://{address}/login/", timeout=1)
+            break
+        except requests.ConnectionError:
+            if time.time() > deadline or process.poll() is not None:
+                process.kill()
+                pytest.fail("uvicorn did not start")
+            time.sleep(0.1)
+    yield address
+    process.terminate()
+    process.wait(timeout=10)
+
+
+def connect(address: str, cookie: str):
+    headers = {"Cookie": f"games_anon_cookie={cookie}"}
+    if int(websockets.__version__.split(".")[0]) >= 14:
+        return websockets.connect(f"ws://{address}/sabaacws", additional_headers=headers)
+    return websockets.connect(f"ws://{address}/sabaacws", extra_headers=headers)
+
+
+def test_players_on_different_workers_share_one_game(server) -> None:
+    # A player keeps one socket per game, so enough players that they are spread over both workers
+    cookies = [f"c{i}" for i in range(1, 7)]
+    sessions = {}
+    for cookie in cookies:
+        sessions[cookie] = requests.Session()
+        sessions[cookie].cookies.set("games_anon_cookie", cookie)
+    response = sessions["c1"].get(f"http://{server}/createGame/", allow_redirects=False)
+    code = response.headers["location"].split("/")[-1]
+    for cookie in cookies[1:]:
+        sessions[cookie].post(f"http://{server}/joinGame/", data={"gameCode": code}, allow_redirects=False)
+    sessions["c1"].get(f"http://{server}/sabaac/{code}")
+    num_actions = 6
+
+    async def run():
+        sockets = {cookie: await connect(server, cookie) for cookie in cookies}
+        all_sockets = list(sockets.values())
+        for websocket in all_sockets:
+            await websocket.send(json.dumps({"code": code, "resync": 0}))
+            snapshot = json.loads(await asyncio.wait_for(websocket.recv(), 5))
+            assert snapshot["type"] == "snapshot"
+            assert len(snapshot["private"]["playerhand"]) == 2
+        received = {id(websocket): [] for websocket in all_sockets}
+        for i in range(num_actions):
+            # turn order follows join order
+            await sockets[cookies[i % len(cookies)]].send(json.dumps({"code": code, "action": 3, "actionValue": None}))
+            for websocket in all_sockets:
+                delta = json.loads(await asyncio.wait_for(websocket.recv(), 5))
+                received[id(websocket)].append(delta["seq"])
+        for websocket in all_sockets:
+            await websocket.close()
+        return received
+
+    received = asyncio.run(run())
+
+    for seqs in received.values():
+        assert seqs == list(range(1, num_actions + 1))
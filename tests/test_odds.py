@@ -0,0 +1,82 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+import sabaac
+from models.actions import Actions
+from models.card import Card
+from models.game_manager import GameManager
+from models.game_types import CorellianGambit
+from models.odds import OddsQuery, OddsService, simulate
+from models.player import Player
+
+
+def make_game(hand: list, opponents: int = 1) -> CorellianGambit:
+    game = CorellianGambit()
+    game.add_player(Player("p1", 1, username="p1"))
+    for i in range(opponents):
+        game.add_player(Player(f"p{i + 2}", i + 2, username=f"p{i + 2}"))
+    game.deal()
+    player = game.get_player("p1")
+    game.deck.extend(player.hand)
+    player.hand = hand
+    return game
+
+
+def test_query_is_canonical() -> None:
+    game1 = make_game([Card(0, "circle", 3), Card(1, "square", -2)])
+    game2 = make_game([Card(2, "triangle", -2), Card(3, "circle", 3)])
+
+    assert OddsQuery.from_game(game1, "p1") == OddsQuery.from_game(game2, "p1")
+    assert OddsQuery.from_game(game1, "unknown") is None
+
+
+def test_simulate_certain_outcomes() -> None:
+    query = OddsQuery(hand=(-10, 0, 10), top_discard=None, unseen=(1, 2, 3, 4, 5, 6),
+                      opponent_hand_sizes=(2,), rolls_left=0)
+
+    wins = dict(zip(query.actions(), simulate(query, 500, 0)))
+
+    assert wins[(Actions.PASS, None)] == 500
+    # without the sylop the hand still sums to 0, which beats any two of 1-6
+    assert wins[(Actions.DISCARD, 0)] == 500
+    assert 0 < wins[(Actions.DISCARD, 10)] < 500
+    assert simulate(query._replace(opponent_hand_sizes=()), 10, 0) == [10.0] * len(query.actions())
+
+
+def test_service_caches_and_shares_simulations() -> None:
+    service = OddsService(workers=2, chunk_size=200, max_rollouts=400, executor=ThreadPoolExecutor(2))
+    query = OddsQuery.from_game(make_game([Card(0, "circle", 3), Card(1, "square", -2)], opponents=3), "p1")
+
+    async def run():
+        first, second = await asyncio.gather(service.estimate(query), service.estimate(query))
+        third = await service.estimate(query)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    service.shutdown()
+
+    assert first is second is third
+    assert service.simulations == 1 and service.cache_hits == 1
+    assert first["rollouts"] == 400
+    assert all(0 <= win <= 1 for _, _, win in first["odds"])
+
+
+def test_odds_endpoint(mocker: MockerFixture) -> None:
+    game = make_game([Card(0, "circle", 3), Card(1, "square", 3)])
+    mocker.patch("sabaac.game_manager", GameManager())
+    mocker.patch("sabaac.odds_service", OddsService(workers=1, chunk_size=100, max_rollouts=100,
+                                                    executor=ThreadPoolExecutor(1)))
+    sabaac.game_manager.add_game(game)
+    client = TestClient(sabaac.app)
+
+    response = client.get(f"/odds/{game.code}", cookies={"games_anon_cookie": "p1"})
+    missing = client.get(f"/odds/{game.code}", cookies={"games_anon_cookie": "unknown"})
+
+    assert response.status_code == 200 and missing.status_code == 404
+    odds = response.json()["odds"]
+    # one entry per card that can be discarded, both 3s share an estimate
+    discards = [o for o in odds if o["name"] == "DISCARD"]
+    assert sorted(o["actionValue"] for o in discards) == [0, 1]
+    assert discards[0]["win"] == discards[1]["win"]
+    assert {o["name"] for o in odds} == {"PASS", "DRAW_DECK", "DISCARD"}
@@ -0,0 +1,36 @@
+import asyncio
+import threading
+from models.pubsub import SqlitePubSub
+
+
+def test_sqlite_messages_reach_other_workers_in_order(tmp_path) -> None:
+    db_path = str(tmp_path / "test.db")
+    publisher, subscriber = SqlitePubSub(db_path), SqlitePubSub(db_path, poll_interval=0.001)
+    received = []
+
+    async def collect(message: dict) -> None:
+        received.append(message["n"])
+    subscriber.subscribe(collect)
+
+    async def run():
+        await subscriber.start()
+        await asyncio.gather(*[publisher.publish({"n": n}) for n in range(20)])
+        for _ in range(200):
+            if len(received) == 20:
+                break
+            await asyncio.sleep(0.01)
+        subscriber.task.cancel()
+    asyncio.run(run())
+
+    assert received == list(range(20))
+
+
+def test_sqlite_publish_runs_off_the_event_loop(tmp_path, mocker) -> None:
+    pubsub = SqlitePubSub(str(tmp_path / "test.db"))
+    threads = []
+    insert = pubsub.insert
+    mocker.patch.object(pubsub, "insert", side_effect=lambda *a: threads.append(threading.get_ident()) or insert(*a))
+
+    asyncio.run(pubsub.publish({"n": 1}))
+
+    assert len(threads) == 1 and threads[0] != threading.get_ident()
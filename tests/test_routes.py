@@ -1,9 +1,22 @@
+import asyncio
+import json
+import pytest
+from starlette.websockets import WebSocketDisconnect
 from fastapi.testclient import TestClient
 from pytest_mock import MockerFixture
 from fastapi import WebSocket
+import sabaac
 from sabaac import app
 from models.game_types import GameBase, CorellianGambit
 from models.player import Player
+from models.game_manager import GameManager
+from models.game_state import GameState
+from models.actions import Actions
+from models.timing_wheel import TimingWheel
+from models.connection_manager import REPLACED, ConnectionManager
+from models.matchmaking import Matchmaker
+from models.accounts import Accounts
+from models.render_cache import IMMUTABLE, REVALIDATE, RenderCache
 
 
 def test_read_main() -> None:
@@ -27,9 +40,10 @@ def test_read_lobby_valid_code(mocker: MockerFixture) -> None:
     game = CorellianGambit()
     code = "valid"
     game.code = code
-    mocker.patch('sabaac.game_manager.get_games', return_value=[game])
     cookie = "dummy1"
-    mocker.patch.object(GameBase, 'get_players', return_value=[Player(cookie, 1)])
+    game.add_player(Player(cookie, 1))
+    mocker.patch('sabaac.game_manager', GameManager())
+    sabaac.game_manager.add_game(game)
     cookies = { "games_anon_cookie": cookie }
     
     response = client.get(f"/lobby/{code}", cookies=cookies)
@@ -43,8 +57,9 @@ def test_read_lobby_invalid_code(mocker: MockerFixture) -> None:
     valid_code = "valid"
     invalid_code = "invalid"
     game.code = valid_code
-    mocker.patch('sabaac.game_manager.get_games', return_value=[game])
-    mocker.patch.object(GameBase, 'get_players', return_value=[Player("dummy1", 1)])
+    game.add_player(Player("dummy1", 1))
+    mocker.patch('sabaac.game_manager', GameManager())
+    sabaac.game_manager.add_game(game)
     
     response = client.get(f"/lobby/{invalid_code}")
 
@@ -56,9 +71,10 @@ def test_read_lobby_invalid_cookie(mocker: MockerFixture) -> None:
     game = CorellianGambit()
     code = "valid"
     game.code = code
-    mocker.patch('sabaac.game_manager.get_games', return_value=[game])
     cookie = "dummy1"
-    mocker.patch.object(GameBase, 'get_players', return_value=[Player(cookie, 1)])
+    game.add_player(Player(cookie, 1))
+    mocker.patch('sabaac.game_manager', GameManager())
+    sabaac.game_manager.add_game(game)
     invalid_cookie = "invalid"
     cookies = {"games_anon_cookie": invalid_cookie}
     
@@ -70,16 +86,269 @@ def test_read_lobby_invalid_cookie(mocker: MockerFixture) -> None:
 def test_read_sabaac(mocker: MockerFixture) -> None:
     retval = CorellianGambit()
     retval.code = "abc"
-    mocker.patch('sabaac.game_manager.get_game_by_code', return_value=retval)
+    mocker.patch('sabaac.game_manager', GameManager())
+    sabaac.game_manager.add_game(retval)
     mocker.patch.object(GameBase, 'get_current_player', return_value=Player("dummy1", 1))
     mocker.patch.object(GameBase, 'get_first_player', return_value=Player("dummy1", 1))
     client = TestClient(app)
 
-    response = client.get("/sabaac/{game_code}")
+    response = client.get(f"/sabaac/{retval.code}")
 
     assert response.status_code == 200
 
 
+def test_login_page_rendered_once(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.render_cache', RenderCache(sabaac.templates))
+    client = TestClient(app)
+
+    first = client.get("/login/")
+    second = client.get("/login/")
+
+    assert first.content == second.content
+    assert (sabaac.render_cache.misses, sabaac.render_cache.hits) == (1, 1)
+    assert "games_anon_cookie" in second.cookies
+
+
+def test_sabaac_page_follows_game_version(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    mocker.patch('sabaac.render_cache', RenderCache(sabaac.templates))
+    game = CorellianGambit(seed=1)
+    game.code = "abc"
+    game.add_player(Player("dummy1", 1, username="first"))
+    game.add_player(Player("dummy2", 2, username="second"))
+    sabaac.game_manager.add_game(game)
+    game.start()
+    client = TestClient(app)
+
+    before = client.get("/sabaac/abc").text
+    assert client.get("/sabaac/abc").text == before
+    game.process_action("dummy1", Actions.PASS, None)
+    sabaac.game_manager.get_state_stream(game).publish(GameState(game))
+    after = client.get("/sabaac/abc").text
+
+    assert sabaac.render_cache.hits == 1
+    assert "<span id=\"usernameDiv\">first</span>" in before
+    assert "<span id=\"usernameDiv\">second</span>" in after
+
+
+def test_sabaac_page_shows_the_requesting_player(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    mocker.patch('sabaac.render_cache', RenderCache(sabaac.templates))
+    game = CorellianGambit(seed=1)
+    game.code = "abc"
+    game.add_player(Player("dummy1", 1, username="first"))
+    game.add_player(Player("dummy2", 2, username="second"))
+    sabaac.game_manager.add_game(game)
+    game.start()
+    client = TestClient(app)
+
+    first = client.get("/sabaac/abc", cookies={"games_anon_cookie": "dummy1"}).text
+    second = client.get("/sabaac/abc", cookies={"games_anon_cookie": "dummy2"}).text
+
+    # it is the first player's turn for both of them
+    assert "<span id=\"usernameDiv\">first</span>" in first
+    assert "<span id=\"usernameDiv\">second</span>" in second
+    assert "<span id=\"currentPlayer\">first</span>" in second
+    assert "<summary>CorellianGambit</summary>" in first
+
+
+def test_watch_page_follows_reused_code(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    mocker.patch('sabaac.render_cache', RenderCache(sabaac.templates))
+    client = TestClient(app)
+    pages = []
+    for username in ("old", "new"):
+        game = CorellianGambit(seed=1)
+        game.code = "abc"
+        game.add_player(Player(username, 1, username=username))
+        sabaac.game_manager.add_game(game)
+        pages.append(client.get("/watch/abc").text)
+        game.is_active = False
+        sabaac.game_manager.finish_game(game)
+
+    assert "<span id=\"currentPlayer\">old</span>" in pages[0]
+    assert "<span id=\"currentPlayer\">new</span>" in pages[1]
+
+
+def test_static_urls_are_content_hashed() -> None:
+    client = TestClient(app)
+    url = sabaac.static_assets.url("js/sabaac.js")
+
+    versioned = client.get(url)
+    stale = client.get("/static/js/sabaac.js?v=0")
+    revalidated = client.get("/static/js/sabaac.js", headers={"If-None-Match": versioned.headers["etag"]})
+
+    assert url.startswith("/static/js/sabaac.js?v=")
+    assert versioned.headers["cache-control"] == IMMUTABLE
+    assert stale.headers["cache-control"] == REVALIDATE
+    assert revalidated.status_code == 304
+    assert f'src="{url}"' in sabaac.templates.get_template("sabaac.html").render(hand=[])
+
+
+def test_favicon_cached() -> None:
+    client = TestClient(app)
+
+    response = client.get("/favicon.ico")
+
+    assert response.status_code == 200
+    assert "content-disposition" not in response.headers
+    assert response.headers["cache-control"].startswith("public, max-age=")
+
+
+def test_turn_timeout_passes_for_current_player(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    mocker.patch('sabaac.turn_timers', {})
+    clock = [0.0]
+    mocker.patch('sabaac.scheduler', TimingWheel(tick=1.0, slots=8, clock=lambda: clock[0]))
+    game = CorellianGambit(seed=1)
+    game.add_player(Player("dummy1", 1))
+    game.add_player(Player("dummy2", 2))
+    sabaac.game_manager.add_game(game)
+    game.start()
+    game.deal()
+
+    async def run():
+        sabaac.schedule_turn_timeout(game)
+        # acting in time re-arms the timer for the next player
+        await sabaac.handle_game_action(game.code, "dummy1", Actions.PASS, None)
+        clock[0] = sabaac.TURN_TIMEOUT_SECONDS - 1
+        sabaac.scheduler.advance()
+        assert game.turn == 2
+        clock[0] = 2 * sabaac.TURN_TIMEOUT_SECONDS
+        sabaac.scheduler.advance()
+        await asyncio.gather(*sabaac.scheduler.running)
+    asyncio.run(run())
+
+    assert (game.round, game.turn) == (2, 1)
+    assert sabaac.turn_timers[game.code][0] == (2, 1)
+
+
+def test_reconnect_resumes_from_last_seq_and_closes_stale_socket(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    mocker.patch('sabaac.connection_manager', ConnectionManager())
+    game = CorellianGambit(seed=1)
+    game.add_player(Player("dummy1", 1))
+    game.add_player(Player("dummy2", 2))
+    sabaac.game_manager.add_game(game)
+    game.start()
+    game.deal()
+    client = TestClient(app)
+    client.cookies.set("games_anon_cookie", "dummy1")
+
+    with client.websocket_connect("/sabaacws") as stale:
+        stale.send_text(json.dumps({"code": game.code, "resync": 0}))
+        snapshot = json.loads(stale.receive_text())
+        stale.send_text(json.dumps({"code": game.code, "action": Actions.PASS.value, "actionValue": None}))
+        seen = json.loads(stale.receive_text())["seq"]
+        game.process_action("dummy2", Actions.PASS, None)
+        sabaac.game_manager.get_state_stream(game).publish(GameState(game))
+
+        with client.websocket_connect("/sabaacws") as fresh:
+            fresh.send_text(json.dumps({"code": game.code, "resync": seen}))
+            resumed = json.loads(fresh.receive_text())
+            with pytest.raises(WebSocketDisconnect) as closed:
+                stale.receive_text()
+
+    assert snapshot["type"] == "snapshot"
+    assert resumed["type"] == "delta" and resumed["prev"] == seen
+    assert resumed["changes"]["round"] == game.round == 2
+    assert "playerhand" in resumed["private"]
+    assert closed.value.code == REPLACED
+
+
+def test_spectator_gets_public_frames_only(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    mocker.patch('sabaac.connection_manager', ConnectionManager())
+    game = CorellianGambit(seed=1)
+    game.add_player(Player("dummy1", 1))
+    game.add_player(Player("dummy2", 2))
+    sabaac.game_manager.add_game(game)
+    game.start()
+    game.deal()
+    client = TestClient(app)
+    client.cookies.set("games_anon_cookie", "dummy1")
+
+    page = client.get(f"/watch/{game.code}")
+    with client.websocket_connect("/spectatews") as spectator, client.websocket_connect("/sabaacws") as player:
+        spectator.send_text(json.dumps({"code": game.code, "spectate": 0}))
+        snapshot = json.loads(spectator.receive_text())
+        player.send_text(json.dumps({"code": game.code, "resync": 0}))
+        player.receive_text()
+        player.send_text(json.dumps({"code": game.code, "action": Actions.PASS.value, "actionValue": None}))
+        delta = json.loads(spectator.receive_text())
+        # spectators cannot act
+        spectator.send_text(json.dumps({"code": game.code, "action": Actions.PASS.value, "actionValue": None}))
+        rejected = json.loads(spectator.receive_text())
+
+    assert 'data-spectator="true"' in page.text
+    assert snapshot["type"] == "snapshot" and "private" not in snapshot and "playerhand" not in snapshot["state"]
+    assert delta["type"] == "delta" and "private" not in delta
+    assert delta["changes"]["currentplayer"] == game.get_current_player().username
+    assert rejected["type"] == "error"
+    assert game.turn == 2
+
+
+def test_quick_join_places_players_in_one_lobby(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    scheduler = TimingWheel(tick=0.01, slots=64)
+    mocker.patch('sabaac.scheduler', scheduler)
+    mocker.patch('sabaac.matchmaker', Matchmaker(sabaac.create_matched_lobby, sabaac.seat_matched_player,
+                                                 seats=sabaac.QUICK_JOIN_SEATS, scheduler=scheduler, tick=0.01))
+    codes = []
+    with TestClient(app) as client:
+        for cookie in ("dummy1", "dummy2"):
+            client.cookies.set("games_anon_cookie", cookie)
+            response = client.get("/quickJoin/?ante=5", allow_redirects=False)
+            codes.append(response.headers["location"].rsplit("/", 1)[-1])
+        bad_ante = client.get("/quickJoin/?ante=0", allow_redirects=False)
+
+    game = sabaac.game_manager.get_game_by_code(codes[0])
+    assert codes[0] == codes[1]
+    assert isinstance(game, CorellianGambit) and game.ante_amount == 5
+    assert [p.cookie for p in game.get_players()] == ["dummy1", "dummy2"]
+    assert bad_ante.status_code == 422
+
+
+def test_finished_game_reaches_leaderboard(tmp_path, mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    mocker.patch('sabaac.accounts', Accounts(str(tmp_path / "test.db")))
+    game = CorellianGambit(seed=1)
+    game.add_player(Player("dummy1", 1, "host"))
+    game.add_player(Player("dummy2", 2, "guest"))
+    sabaac.game_manager.add_game(game)
+
+    async def play():
+        await sabaac.accounts.refresh()
+        await sabaac.handle_lobby_update(game.code, "dummy1", "host", True)
+        await sabaac.handle_lobby_update(game.code, "dummy1", "host", True)
+        while game.is_active:
+            await sabaac.handle_game_action(game.code, game.get_current_player().cookie, Actions.PASS, None)
+    asyncio.run(play())
+    response = TestClient(app).get("/leaderboard?size=1")
+
+    board = response.json()
+    winner, loser = game.winner, next(p for p in game.get_players() if p is not game.winner)
+    assert board["entries"] == [{"rank": 1, "username": winner.username, "balance": 100 - 4 + 4}]
+    assert board["next"] == 1
+    assert sabaac.accounts.balance(loser.cookie) == 96
+
+
+def test_create_game_picks_variant(mocker: MockerFixture) -> None:
+    mocker.patch('sabaac.game_manager', GameManager())
+    client = TestClient(app)
+    client.cookies.set("games_anon_cookie", "dummy1")
+
+    response = client.get("/createGame/?variant=BespinStandard", allow_redirects=False)
+    unknown = client.get("/createGame/?variant=Pazaak", allow_redirects=False)
+    code = response.headers["location"].rsplit("/", 1)[-1]
+    page = client.get(f"/lobby/{code}")
+
+    game = sabaac.game_manager.get_game_by_code(code)
+    assert game.rules.name == "BespinStandard" and len(game.deck) == 76
+    assert unknown.status_code == 400
+    assert "BespinStandard" in page.text
+
+
 def test_read_sabaac_ws(mocker: MockerFixture) -> None:
     pass
     # client = TestClient(app)
@@ -0,0 +1,90 @@
+import random
+from pytest_mock import MockerFixture
+from models import scoring, variants
+from models.card import Card
+from models.game_types import CorellianGambit
+from models.player import Player
+
+
+def baseline_score(hand_vals: list) -> int:
+    """CorellianGambit.calculate_scores as it was before the variant engine, the reference to match"""
+    score = 0
+    if sorted(hand_vals) == [-10, 0, 10]:
+        score += 10000
+    if sum(hand_vals) == 0:
+        score += 10000
+    score += abs(sum(hand_vals)) * -100
+    score += len(hand_vals) * 10
+    score += sum([c for c in hand_vals if c > 0])
+    return score
+
+
+def random_hands(num_hands: int, max_hand_size: int) -> list:
+    rng = random.Random(0)
+    ranks = [c.rank for c in CorellianGambit.rules.deck]
+    return [rng.sample(ranks, rng.randint(1, max_hand_size)) for _ in range(num_hands)]
+
+
+edge_hands = [[], [-10, 0, 10], [10, -10, 0], [-10, 10], [-10, 10, 0, 0], [0], [0, 0], [1], [-1], [-4, 4], [-1, 1],
+              [10, 10, 10, -10, -10, -10, 0]]
+
+
+def test_pack_hands_pads_with_zero() -> None:
+    ranks, counts = scoring.pack_hands([[3], [-10, 0, 10], [1, -1]])
+
+    assert counts.tolist() == [1, 3, 2]
+    assert ranks.tolist() == [[3, 0, 0], [-10, 0, 10], [1, -1, 0]]
+
+
+def test_score_batch_matches_baseline() -> None:
+    rules = CorellianGambit.rules
+    # ties: equal totals and card counts that only the positive ranks separate, and exact duplicates
+    ties = [[-3, 3], [3, -3], [-1, 1], [2, -2, 0], [0, 2, -2], [5], [5], [-5]]
+    hands = edge_hands + ties + random_hands(20000, 8)
+
+    expected = [baseline_score(h) for h in hands]
+    assert [rules.score_hand(h) for h in hands] == expected
+    assert rules.score_batch(hands) == expected
+
+
+def test_winner_matches_baseline() -> None:
+    rng = random.Random(1)
+    deck = list(CorellianGambit.rules.deck)
+    for _ in range(500):
+        game = CorellianGambit()
+        cards = rng.sample(deck, 24)
+        for i in range(rng.randint(2, 8)):
+            game.add_player(Player(f"p{i}", i + 1, username=f"p{i}", hand=cards[i * 3:i * 3 + rng.randint(0, 3)]))
+        scores = {p: baseline_score([c.rank for c in p.hand]) for p in game.players}
+
+        assert game.calculate_scores() is max(scores, key=lambda p: scores[p])
+
+
+def test_corellian_score_hand_follows_the_rules() -> None:
+    rules = CorellianGambit.rules
+
+    # perfect hand, sum to 0, 3 cards, +10
+    assert rules.score_hand([-10, 0, 10]) == 20040
+    assert rules.score_hand([0, 0]) == 10020
+    assert rules.score_hand([-4, 4]) > rules.score_hand([-1, 1])
+    assert rules.score_hand([3]) == -287
+    assert rules.score_hand([1]) > rules.score_hand([-1])
+
+
+def test_score_batch_without_numpy(mocker: MockerFixture) -> None:
+    mocker.patch.object(variants, "np", None)
+    rules = CorellianGambit.rules
+    hands = edge_hands * 10
+
+    assert rules.score_batch(hands) == [rules.score_hand(h) for h in hands]
+
+
+def test_rank_players() -> None:
+    game = CorellianGambit()
+    hands = [[Card(1, "test", 3)], [Card(1, "test", -1), Card(2, "test", 1)],
+             [Card(1, "test", 1)], [Card(1, "test", -1)], [Card(1, "test", 1)]]
+    for i, hand in enumerate(hands):
+        game.add_player(Player(f"p{i}", i + 1, username=f"p{i}", hand=hand))
+
+    assert [p.username for p in game.rank_players()] == ["p1", "p2", "p4", "p3", "p0"]
+    assert game.calculate_scores().username == "p1"
@@ -0,0 +1,37 @@
+from models.simulator import SimulationStats, play_game, simulate_games
+
+
+def test_play_game_finishes() -> None:
+    stats = SimulationStats()
+
+    game = play_game(7, ("greedy", "random", "pass"), stats)
+
+    assert not game.is_active
+    assert game.round == 4
+    assert stats.games == 1 and not stats.errors
+    assert sum(stats.wins_by_turnorder.values()) == 1
+    assert stats.total_pot == game.ante_amount * 3
+
+
+def test_simulation_is_deterministic_across_workers() -> None:
+    policies = ("greedy", "random", "random", "pass")
+
+    single = simulate_games(60, policies, seed=3, workers=1, batch_size=25).to_dict()
+    pooled = simulate_games(60, policies, seed=3, workers=2, batch_size=25).to_dict()
+
+    assert single["games"] == pooled["games"] == 60
+    for key in ("actions_per_game", "doubles_per_game", "average_pot", "wins_by_turnorder", "wins_by_policy",
+                "errors"):
+        assert single[key] == pooled[key]
+    assert sum(single["wins_by_turnorder"].values()) == 1
+
+
+def test_eight_player_game_outlasting_the_deck_finishes() -> None:
+    stats = SimulationStats()
+
+    # seed 4 draws the deck dry, the discard pile is shuffled back in
+    game = play_game(4, ("random",) * 8, stats)
+
+    assert not game.is_active and not stats.errors
+    assert game.round == 4
+    assert len(game.players) == 8
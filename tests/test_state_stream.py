@@ -0,0 +1,75 @@
+from models.action_log import LogEvent
+from models.game_state import GameState
+from models.game_types import CorellianGambit
+from models.player import Player
+from models.state_stream import StateStream
+
+
+def make_game() -> CorellianGambit:
+    game = CorellianGambit()
+    game.add_player(Player("p1", 1, username="p1"))
+    game.add_player(Player("p2", 2, username="p2"))
+    return game
+
+
+def test_publish_sends_only_changed_fields_and_new_messages() -> None:
+    game = make_game()
+    stream = StateStream()
+    first = stream.publish(GameState(game))
+    game.action_log.append(LogEvent.DREW_DECK, "p1", created_at=0)
+    game.turn = 2
+
+    delta = stream.publish(GameState(game))
+
+    assert first["seq"] == 1
+    assert delta["seq"] == 2
+    assert delta["prev"] == 1
+    assert delta["changes"] == {"currentplayer": "p2"}
+    assert delta["messages"] == [{"seq": 0, "timestamp": "1970-01-01T00:00:00", "body": "p1 drew from the deck"}]
+
+
+def test_private_changes_track_hand_mutation() -> None:
+    game = make_game()
+    player = game.get_player("p1")
+    stream = StateStream()
+    game_state = GameState(game)
+    game_state.playerhand = player.hand
+    game_state.playercredits = player.credits
+    stream.private_changes("p1", game_state)
+    player.hand.append(game.deck.popleft())
+
+    changes = stream.private_changes("p1", game_state)
+
+    assert list(changes) == ["playerhand"]
+    assert len(changes["playerhand"]) == 1
+
+
+def test_resync_merges_missed_deltas() -> None:
+    game = make_game()
+    stream = StateStream()
+    stream.publish(GameState(game))
+    game.action_log.append(LogEvent.NOTE, "one")
+    stream.publish(GameState(game))
+    game.action_log.append(LogEvent.NOTE, "two")
+    game.hand_pot = 4
+    stream.publish(GameState(game))
+
+    resync = stream.resync(1, GameState(game))
+
+    assert resync["type"] == "delta"
+    assert resync["prev"] == 1
+    assert resync["seq"] == 3
+    assert resync["changes"] == {"handpot": 4}
+    assert [m["body"] for m in resync["messages"]] == ["one", "two"]
+
+
+def test_resync_falls_back_to_snapshot_when_history_is_gone() -> None:
+    game = make_game()
+    stream = StateStream(history_size=2)
+    for _ in range(5):
+        game.action_log.append(LogEvent.NOTE, "msg")
+        stream.publish(GameState(game))
+
+    assert stream.resync(0, GameState(game))["type"] == "snapshot"
+    assert stream.resync(1, GameState(game))["type"] == "snapshot"
+    assert stream.resync(3, GameState(game))["type"] == "delta"
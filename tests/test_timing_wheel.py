@@ -0,0 +1,83 @@
+import asyncio
+from models.timing_wheel import TimingWheel
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_timers_fire_in_tick_order_and_not_early() -> None:
+    clock = FakeClock()
+    wheel = TimingWheel(tick=0.1, slots=8, clock=clock)
+    fired = []
+    for delay in (0.35, 0.1, 0.2):
+        wheel.call_later(delay, fired.append, delay)
+
+    assert wheel.advance(0.19) == 1
+    assert fired == [0.1]
+    wheel.advance(0.4)
+
+    assert fired == [0.1, 0.2, 0.35]
+    assert len(wheel) == 0
+
+
+def test_cancelled_timer_never_fires() -> None:
+    wheel = TimingWheel(tick=0.1, slots=8, clock=FakeClock())
+    fired = []
+    timer = wheel.call_later(0.3, fired.append, "cancelled")
+    wheel.call_later(0.3, fired.append, "kept")
+
+    assert timer.cancel()
+    assert not timer.cancel()
+    wheel.advance(1.0)
+
+    assert fired == ["kept"]
+
+
+def test_timers_beyond_one_revolution_wait_for_their_tick() -> None:
+    clock = FakeClock()
+    wheel = TimingWheel(tick=1.0, slots=4, clock=clock)
+    fired = []
+    # 2 and 10 share a slot, 10 is two revolutions out
+    wheel.call_later(10, fired.append, 10)
+    wheel.call_later(2, fired.append, 2)
+
+    for now in range(1, 10):
+        clock.now = now
+        wheel.advance()
+    assert fired == [2]
+    clock.now = 10
+    wheel.advance()
+
+    assert fired == [2, 10]
+
+
+def test_stall_longer_than_a_revolution_catches_up() -> None:
+    wheel = TimingWheel(tick=1.0, slots=4, clock=FakeClock())
+    fired = []
+    for delay in range(1, 20):
+        wheel.call_later(delay, fired.append, delay)
+
+    wheel.advance(100)
+
+    assert sorted(fired) == list(range(1, 20))
+
+
+def test_coroutine_callbacks_run_as_tasks() -> None:
+    async def run():
+        wheel = TimingWheel(tick=0.01, slots=16)
+        done = asyncio.Event()
+
+        async def callback():
+            done.set()
+
+        wheel.start()
+        wheel.call_later(0.02, callback)
+        await asyncio.wait_for(done.wait(), 1)
+        wheel.stop()
+        assert wheel.fired == 1
+    asyncio.run(run())
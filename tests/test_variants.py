@@ -0,0 +1,73 @@
+import pickle
+import random
+import pytest
+from models.actions import Actions
+from models.game_types import CorellianGambit, VariantGame, variant_types
+from models.player import Player
+from models.variants import VARIANTS
+
+
+def random_hands(rules, num_hands: int) -> list:
+    rng = random.Random(0)
+    ranks = [c.rank for c in rules.deck]
+    return [rng.sample(ranks, rng.randint(1, 8)) for _ in range(num_hands)]
+
+
+def test_spike_only_changes_the_perfect_hand() -> None:
+    gambit, spike = VARIANTS["CorellianGambit"], VARIANTS["CorellianSpike"]
+    hands = random_hands(gambit, 5000)
+
+    assert CorellianGambit.rules is gambit
+    assert spike.score_hand([0, 0]) == gambit.score_hand([0, 0]) + 10000
+    assert spike.score_hand([-10, 0, 10]) == gambit.score_hand([-10, 0, 10]) - 10000
+    assert [spike.score_hand(h) for h in hands if sorted(h) not in ([0, 0], [-10, 0, 10])] == \
+        [gambit.score_hand(h) for h in hands if sorted(h) not in ([0, 0], [-10, 0, 10])]
+
+
+@pytest.mark.parametrize("name", list(VARIANTS))
+def test_score_matrix_matches_score_hand(name: str) -> None:
+    rules = VARIANTS[name]
+    hands = random_hands(rules, 2000) + [[0, 2, 3], [3, 2, 0, 0], [0, 0], [23], [-23], [15, 15]]
+
+    assert rules.score_batch(hands) == [rules.score_hand(h) for h in hands]
+
+
+def test_bespin_scoring_tiers() -> None:
+    rules = VARIANTS["BespinStandard"]
+    idiots_array, pure_sabacc, close, bust = [0, 2, 3], [15, 8], [15, 7], [15, 9]
+
+    scores = [rules.score_hand(h) for h in (idiots_array, pure_sabacc, close, bust)]
+
+    assert scores == sorted(scores, reverse=True)
+    assert rules.score_hand([-15, -8]) == rules.score_hand([15, 8]) - 23
+
+
+def test_variant_game_follows_its_rules() -> None:
+    game = variant_types()["CloudCityCasino"](seed=3)
+    p1 = game.add_player(Player("p1", 1, username="p1"))
+    game.add_player(Player("p2", 2, username="p2"))
+    game.start()
+    game.deal()
+
+    assert isinstance(game, VariantGame) and len(game.deck) + 6 == len(VARIANTS["CloudCityCasino"].deck)
+    assert len(p1.hand) == 3
+    # Cloud City Casino only draws from the deck
+    game.process_action("p1", Actions.DRAW_DISCARD, None)
+    assert game.turn == 1
+    turns = 0
+    while game.is_active:
+        game.process_action(game.get_current_player().cookie, Actions.PASS, None)
+        turns += 1
+    assert turns == 2 * 2
+    assert game.winner is game.rank_players()[0]
+
+
+def test_pickled_game_keeps_variant_and_shared_cards() -> None:
+    game = VariantGame(seed=1, rules=VARIANTS["BespinStandard"])
+    game.add_player(Player("p1", 1))
+    game.deal()
+
+    loaded = pickle.loads(pickle.dumps(game))
+
+    assert loaded.rules is VARIANTS["BespinStandard"]
+    assert all(a is b for a, b in zip(loaded.get_player("p1").hand, game.get_player("p1").hand))